@@ -20,6 +20,7 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
+app.autodiscover_tasks(["account.api.v1", "thread.api.v1"])
 
 app.conf.broker_url = BASE_REDIS_URL
 
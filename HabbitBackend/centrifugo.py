@@ -0,0 +1,188 @@
+"""
+Batched publishing of real-time events to Centrifugo.
+
+publish() only appends an event to an in-process buffer once the surrounding
+transaction commits, so nothing on the request path waits on Centrifugo. A
+daemon thread drains the buffer every CENTRIFUGO_FLUSH_INTERVAL seconds, or
+as soon as CENTRIFUGO_BATCH_SIZE events are waiting. Events carrying the same
+payload are coalesced into one broadcast to all of their channels, and every
+command of a batch goes out in a single API request over a pooled HTTP
+session.
+
+Delivery is best effort: a batch that fails is logged and dropped, the rest
+wait for the next flush, and at most CENTRIFUGO_BUFFER_SIZE events are kept
+while Centrifugo is unreachable. Nothing is published while CENTRIFUGO_API is unset.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from cent import CentException, Client
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[str, Dict[str, Any]]
+
+_buffer: Deque[Event] = deque()
+_buffer_lock = threading.Lock()
+_send_lock = threading.Lock()
+_wakeup = threading.Event()
+_flusher: Optional[threading.Thread] = None
+
+
+def user_channel(user_id: int) -> str:
+    """Personal channel of a user, only that user may subscribe to it."""
+    return f"notifications#{user_id}"
+
+
+def playlist_channel(playlist_id: int) -> str:
+    return f"playlist.{playlist_id}"
+
+
+@lru_cache(maxsize=None)
+def get_client(address: str, api_key: str, timeout: float) -> Client:
+    """
+    A client per API address. Each holds a requests session, so keep-alive
+    connections to Centrifugo are reused across batches.
+    """
+    return Client(address, api_key=api_key, timeout=timeout)
+
+
+def publish(channels: List[str], data: Dict[str, Any]) -> None:
+    """Publish `data` to `channels` once the current transaction commits."""
+    publish_events([(channel, data) for channel in channels])
+
+
+def publish_events(events: List[Event]) -> None:
+    """Publish (channel, data) pairs once the current transaction commits."""
+    if not settings.CENTRIFUGO_API or not events:
+        return
+
+    transaction.on_commit(lambda: _enqueue(events))
+
+
+def _enqueue(events: List[Event]) -> None:
+    with _buffer_lock:
+        _buffer.extend(events)
+        overflow = len(_buffer) - settings.CENTRIFUGO_BUFFER_SIZE
+        for _ in range(max(overflow, 0)):
+            _buffer.popleft()
+        pending = len(_buffer)
+
+    if overflow > 0:
+        logger.warning("Centrifugo buffer full, dropped %s events.", overflow)
+
+    _start_flusher()
+    if pending >= settings.CENTRIFUGO_BATCH_SIZE:
+        _wakeup.set()
+
+
+def _drain(limit: int) -> List[Event]:
+    with _buffer_lock:
+        return [_buffer.popleft() for _ in range(min(limit, len(_buffer)))]
+
+
+def coalesce(events: List[Event]) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Turn buffered events into API commands.
+
+    Events with equal payloads become one broadcast to all of their channels,
+    duplicate (channel, payload) pairs are sent once.
+    """
+    channels: Dict[str, Dict[str, None]] = {}
+    payloads: Dict[str, Dict[str, Any]] = {}
+
+    for channel, data in events:
+        key = json.dumps(data, sort_keys=True, default=str)
+        channels.setdefault(key, {})[channel] = None
+        payloads[key] = data
+
+    commands = []
+    for key, targets in channels.items():
+        if len(targets) == 1:
+            commands.append(
+                (
+                    "publish",
+                    Client.get_publish_params(next(iter(targets)), payloads[key]),
+                )
+            )
+        else:
+            commands.append(
+                ("broadcast", Client.get_broadcast_params(list(targets), payloads[key]))
+            )
+
+    return commands
+
+
+def flush() -> int:
+    """Send every buffered event, returns the number of API commands sent."""
+    sent = 0
+
+    while events := _drain(settings.CENTRIFUGO_BATCH_SIZE):
+        commands = coalesce(events)
+
+        with _send_lock:
+            client = get_client(
+                settings.CENTRIFUGO_API,
+                settings.CENTRIFUGO_API_KEY or "",
+                settings.CENTRIFUGO_TIMEOUT,
+            )
+            for method, params in commands:
+                client.add(method, params)
+
+            try:
+                replies = client.send()
+            except CentException:
+                logger.exception("Dropped %s Centrifugo events.", len(events))
+                break
+
+        for reply in replies:
+            if reply.get("error"):
+                logger.error("Centrifugo rejected a command: %s", reply["error"])
+
+        sent += len(commands)
+
+    return sent
+
+
+def _run() -> None:
+    while True:
+        _wakeup.wait(settings.CENTRIFUGO_FLUSH_INTERVAL)
+        _wakeup.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception("Centrifugo flush failed.")
+
+
+def _start_flusher() -> None:
+    global _flusher
+
+    with _buffer_lock:
+        if _flusher is not None and _flusher.is_alive():
+            return
+
+        _flusher = threading.Thread(target=_run, name="centrifugo", daemon=True)
+        _flusher.start()
+
+
+def _reset_after_fork() -> None:
+    """Forked workers start with an empty buffer and their own flusher."""
+    global _buffer_lock, _send_lock, _wakeup, _flusher
+
+    _buffer.clear()
+    _buffer_lock = threading.Lock()
+    _send_lock = threading.Lock()
+    _wakeup = threading.Event()
+    _flusher = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(flush)
@@ -0,0 +1,93 @@
+"""
+Saving and repair of denormalized counts.
+
+Counts kept on a row, like CustomUser.follower_count or PlayList.like_count,
+are shifted in place as rows are added and removed. A full save of a row read
+earlier would write its stale counts back, so models leave them out of
+ordinary updates with saved_fields(). Bulk and cascading deletes, and writes
+racing each other, can still make them drift, so periodic tasks recount them
+with reconcile_counts().
+"""
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+from django.db import models, transaction
+from django.db.models import Count
+
+
+def saved_fields(
+    instance: models.Model,
+    counts: Iterable[str],
+    update_fields: Optional[Iterable[str]] = None,
+) -> Optional[Iterable[str]]:
+    """
+    The update_fields to save `instance` with: all loaded fields but its
+    `counts` when updating a row without naming the fields to write. Inserts
+    and explicit update_fields are left alone.
+    """
+    if instance._state.adding or update_fields is not None:
+        return update_fields
+
+    counts = set(counts)
+    deferred = instance.get_deferred_fields()
+    fields: List[str] = [
+        field.name
+        for field in instance._meta.concrete_fields
+        if not field.primary_key
+        and field.name not in counts
+        and field.attname not in deferred
+    ]
+    return fields
+
+
+def reconcile_counts(
+    model: Type[models.Model],
+    counts: Dict[str, Tuple[models.QuerySet, str]],
+    chunk_size: int,
+) -> int:
+    """
+    Repair drift of `model`'s denormalized counts. `counts` maps every count
+    field to the queryset of counted rows and their foreign key to `model`.
+
+    Rows are walked in primary key order, one chunk per transaction, so only
+    the rows of the current chunk are locked. Returns the number of rows fixed.
+    """
+    repaired = 0
+    last_id = 0
+
+    while True:
+        with transaction.atomic():
+            rows = list(
+                model._default_manager.select_for_update()
+                .filter(pk__gt=last_id)
+                .order_by("pk")
+                .only("pk", *counts)[:chunk_size]
+            )
+
+            if not rows:
+                return repaired
+
+            last_id = rows[-1].pk
+            row_ids = [row.pk for row in rows]
+            actual = {
+                field: dict(
+                    counted.filter(**{f"{key}__in": row_ids})
+                    .order_by()
+                    .values_list(key)
+                    .annotate(Count("id"))
+                )
+                for field, (counted, key) in counts.items()
+            }
+
+            drifted = []
+            for row in rows:
+                expected = {field: actual[field].get(row.pk, 0) for field in counts}
+
+                if any(
+                    getattr(row, field) != count for field, count in expected.items()
+                ):
+                    for field, count in expected.items():
+                        setattr(row, field, count)
+                    drifted.append(row)
+
+            model._default_manager.bulk_update(drifted, list(counts))
+            repaired += len(drifted)
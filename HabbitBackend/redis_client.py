@@ -0,0 +1,23 @@
+from typing import Optional
+
+import redis
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+_connection: Optional["redis.Redis[bytes]"] = None
+
+
+def get_redis_connection() -> "redis.Redis[bytes]":
+    """
+    Return the process wide Redis client for REDIS_URL.
+
+    The client class comes from REDIS_CLIENT_CLASS so the test settings can
+    swap in an in-memory fakeredis server.
+    """
+    global _connection
+
+    if _connection is None:
+        client_class = import_string(settings.REDIS_CLIENT_CLASS)
+        _connection = client_class.from_url(settings.REDIS_URL)
+
+    return _connection
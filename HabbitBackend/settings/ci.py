@@ -17,3 +17,6 @@ DATABASES = {
 
 DATABASES["default"].update(dj_database_url.config(conn_max_age=1000))
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+REDIS_CLIENT_CLASS = "fakeredis.FakeRedis"
+UNIQUE_VIEWERS_BACKEND = "python"
+CELERY_TASK_ALWAYS_EAGER = True
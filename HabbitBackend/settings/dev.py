@@ -35,6 +35,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # 3rd party dependencies
     "rest_framework",
     "drf_yasg",
@@ -167,7 +168,7 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 10,
     "DEFAULT_FILTER_BACKENDS": ("django_filters.rest_framework.DjangoFilterBackend",),
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "account.authentication.CachedJWTAuthentication",
     ),
 }
 
@@ -187,6 +188,52 @@ SIMPLE_JWT = {
     "AUTH_HEADER_NAME": "HTTP_AUTHORIZATION",
 }
 
+# verified access tokens kept per process by CachedJWTAuthentication
+AUTH_TOKEN_CACHE_SIZE = 10000
+# seconds an authenticated user's row is served from Redis
+AUTH_USER_CACHE_TIMEOUT = 60
+
+# password reset OTPs, see account.otp
+PASSWORD_RESET_OTP_TIMEOUT = 60 * 10
+PASSWORD_RESET_MAX_ATTEMPTS = 5
+PASSWORD_RESET_RATE_WINDOW = 60 * 60
+PASSWORD_RESET_EMAIL_RATE_LIMIT = 5
+PASSWORD_RESET_IP_RATE_LIMIT = 20
+
+# unexpired blacklisted refresh tokens the Bloom filter is sized for, and the
+# false positive rate it should keep at that size
+TOKEN_BLACKLIST_BLOOM_CAPACITY = 100000
+TOKEN_BLACKLIST_BLOOM_ERROR_RATE = 0.001
+TOKEN_BLACKLIST_BLOOM_CHUNK_SIZE = 5000
+# seconds a filter rebuild's lock lives, renewed after every chunk
+TOKEN_BLACKLIST_BLOOM_LOCK_TIMEOUT = 60
+
+#############################################################
+# REDIS SETTINGS
+#############################################################
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
+REDIS_CLIENT_CLASS = "redis.Redis"
+
+# seconds a user's cached follower/following sets live without being read
+SOCIAL_GRAPH_CACHE_TIMEOUT = 60 * 60 * 24
+# seconds a user's cached unread notification count lives, see account.unread
+UNREAD_NOTIFICATIONS_CACHE_TIMEOUT = 60 * 60
+# notifications deleted per statement by delete_notifications_task, and the
+# seconds it pauses between statements
+NOTIFICATION_DELETE_BATCH_SIZE = 1000
+NOTIFICATION_DELETE_PAUSE = 0.05
+# followers notified by each task of a playlist publish fan-out
+NOTIFICATION_FANOUT_CHUNK_SIZE = 1000
+# playlists whose buffered views are written per UPDATE, see thread.view_counts
+PLAYLIST_VIEWS_FLUSH_BATCH_SIZE = 1000
+# "redis" keeps unique viewer sketches as Redis HyperLogLogs, "python" as the
+# pure Python sketch in thread.unique_viewers, see that module
+UNIQUE_VIEWERS_BACKEND = "redis"
+# days a playlist's daily unique viewer sketch is kept, and days its stats show
+UNIQUE_VIEWERS_DAILY_RETENTION = 30
+PLAYLIST_STATS_DAYS = 7
+
 #############################################################
 # CELERY SETTINGS
 #############################################################
@@ -197,6 +244,32 @@ CELERY_ACCEPT_CONTENT = ["application/json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "Africa/Lagos"
+CELERY_BEAT_SCHEDULE = {
+    "reconcile-follow-counts": {
+        "task": "reconcile_follow_counts_task",
+        "schedule": timedelta(hours=6),
+    },
+    "compute-follow-suggestions": {
+        "task": "compute_follow_suggestions_task",
+        "schedule": timedelta(minutes=15),
+    },
+    "prune-expired-tokens": {
+        "task": "prune_expired_tokens_task",
+        "schedule": timedelta(hours=1),
+    },
+    "reconcile-thread-counts": {
+        "task": "reconcile_thread_counts_task",
+        "schedule": timedelta(hours=6),
+    },
+    "prune-notification-groups": {
+        "task": "prune_notification_groups_task",
+        "schedule": timedelta(hours=1),
+    },
+    "flush-playlist-views": {
+        "task": "flush_playlist_views_task",
+        "schedule": timedelta(seconds=10),
+    },
+}
 
 #############################################################
 # MYPY SETTINGS
@@ -214,12 +287,24 @@ EMAIL_PORT = os.environ.get("EMAIL_PORT", 587)
 EMAIL_HOST = os.environ.get("EMAIL_HOST", "smtp.gmail.com")
 EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD", "111111")
 EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER", "info@example.com")
+# messages sent over one connection, and the seconds messages are collected
+# for before a batch goes out, see account.emails
+EMAIL_BATCH_SIZE = 100
+EMAIL_BATCH_WINDOW = 2
+# failed messages are retried after EMAIL_RETRY_BACKOFF * 2**attempt seconds
+EMAIL_MAX_RETRIES = 5
+EMAIL_RETRY_BACKOFF = 30
 
 #############################################################
 # NOTIFICATION SETTINGS
 #############################################################
 
 DJANGO_NOTIFICATIONS_CONFIG = {"USE_JSONFIELD": True}
+# likes and comments on the same target within NOTIFICATION_GROUP_WINDOW
+# seconds share one notification naming up to NOTIFICATION_GROUP_SAMPLE_SIZE
+# actors, see account.notifications.notify_grouped
+NOTIFICATION_GROUP_WINDOW = 6 * 60 * 60
+NOTIFICATION_GROUP_SAMPLE_SIZE = 3
 
 #############################################################
 # CENTRIFUGO SETTINGS
@@ -228,3 +313,13 @@ DJANGO_NOTIFICATIONS_CONFIG = {"USE_JSONFIELD": True}
 CENTRIFUGO_API = os.getenv("CENTRIFUGO_API")
 CENTRIFUGO_API_KEY = os.getenv("CENTRIFUGO_API_KEY")
 CENTRIFUGO_HMAC_TOKEN = os.getenv("CENTRIFUGO_HMAC_TOKEN")
+CENTRIFUGO_TIMEOUT = 1
+# buffered events are sent every CENTRIFUGO_FLUSH_INTERVAL seconds, or once
+# CENTRIFUGO_BATCH_SIZE are waiting, see HabbitBackend.centrifugo
+CENTRIFUGO_FLUSH_INTERVAL = 0.5
+CENTRIFUGO_BATCH_SIZE = 100
+CENTRIFUGO_BUFFER_SIZE = 10000
+# seconds connection and subscription tokens are valid for, cached tokens are
+# handed out until CENTRIFUGO_TOKEN_REFRESH_MARGIN seconds before they expire
+CENTRIFUGO_TOKEN_LIFETIME = 3600
+CENTRIFUGO_TOKEN_REFRESH_MARGIN = 300
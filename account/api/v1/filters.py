@@ -0,0 +1,20 @@
+from django.db.models import QuerySet
+from django.views import View
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+
+from account.search import filter_users
+
+
+class UserSearchFilter(SearchFilter):
+    """Search users by username or email through the trigram indexes."""
+
+    def filter_queryset(
+        self, request: Request, queryset: QuerySet, view: View
+    ) -> QuerySet:
+        term = request.query_params.get(self.search_param, "").strip()
+
+        if not term:
+            return queryset
+
+        return filter_users(queryset, term)
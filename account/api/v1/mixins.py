@@ -0,0 +1,40 @@
+from typing import Any, Dict, Optional
+
+from rest_framework.request import Request
+
+from account.models import CustomUser
+
+
+class UserIdentityMapMixin:
+    """
+    Load users at most once per request.
+
+    Loaded users are kept in an identity map stored on the request, so the
+    permission checks and the view share it. The map is seeded with the
+    authenticated user, which is reused when the path id is the caller's.
+    """
+
+    request: Request
+    kwargs: Dict[str, Any]
+
+    def get_user(self, user_id: Any) -> Optional[CustomUser]:
+        identity_map = getattr(self.request, "user_identity_map", None)
+
+        if identity_map is None:
+            identity_map = {}
+            if self.request.user.is_authenticated:
+                identity_map[str(self.request.user.id)] = self.request.user
+            self.request.user_identity_map = identity_map
+
+        key = str(user_id)
+
+        if key not in identity_map:
+            try:
+                identity_map[key] = CustomUser.objects.get(id=int(key))
+            except (ValueError, CustomUser.DoesNotExist):
+                identity_map[key] = None
+
+        return identity_map[key]
+
+    def get_object(self) -> Optional[CustomUser]:
+        return self.get_user(self.kwargs.get("id"))
@@ -1,12 +1,21 @@
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 from django.db import DatabaseError
+from django.db.models import QuerySet
 from notifications.models import Notification
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 
-from account.models import CustomUser, UserFollowing
+from account.models import (
+    CustomUser,
+    FollowSuggestion,
+    NotificationDeletionJob,
+    UserFollowing,
+)
+from account.notifications import notify_followed_users
+from account.tokens import RefreshToken
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -29,28 +38,21 @@ class UserSerializer(serializers.ModelSerializer):
             "profile_picture",
             "date_joined",
             "last_login",
+            "follower_count",
+            "following_count",
         ]
 
-        read_only_fields = ["id", "date_joined", "last_login"]
+        read_only_fields = [
+            "id",
+            "date_joined",
+            "last_login",
+            "follower_count",
+            "following_count",
+        ]
         extra_kwargs = {"password": {"write_only": True}}
 
-    def change_password(self, user: CustomUser, password: str) -> CustomUser:
-        if password:
-            user.set_password(password)
-            user.save()
-        return user
-
-    def generate_username(self, user: CustomUser) -> None:
-
-        if not user.username:
-            user.username = f'{str(user.email).split("@")[0]}-{user.id}'
-
     def create(self, validated_data: Dict[str, Any]) -> CustomUser:
-        user = super().create(validated_data)
-        self.generate_username(user)
-        self.change_password(user, validated_data.get("password", None))
-        user.is_active = True
-        user.save()
+        user = CustomUser.objects.create_signup_user(**validated_data)
         refresh_token = RefreshToken.for_user(user)
 
         self.token = {
@@ -63,9 +65,22 @@ class UserSerializer(serializers.ModelSerializer):
     def update(
         self, instance: CustomUser, validated_data: Dict[str, Any]
     ) -> CustomUser:
-        user = super().update(instance, validated_data)
-        self.change_password(user, validated_data.get("password", None))
-        return user
+        password = validated_data.pop("password", None)
+
+        if password:
+            instance.set_password(password)
+
+        return super().update(instance, validated_data)
+
+    @classmethod
+    def representation_fields(cls) -> List[str]:
+        """Model fields read when rendering a user."""
+        write_only = [
+            name
+            for name, kwargs in cls.Meta.extra_kwargs.items()
+            if kwargs.get("write_only")
+        ]
+        return [name for name in cls.Meta.fields if name not in write_only]
 
     def to_representation(self, instance: CustomUser) -> Dict[str, Any]:
         data = {**super().to_representation(instance)}
@@ -105,26 +120,74 @@ class LogoutSerializer(serializers.Serializer):
         return attrs
 
 
-class FollowerSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = UserFollowing
-        fields = ["date_created", "blocked", "user"]
-        read_only_fields = ["date_created", "user"]
+class RefreshSerializer(TokenRefreshSerializer):
+    """TokenRefreshSerializer checking the blacklist through its Bloom filter."""
+
+    def validate(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
+        refresh = RefreshToken(attrs["refresh"])
+        data = {"access": str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data["refresh"] = str(refresh)
+
+        return data
+
+
+class UserFollowingSerializer(serializers.ModelSerializer):
+    """Base serializer for UserFollowing rows embedding one side of the relation."""
+
+    # relation on UserFollowing rendered under the "user" key
+    embedded_user_field = "user"
+
+    @classmethod
+    def setup_eager_loading(
+        cls, queryset: QuerySet[UserFollowing]
+    ) -> QuerySet[UserFollowing]:
+        """Load the embedded users of a whole page in the list query."""
+        user_fields = [
+            f"{cls.embedded_user_field}__{field}"
+            for field in UserSerializer.representation_fields()
+        ]
+        return queryset.select_related(cls.embedded_user_field).only(
+            "date_created", "blocked", "user", "followed_user", *user_fields
+        )
 
     def to_representation(self, instance: UserFollowing) -> Dict[str, Any]:
         return {
-            "user": UserSerializer(instance=instance.user).data,
+            "user": UserSerializer(
+                instance=getattr(instance, self.embedded_user_field)
+            ).data,
             "following_since": instance.date_created,
             "blocked": instance.blocked,
         }
 
 
-class FollowingSerializer(serializers.ModelSerializer):
+class FollowerSerializer(UserFollowingSerializer):
+    embedded_user_field = "user"
+
+    class Meta:
+        model = UserFollowing
+        fields = ["date_created", "blocked", "user"]
+        read_only_fields = ["date_created", "user"]
+
+
+class FollowingSerializer(UserFollowingSerializer):
+    embedded_user_field = "followed_user"
+
     class Meta:
         model = UserFollowing
         fields = ["date_created", "followed_user", "blocked"]
         read_only_fields = ["date_created"]
 
+    # set by create(), False when the user was already being followed
+    created = None
+
     def create(self, validated_data: Dict[str, Any]) -> UserFollowing:
         user = self.context.get("user")
 
@@ -133,9 +196,13 @@ class FollowingSerializer(serializers.ModelSerializer):
                 f"Authenticatetd User must be added to {self.__class__.__name__} context."
             )  # pragma: no cover
 
-        follower_transaction = UserFollowing.objects.create(
-            user=user, followed_user=validated_data.get("followed_user")
+        follower_transaction, self.created = UserFollowing.objects.follow(
+            user=user, followed_user=validated_data["followed_user"]
         )
+
+        if self.created:
+            notify_followed_users(user, [follower_transaction.followed_user_id])
+
         return follower_transaction
 
     def validate(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
@@ -148,16 +215,61 @@ class FollowingSerializer(serializers.ModelSerializer):
 
         followed_user = attrs.get("followed_user")
 
-        if UserFollowing.objects.filter(user=user, followed_user=followed_user):
-            raise ValidationError({"followed_user": "User is already being followed."})
+        if followed_user and followed_user.id == user.id:
+            raise ValidationError({"followed_user": "User can not follow themselves."})
 
         return attrs
 
-    def to_representation(self, instance: UserFollowing) -> Dict[str, Any]:
+
+class BulkFollowingSerializer(serializers.Serializer):
+    followed_users = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=100
+    )
+
+    def validate_followed_users(self, value: List[int]) -> List[int]:
+        user = self.context.get("user")
+
+        if not user:
+            raise DatabaseError(
+                f"Authenticatetd User must be added to {self.__class__.__name__} context."
+            )  # pragma: no cover
+
+        user_ids = list(dict.fromkeys(value))
+
+        if user.id in user_ids:
+            raise ValidationError("User can not follow themselves.")
+
+        existing = set(
+            CustomUser.objects.filter(id__in=user_ids, is_active=True).values_list(
+                "id", flat=True
+            )
+        )
+        missing = [user_id for user_id in user_ids if user_id not in existing]
+
+        if missing:
+            raise ValidationError(f"Users with ids {missing} do not exist.")
+
+        return user_ids
+
+    def create(self, validated_data: Dict[str, Any]) -> Dict[str, Any]:
+        user = self.context["user"]
+        follows = UserFollowing.objects.bulk_follow(
+            [(user.id, user_id) for user_id in validated_data["followed_users"]]
+        )
+        followed_users = [followed_user_id for _, followed_user_id in follows]
+        notify_followed_users(user, followed_users)
+        return {"followed_users": followed_users}
+
+
+class FollowSuggestionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FollowSuggestion
+        fields = ["suggested_user", "score"]
+
+    def to_representation(self, instance: FollowSuggestion) -> Dict[str, Any]:
         return {
-            "user": UserSerializer(instance=instance.followed_user).data,
-            "following_since": instance.date_created,
-            "blocked": instance.blocked,
+            "user": UserSerializer(instance=instance.suggested_user).data,
+            "score": instance.score,
         }
 
 
@@ -181,3 +293,10 @@ class NotificationSerializer(serializers.ModelSerializer):
         ]
 
         extra_kwargs = {"unread": {"required": True}}
+
+
+class NotificationDeletionJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = NotificationDeletionJob
+        fields = ["id", "status", "deleted", "date_created", "date_completed"]
+        read_only_fields = fields
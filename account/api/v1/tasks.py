@@ -1,24 +1,209 @@
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional, Sequence
+
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import get_template
+from django.core.mail import get_connection
+from django.db import transaction
+from django.utils import timezone
+from notifications.models import Notification
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
 
+from account import blacklist, emails, suggestions
+from account.models import (
+    CustomUser,
+    NotificationDeletionJob,
+    NotificationGroup,
+    NotificationGroupActor,
+    UserFollowing,
+)
 from HabbitBackend.celery import app
+from HabbitBackend.counts import reconcile_counts
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(*payloads: Dict[str, Any]) -> None:
+    """Send messages with the next micro-batch, see account.emails."""
+    if emails.push(payloads):
+        send_queued_emails_task.apply_async(countdown=settings.EMAIL_BATCH_WINDOW)
+
+
+def retry_emails(payloads: Sequence[Dict[str, Any]]) -> None:
+    """Retry every failed message on its own, backing off exponentially."""
+    for payload in payloads:
+        attempt = payload.get("attempt", 0) + 1
+
+        if attempt > settings.EMAIL_MAX_RETRIES:
+            logger.error("Giving up on email to %s.", payload["to"])
+            continue
+
+        send_email_task.apply_async(
+            ({**payload, "attempt": attempt},),
+            countdown=settings.EMAIL_RETRY_BACKOFF * 2 ** (attempt - 1),
+        )
 
 
-@app.task(name="send_reset_password_otp_to_user_email_task")
-def send_reset_password_otp_to_user_email_task(
-    user_email: str, token: str
-) -> None:  # pragma: no cover
-    template = get_template("account/api/v1/templates/resetpassword.html")
+@app.task(name="send_queued_emails_task")
+def send_queued_emails_task() -> int:
+    """
+    Drain the email outbox in batches of EMAIL_BATCH_SIZE, each sent over one
+    connection. Returns the number of messages sent.
+    """
+    emails.start_flush()
+    connection = get_connection()
+    sent = 0
 
-    html_content = template.render({"otp": token})
+    while batch := emails.pop_batch(settings.EMAIL_BATCH_SIZE):
+        failed = emails.send_batch(batch, connection)
+        retry_emails(failed)
+        sent += len(batch) - len(failed)
 
-    text_content = (
-        f"Use the following OTP to complete your password reset {token}. "
-        "OTP is valid for 5 minutes"
+    return sent
+
+
+@app.task(name="send_email_task")
+def send_email_task(payload: Dict[str, Any]) -> bool:
+    """Retry a single message that failed in a batch."""
+    failed = emails.send_batch([payload])
+    retry_emails(failed)
+    return not failed
+
+
+@app.task(name="reconcile_follow_counts_task")
+def reconcile_follow_counts_task(chunk_size: int = 1000) -> int:
+    """
+    Repair drift between the denormalized follow counts and the unblocked
+    UserFollowing rows, returns the number of users fixed.
+    """
+    active = UserFollowing.objects.filter(blocked=False)
+    return reconcile_counts(
+        CustomUser,
+        {
+            "follower_count": (active, "followed_user_id"),
+            "following_count": (active, "user_id"),
+        },
+        chunk_size,
     )
 
-    subject, from_email, to = "Reset Password OTP", settings.EMAIL_HOST_USER, user_email
-    msg = EmailMultiAlternatives(subject, text_content, from_email, [to])
-    msg.attach_alternative(html_content, "text/html")
-    msg.send()
+
+@app.task(name="compute_follow_suggestions_task")
+def compute_follow_suggestions_task(full: bool = False, batch_size: int = 500) -> int:
+    """
+    Recompute the stored follow suggestions, of every user when `full` is set
+    and otherwise only of users whose neighbourhood changed since the last run.
+    """
+    if full:
+        user_ids = (
+            CustomUser.objects.filter(is_active=True)
+            .order_by("id")
+            .values_list("id", flat=True)
+            .iterator(chunk_size=batch_size)
+        )
+        return suggestions.refresh(user_ids, batch_size)
+
+    return suggestions.refresh_changed(batch_size)
+
+
+@app.task(name="prune_expired_tokens_task")
+def prune_expired_tokens_task(batch_size: int = 1000) -> Dict[str, float]:
+    """
+    Delete expired outstanding tokens and their blacklist entries, at most
+    `batch_size` per statement, then rebuild the blacklist Bloom filter.
+    Returns and logs the blacklist metrics.
+    """
+    now = timezone.now()
+    deleted = 0
+
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=now)
+            .order_by()
+            .values_list("id", flat=True)[:batch_size]
+        )
+
+        if not ids:
+            break
+
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+    if blacklist.rebuild() is None:
+        logger.warning("Token blacklist filter was not rebuilt, see account.blacklist.")
+    metrics: Dict[str, float] = {"pruned_tokens": deleted, **blacklist.metrics()}
+    logger.info("Token blacklist metrics: %s", metrics)
+    return metrics
+
+
+@app.task(name="rebuild_token_blacklist_filter_task")
+def rebuild_token_blacklist_filter_task() -> Optional[int]:
+    """
+    Build the blacklist Bloom filter when a lookup found none, returns the
+    members added or None when another rebuild is running.
+    """
+    return blacklist.rebuild()
+
+
+@app.task(name="prune_notification_groups_task")
+def prune_notification_groups_task(batch_size: int = 1000) -> int:
+    """
+    Delete the NotificationGroup rows, and their actors, of windows that have
+    closed, at most `batch_size` groups per statement. Their notifications are
+    kept. Returns the number of groups deleted.
+    """
+    window_closed = timezone.now() - timedelta(
+        seconds=settings.NOTIFICATION_GROUP_WINDOW
+    )
+    groups = NotificationGroup.objects.filter(window_start__lte=window_closed)
+    deleted = 0
+
+    while ids := list(groups.order_by().values_list("id", flat=True)[:batch_size]):
+        with transaction.atomic():
+            NotificationGroupActor.objects.filter(group_id__in=ids).delete()
+            NotificationGroup.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+    return deleted
+
+
+@app.task(name="delete_notifications_task")
+def delete_notifications_task(job_id: int) -> int:
+    """
+    Delete the notifications hidden by a NotificationDeletionJob in primary
+    key batches of NOTIFICATION_DELETE_BATCH_SIZE, pausing
+    NOTIFICATION_DELETE_PAUSE seconds between batches so no single statement
+    holds locks for long. Returns the number of notifications deleted.
+    """
+    job = NotificationDeletionJob.objects.get(id=job_id)
+    job.status = NotificationDeletionJob.RUNNING
+    job.save(update_fields=["status"])
+    notifications = Notification.objects.filter(
+        recipient_id=job.user_id, id__lte=job.watermark
+    ).order_by("id")
+
+    try:
+        while ids := list(
+            notifications.values_list("id", flat=True)[
+                : settings.NOTIFICATION_DELETE_BATCH_SIZE
+            ]
+        ):
+            # the per model counts leave out cascaded NotificationGroup rows
+            _, deleted = Notification.objects.filter(id__in=ids).delete()
+            job.deleted += deleted.get(Notification._meta.label, 0)
+            job.save(update_fields=["deleted"])
+            time.sleep(settings.NOTIFICATION_DELETE_PAUSE)
+    except Exception:
+        job.status = NotificationDeletionJob.FAILED
+        job.save(update_fields=["status"])
+        raise
+
+    job.status = NotificationDeletionJob.COMPLETED
+    job.date_completed = timezone.now()
+    job.save(update_fields=["status", "date_completed"])
+    return job.deleted
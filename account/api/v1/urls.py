@@ -2,18 +2,24 @@ from django.urls import path
 from rest_framework import routers
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from account.api.v1.serializers import RefreshSerializer
 from account.api.v1.views import (
     AuthViewset,
+    BulkFollowView,
     DeleteAllNotificationsView,
     ListCreateFollowingView,
     ListFollowersView,
     ListNotificationsView,
     LogoutView,
     MarkAllNotificationsAsReadView,
+    NotificationDeletionJobView,
     NotificationsDetailView,
+    RealtimeConnectionTokenView,
+    RealtimeSubscriptionTokenView,
     ResetPasswordViewset,
     RetrieveFollowerView,
     RetrieveRemoveFollowingView,
+    UnreadNotificationsCountView,
     UserViewset,
 )
 
@@ -28,7 +34,21 @@ urlpatterns = [
     *router.urls,
     path("account/logout/", LogoutView.as_view(), name="logout-user"),
     path("account/login/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
-    path("account/login/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path(
+        "account/login/refresh/",
+        TokenRefreshView.as_view(serializer_class=RefreshSerializer),
+        name="token_refresh",
+    ),
+    path(
+        "account/realtime/token/",
+        RealtimeConnectionTokenView.as_view(),
+        name="realtime-connection-token",
+    ),
+    path(
+        "account/realtime/subscription-token/",
+        RealtimeSubscriptionTokenView.as_view(),
+        name="realtime-subscription-token",
+    ),
     path(
         "users/<str:id>/followers/", ListFollowersView.as_view(), name="followers-list"
     ),
@@ -42,6 +62,11 @@ urlpatterns = [
         ListCreateFollowingView.as_view(),
         name="following-list",
     ),
+    path(
+        "users/<str:id>/following/bulk/",
+        BulkFollowView.as_view(),
+        name="following-bulk",
+    ),
     path(
         "users/<str:id>/following/<str:followed_id>/",
         RetrieveRemoveFollowingView.as_view(),
@@ -57,6 +82,11 @@ urlpatterns = [
         NotificationsDetailView.as_view(),
         name="notification-details",
     ),
+    path(
+        "notifications/unread-count/",
+        UnreadNotificationsCountView.as_view(),
+        name="unread-notifications-count",
+    ),
     path(
         "notifications/read-all/",
         MarkAllNotificationsAsReadView.as_view(),
@@ -67,4 +97,9 @@ urlpatterns = [
         DeleteAllNotificationsView.as_view(),
         name="delete-all-notifications",
     ),
+    path(
+        "notifications/delete-all/<int:pk>/",
+        NotificationDeletionJobView.as_view(),
+        name="notification-deletion-job",
+    ),
 ]
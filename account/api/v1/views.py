@@ -1,8 +1,9 @@
-from datetime import timedelta
 from typing import Any, Dict, List, Optional
 
-from django.core import signing
-from django.db.models import QuerySet
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Q, QuerySet
+from django.http import Http404
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
@@ -12,30 +13,58 @@ from rest_framework import (
     generics,
     mixins,
     permissions,
+    serializers,
     status,
     views,
     viewsets,
 )
 from rest_framework.decorators import action
 from rest_framework.filters import OrderingFilter, SearchFilter
-from rest_framework.generics import get_object_or_404
 from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
 from rest_framework.views import APIView
 
+from account import auth_cache, emails, otp, realtime_tokens, unread
+from account.api.v1.filters import UserSearchFilter
+from account.api.v1.mixins import UserIdentityMapMixin
 from account.api.v1.permissions import IsUserOrReadOnly
 from account.api.v1.serializers import (
+    BulkFollowingSerializer,
     FollowerSerializer,
     FollowingSerializer,
+    FollowSuggestionSerializer,
     LogoutSerializer,
+    NotificationDeletionJobSerializer,
     NotificationSerializer,
     RPEmailSerializer,
     RPPasswordSerializer,
     RPTokenSerializer,
     UserSerializer,
 )
-from account.api.v1.tasks import send_reset_password_otp_to_user_email_task
-from account.models import CustomUser, UserFollowing
+from account.api.v1.tasks import delete_notifications_task, queue_email
+from account.models import (
+    CustomUser,
+    FollowSuggestion,
+    NotificationDeletionJob,
+    UserFollowing,
+)
+from account.search import autocomplete_users, search_users
+
+SEARCH_PARAMETER = openapi.Parameter(
+    api_settings.SEARCH_PARAM, openapi.IN_QUERY, type=openapi.TYPE_STRING
+)
+CHANNEL_PARAMETER = openapi.Parameter(
+    "channel", openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True
+)
+TOKEN_SCHEMA = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        "token": openapi.Schema(type=openapi.TYPE_STRING),
+        "expires_at": openapi.Schema(type=openapi.TYPE_INTEGER),
+    },
+)
 
 
 class AuthViewset(mixins.CreateModelMixin, viewsets.GenericViewSet):
@@ -56,12 +85,90 @@ class UserViewset(
     )
     serializer_class = UserSerializer
     permission_classes = (permissions.IsAuthenticated,)
-    filter_backends = [OrderingFilter, SearchFilter, DjangoFilterBackend]
+    filter_backends = [OrderingFilter, UserSearchFilter, DjangoFilterBackend]
     filterset_fields = ["date_of_birth"]
-    search_fields = ["username", "email", "date_of_birth"]
     ordering_fields = ["date_joined"]
     ordering = ordering_fields
 
+    def get_search_term(self) -> str:
+        term = self.request.query_params.get(api_settings.SEARCH_PARAM, "").strip()
+
+        if not term:
+            raise exceptions.ValidationError(
+                {api_settings.SEARCH_PARAM: ["This query parameter is required."]}
+            )
+
+        return term
+
+    @swagger_auto_schema(
+        operation_id="search-users",
+        manual_parameters=[SEARCH_PARAMETER],
+        responses={200: UserSerializer(many=True)},
+    )
+    @action(
+        detail=False,
+        methods=["GET"],
+        url_path="search",
+        url_name="search",
+        pagination_class=None,
+    )
+    def search(self, request: Request) -> Response:
+        """Users matching the search term, best matches first."""
+        queryset = search_users(self.get_queryset(), self.get_search_term())
+        serializer = UserSerializer(instance=queryset, many=True)
+        return Response(data=serializer.data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_id="autocomplete-users",
+        manual_parameters=[SEARCH_PARAMETER],
+        responses={200: UserSerializer(many=True)},
+    )
+    @action(
+        detail=False,
+        methods=["GET"],
+        url_path="autocomplete",
+        url_name="autocomplete",
+        pagination_class=None,
+    )
+    def autocomplete(self, request: Request) -> Response:
+        """Users whose username or email starts with the search term."""
+        queryset = autocomplete_users(self.get_queryset(), self.get_search_term())
+        serializer = UserSerializer(instance=queryset, many=True)
+        return Response(data=serializer.data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_id="follow-suggestions",
+        responses={200: FollowSuggestionSerializer(many=True)},
+    )
+    @action(
+        detail=False,
+        methods=["GET"],
+        url_path="suggestions",
+        url_name="suggestions",
+        pagination_class=None,
+    )
+    def suggestions(self, request: Request) -> Response:
+        """People the authenticated user may know, best matches first."""
+        following = UserFollowing.objects.filter(
+            user=request.user, followed_user=OuterRef("suggested_user")
+        )
+        # stored suggestions may predate a block in either direction
+        blocked = UserFollowing.objects.filter(
+            Q(user=request.user, followed_user=OuterRef("suggested_user"))
+            | Q(user=OuterRef("suggested_user"), followed_user=request.user),
+            blocked=True,
+        )
+        queryset = (
+            FollowSuggestion.objects.filter(
+                user=request.user, suggested_user__is_active=True
+            )
+            .exclude(Exists(following))
+            .exclude(Exists(blocked))
+            .select_related("suggested_user")
+        )
+        serializer = FollowSuggestionSerializer(instance=queryset, many=True)
+        return Response(data=serializer.data, status=status.HTTP_200_OK)
+
 
 class LogoutView(views.APIView):
     serializer_class = LogoutSerializer
@@ -98,7 +205,7 @@ class ResetPasswordViewset(viewsets.ViewSet):
         operation_id="gettoken",
         request_body=RPEmailSerializer,
         responses={
-            200: openapi.Response("Response", RPTokenSerializer),
+            200: openapi.Response("Response", None, {"status": "success"}),
             400: openapi.Response("Error Response", RPEmailSerializer),
         },
     )
@@ -109,16 +216,39 @@ class ResetPasswordViewset(viewsets.ViewSet):
         url_name="gettoken",
     )
     def get_token(self, request: Request) -> Response:
-        """Generate reset password token."""
+        """Generate a reset password token and email it, never returning it."""
         serializer = RPEmailSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         mail = serializer.validated_data.get("email")
-        user = get_object_or_404(CustomUser, email=mail)
-        raw_token, token = user.generate_resettoken()
-        user.reset_token = token
-        user.save()
-        send_reset_password_otp_to_user_email_task.delay(user.email, raw_token)
-        return Response(data={"token": raw_token}, status=status.HTTP_200_OK)
+
+        if not otp.allow_request(mail, BaseThrottle().get_ident(request)):
+            raise exceptions.Throttled()
+
+        user_id = CustomUser.objects.filter(email=mail).values_list("id", flat=True)
+
+        if not user_id:
+            raise Http404
+
+        raw_token = otp.issue(mail, user_id[0])
+        queue_email(emails.reset_password_otp_email(mail, raw_token))
+        return Response(data={"status": "success"}, status=status.HTTP_200_OK)
+
+    def check_token(self, serializer: serializers.Serializer) -> Optional[Response]:
+        """Error response for an invalid or expired token, None if it is valid."""
+        result = otp.verify(
+            serializer.validated_data["email"], serializer.validated_data["token"]
+        )
+
+        if result == otp.INVALID:
+            raise exceptions.ValidationError({"token": ["Invalid token"]})
+
+        if result == otp.EXPIRED:
+            return Response(
+                data={"status": "failure", "message": "token has expired"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        return None
 
     @swagger_auto_schema(
         operation_id="validatetoken",
@@ -138,22 +268,9 @@ class ResetPasswordViewset(viewsets.ViewSet):
         """confirm that a token is valid."""
         serializer = RPTokenSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = get_object_or_404(CustomUser, email=serializer.data.get("email"))
-
-        try:
-            max_age = timedelta(minutes=10)
-            signer = signing.TimestampSigner()
-            data = signer.unsign_object(user.reset_token, max_age=max_age)
-            if str(serializer.data.get("token")) != str(data.get("token")):
-                raise exceptions.ValidationError({"token": ["Invalid token"]})
-            return Response(data=serializer.data, status=status.HTTP_200_OK)
-        except signing.SignatureExpired:
-            user.reset_token = None
-            user.save()
-            return Response(
-                data={"status": "failure", "message": "token has expired"},
-                status=status.HTTP_403_FORBIDDEN,
-            )
+        return self.check_token(serializer) or Response(
+            data=serializer.data, status=status.HTTP_200_OK
+        )
 
     @swagger_auto_schema(
         operation_id="resetpassword",
@@ -173,19 +290,28 @@ class ResetPasswordViewset(viewsets.ViewSet):
         """Reset Users Password using generated token."""
         serializer = RPPasswordSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        response = self.validate_token(request)
+        response = self.check_token(serializer)
+
+        if response:
+            return response
 
-        if response.status_code == 200:
-            user = get_object_or_404(CustomUser, email=serializer.data.get("email"))
-            user.set_password(serializer.validated_data.get("password"))
-            user.reset_token = None
-            user.save()
+        user_id = otp.consume(serializer.validated_data["email"])
+
+        if user_id is None:
             return Response(
-                {"status": "success", "message": "Password reset"},
-                status=status.HTTP_200_OK,
+                data={"status": "failure", "message": "token has expired"},
+                status=status.HTTP_403_FORBIDDEN,
             )
-        else:
-            return response
+
+        password = make_password(serializer.validated_data["password"])
+        if not CustomUser.objects.filter(id=user_id).update(password=password):
+            raise Http404
+
+        auth_cache.invalidate_user(user_id)
+        return Response(
+            {"status": "success", "message": "Password reset"},
+            status=status.HTTP_200_OK,
+        )
 
 
 class ListFollowersView(generics.ListAPIView):
@@ -198,11 +324,12 @@ class ListFollowersView(generics.ListAPIView):
     ordering = ordering_fields
 
     def get_queryset(self) -> QuerySet[UserFollowing]:
-        return UserFollowing.objects.filter(
+        queryset = UserFollowing.objects.filter(
             user__is_active=True,
             followed_user__is_active=True,
             followed_user__id=self.kwargs.get("id"),
         )
+        return self.serializer_class.setup_eager_loading(queryset)
 
     @swagger_auto_schema(
         operation_id="follower-list",
@@ -213,7 +340,7 @@ class ListFollowersView(generics.ListAPIView):
         return super().get(request, *args, **kwargs)
 
 
-class RetrieveFollowerView(generics.GenericAPIView):
+class RetrieveFollowerView(UserIdentityMapMixin, generics.GenericAPIView):
     """Retrieve and block followers."""
 
     serializer_class = FollowerSerializer
@@ -225,18 +352,11 @@ class RetrieveFollowerView(generics.GenericAPIView):
             user__is_active=True, followed_user__is_active=True
         )
 
-    def get_object(self) -> Optional[CustomUser]:
-        try:
-            user = CustomUser.objects.get(id=self.kwargs.get("id"))
-        except CustomUser.DoesNotExist:
-            return None
-        return user
-
     def get_follower_contract(self, user_id: int, follower_id: int) -> UserFollowing:
         try:
-            follower_contract = UserFollowing.objects.get(
-                user__id=follower_id, followed_user__id=user_id
-            )
+            follower_contract = FollowerSerializer.setup_eager_loading(
+                UserFollowing.objects.all()
+            ).get(user__id=follower_id, followed_user__id=user_id)
         except UserFollowing.DoesNotExist:
             raise exceptions.NotFound("Follower with this id not found.")
 
@@ -274,7 +394,7 @@ class RetrieveFollowerView(generics.GenericAPIView):
         return Response(data=serializer.data, status=status.HTTP_200_OK)
 
 
-class ListCreateFollowingView(generics.ListCreateAPIView):
+class ListCreateFollowingView(UserIdentityMapMixin, generics.ListCreateAPIView):
     """List and follow new users."""
 
     serializer_class = FollowingSerializer
@@ -286,18 +406,12 @@ class ListCreateFollowingView(generics.ListCreateAPIView):
     ordering = ordering_fields
 
     def get_queryset(self) -> QuerySet[UserFollowing]:
-        return UserFollowing.objects.filter(
+        queryset = UserFollowing.objects.filter(
             user__is_active=True,
             followed_user__is_active=True,
             user__id=self.kwargs.get("id"),
         )
-
-    def get_object(self) -> QuerySet[CustomUser]:
-        try:
-            user = CustomUser.objects.get(id=self.kwargs.get("id"))
-        except CustomUser.DoesNotExist:
-            return None
-        return user
+        return self.serializer_class.setup_eager_loading(queryset)
 
     @swagger_auto_schema(
         operation_id="list-followed-users",
@@ -314,16 +428,43 @@ class ListCreateFollowingView(generics.ListCreateAPIView):
     def post(
         self, request: Request, id: str, *args: list[Any], **kwargs: dict[str, Any]
     ) -> Response:
-        """Follow new user"""
+        """Follow new user, repeated calls return the existing relation."""
+        serializer = self.serializer_class(
+            data=request.data, context={"user": self.request.user}
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(
+            data=serializer.data,
+            status=status.HTTP_201_CREATED
+            if serializer.created
+            else status.HTTP_200_OK,
+        )
+
+
+class BulkFollowView(UserIdentityMapMixin, generics.GenericAPIView):
+    """Follow many users at once."""
+
+    serializer_class = BulkFollowingSerializer
+    permission_classes = [permissions.IsAuthenticated, IsUserOrReadOnly]
+    lookup_field = "id"
+
+    @swagger_auto_schema(
+        operation_id="bulk-add-users-to-following-list",
+        request_body=BulkFollowingSerializer,
+        responses={200: openapi.Response("Response", BulkFollowingSerializer)},
+    )
+    def post(self, request: Request, id: str) -> Response:
+        """Follow a list of users, returns the ids that were newly followed."""
         serializer = self.serializer_class(
             data=request.data, context={"user": self.request.user}
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
-        return Response(data=serializer.data, status=status.HTTP_201_CREATED)
+        return Response(data=serializer.data, status=status.HTTP_200_OK)
 
 
-class RetrieveRemoveFollowingView(generics.GenericAPIView):
+class RetrieveRemoveFollowingView(UserIdentityMapMixin, generics.GenericAPIView):
     serializer_class = FollowingSerializer
     permission_classes = [permissions.IsAuthenticated, IsUserOrReadOnly]
     lookup_field = "id"
@@ -333,22 +474,15 @@ class RetrieveRemoveFollowingView(generics.GenericAPIView):
             user__is_active=True, followed_user__is_active=True
         )
 
-    def get_object(self) -> Optional[CustomUser]:
-        try:
-            user = CustomUser.objects.get(id=self.kwargs.get("id"))
-        except CustomUser.DoesNotExist:
-            return None
-        return user
-
     @swagger_auto_schema(
         operation_id="followed-user-detail",
     )
     def get(self, request: Request, id: str, followed_id: str) -> Response:
         """Retreive followed user"""
         try:
-            follower_contract = UserFollowing.objects.get(
-                user__id=id, followed_user__id=followed_id
-            )
+            follower_contract = FollowingSerializer.setup_eager_loading(
+                UserFollowing.objects.all()
+            ).get(user__id=id, followed_user__id=followed_id)
         except UserFollowing.DoesNotExist:
             raise exceptions.NotFound("Followed user with this id not found")
 
@@ -362,14 +496,11 @@ class RetrieveRemoveFollowingView(generics.GenericAPIView):
     def delete(self, request: Request, id: str, followed_id: str) -> Response:
         """Unfollow a user."""
 
-        try:
-            follower_contract = UserFollowing.objects.get(
-                user=request.user, followed_user__id=followed_id
-            )
-        except UserFollowing.DoesNotExist:
+        if not followed_id.isdigit() or not UserFollowing.objects.unfollow(
+            user_id=request.user.id, followed_user_id=int(followed_id)
+        ):
             raise exceptions.NotFound("You are not presently following this user.")
 
-        follower_contract.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -384,7 +515,7 @@ class ListNotificationsView(generics.ListAPIView):
     filter_fields = ["unread", "timestamp"]
 
     def get_queryset(self) -> QuerySet[Notification]:
-        return self.request.user.notifications.all()
+        return self.request.user.visible_notifications()
 
 
 class NotificationsDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -392,7 +523,11 @@ class NotificationsDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self) -> QuerySet[Notification]:
-        return self.request.user.notifications.unread()
+        return self.request.user.visible_notifications().unread()
+
+    def perform_destroy(self, instance: Notification) -> None:
+        instance.delete()
+        unread.adjust({instance.recipient_id: -1})
 
 
 class MarkAllNotificationsAsReadView(APIView):
@@ -401,22 +536,96 @@ class MarkAllNotificationsAsReadView(APIView):
 
     def post(self, request: Request) -> Response:
         """Mark all notifications as read."""
-        notifications = Notification.objects.filter(
-            recipient=self.request.user, unread=True
-        )
+        notifications = self.request.user.visible_notifications().filter(unread=True)
         count = notifications.mark_all_as_read()
+        unread.adjust({self.request.user.id: -count})
         return Response(data={"status": True, "marked_notifications": count})
 
 
-class DeleteAllNotificationsView(APIView):
-    serializer_class = NotificationSerializer
+class UnreadNotificationsCountView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self) -> QuerySet[Notification]:
-        return self.request.user.notifications.all()
+    @swagger_auto_schema(
+        operation_id="unread-notifications-count",
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={"unread": openapi.Schema(type=openapi.TYPE_INTEGER)},
+            )
+        },
+    )
+    def get(self, request: Request) -> Response:
+        """Number of unread notifications of the authenticated user."""
+        return Response(data={"unread": unread.get_count(request.user.id)})
 
+
+class DeleteAllNotificationsView(APIView):
+    serializer_class = NotificationDeletionJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(responses={202: NotificationDeletionJobSerializer})
     def delete(self, request: Request) -> Response:
-        """Mark all notifications as read."""
-        notifications = self.get_queryset()
-        notifications.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        """
+        Hide all notifications right away and delete them in the background.
+        The returned job can be polled for the deletion's progress.
+        """
+        watermark = Notification.objects.aggregate(Max("id"))["id__max"] or 0
+
+        with transaction.atomic():
+            CustomUser.objects.filter(id=request.user.id).update(
+                notifications_watermark=watermark
+            )
+            job = NotificationDeletionJob.objects.create(
+                user=request.user, watermark=watermark
+            )
+            auth_cache.invalidate_user(request.user.id)
+            unread.invalidate([request.user.id])
+            transaction.on_commit(lambda: delete_notifications_task.delay(job.id))
+
+        serializer = self.serializer_class(instance=job)
+        return Response(data=serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+class NotificationDeletionJobView(generics.RetrieveAPIView):
+    """Progress of a DeleteAllNotificationsView job."""
+
+    serializer_class = NotificationDeletionJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self) -> QuerySet[NotificationDeletionJob]:
+        return self.request.user.notification_deletion_jobs.all()
+
+
+class RealtimeConnectionTokenView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_id="realtime-connection-token", responses={200: TOKEN_SCHEMA}
+    )
+    def get(self, request: Request) -> Response:
+        """Token the authenticated user connects to Centrifugo with."""
+        return Response(data=realtime_tokens.get_token(request.user.id))
+
+
+class RealtimeSubscriptionTokenView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_id="realtime-subscription-token",
+        manual_parameters=[CHANNEL_PARAMETER],
+        responses={200: TOKEN_SCHEMA},
+    )
+    def get(self, request: Request) -> Response:
+        """Token subscribing the authenticated user to a Centrifugo channel."""
+        channel = request.query_params.get("channel", "").strip()
+
+        if not channel:
+            raise exceptions.ValidationError(
+                {"channel": ["This query parameter is required."]}
+            )
+
+        token = realtime_tokens.get_token(request.user.id, channel)
+        if token is None:
+            raise exceptions.PermissionDenied("Can not subscribe to this channel.")
+
+        return Response(data={"channel": channel, **token})
@@ -0,0 +1,153 @@
+"""
+Caches behind CachedJWTAuthentication.
+
+Verified access tokens are kept in an in-process LRU until they expire, so a
+token's signature is checked once per worker instead of once per request.
+The USER_FIELDS of user rows are kept in Redis as JSON for
+AUTH_USER_CACHE_TIMEOUT seconds, keyed by id, so request.user can be resolved
+without a database query.
+
+invalidate_user() drops both whenever a user row is written or deleted,
+which covers deactivation and password changes. The user entry is shared by
+all workers. Tokens cached by other workers stay verified, but every request
+still goes through the user cache, so an inactive user is turned away on the
+next request everywhere.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from redis import RedisError
+
+from HabbitBackend.redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# the only columns cached, password hashes and other fields are never copied
+USER_FIELDS = [
+    "id",
+    "is_active",
+    "email",
+    "username",
+    "follower_count",
+    "following_count",
+    "notifications_watermark",
+]
+
+_tokens: "OrderedDict[bytes, Tuple[Any, int, float]]" = OrderedDict()
+_tokens_lock = threading.Lock()
+
+
+def user_key(user_id: int) -> str:
+    return f"auth:user:{user_id}"
+
+
+def get_token(raw_token: bytes) -> Optional[Any]:
+    """The validated token cached for `raw_token`, if it has not expired."""
+    with _tokens_lock:
+        entry = _tokens.get(raw_token)
+
+        if entry is None:
+            return None
+
+        validated_token, _, expires_at = entry
+        if expires_at <= time.time():
+            del _tokens[raw_token]
+            return None
+
+        _tokens.move_to_end(raw_token)
+        return validated_token
+
+
+def set_token(
+    raw_token: bytes, validated_token: Any, user_id: int, expires_at: float
+) -> None:
+    with _tokens_lock:
+        _tokens[raw_token] = (validated_token, user_id, expires_at)
+        _tokens.move_to_end(raw_token)
+
+        while len(_tokens) > settings.AUTH_TOKEN_CACHE_SIZE:
+            _tokens.popitem(last=False)
+
+
+def clear_tokens() -> None:
+    with _tokens_lock:
+        _tokens.clear()
+
+
+def get_user(user_id: int) -> Optional[Any]:
+    """
+    The cached user, rebuilt from USER_FIELDS. Its other fields are deferred
+    and loaded from the database on first access.
+    """
+    try:
+        payload = get_redis_connection().get(user_key(user_id))
+    except RedisError:
+        logger.exception("User cache unavailable.")
+        return None
+
+    if not payload:
+        return None
+
+    fields = json.loads(payload)
+
+    # written by a deploy that cached other fields
+    if set(fields) != set(USER_FIELDS):
+        return None
+
+    CustomUser = apps.get_model("account", "CustomUser")
+    # from_db expects the values in the model's field order
+    names = [
+        field.attname
+        for field in CustomUser._meta.concrete_fields
+        if field.attname in fields
+    ]
+    return CustomUser.from_db(
+        CustomUser.objects.db, names, [fields[name] for name in names]
+    )
+
+
+def set_user(user: Any) -> None:
+    payload = json.dumps({name: getattr(user, name) for name in USER_FIELDS})
+
+    try:
+        get_redis_connection().set(
+            user_key(user.id), payload, ex=settings.AUTH_USER_CACHE_TIMEOUT
+        )
+    except RedisError:
+        logger.exception("User cache write failed.")
+
+
+def _invalidate(user_ids: Tuple[int, ...]) -> None:
+    with _tokens_lock:
+        stale = [
+            raw_token
+            for raw_token, (_, user_id, _) in _tokens.items()
+            if user_id in user_ids
+        ]
+        for raw_token in stale:
+            del _tokens[raw_token]
+
+    try:
+        get_redis_connection().delete(*(user_key(user_id) for user_id in user_ids))
+    except RedisError:
+        logger.exception("User cache invalidation failed.")
+
+
+def invalidate_user(*user_ids: int, using: Optional[str] = None) -> None:
+    """
+    Forget the cached rows and tokens of `user_ids`, now and again once the
+    current transaction commits, so a request racing the write can not put
+    the old row back.
+    """
+    if not user_ids:
+        return
+
+    _invalidate(user_ids)
+    transaction.on_commit(lambda: _invalidate(user_ids), using=using)
@@ -0,0 +1,46 @@
+from typing import Any
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from account import auth_cache
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves most requests without verifying the token
+    signature again or querying the user table, see account.auth_cache.
+    """
+
+    def get_validated_token(self, raw_token: bytes) -> Any:
+        validated_token = auth_cache.get_token(raw_token)
+
+        if validated_token is None:
+            validated_token = super().get_validated_token(raw_token)
+            user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+
+            if user_id is not None:
+                auth_cache.set_token(
+                    raw_token, validated_token, user_id, validated_token["exp"]
+                )
+
+        return validated_token
+
+    def get_user(self, validated_token: Any) -> Any:
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = auth_cache.get_user(user_id)
+
+        if user is None:
+            user = super().get_user(validated_token)
+            auth_cache.set_user(user)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return user
@@ -0,0 +1,298 @@
+"""
+Bloom filter in front of the refresh token blacklist.
+
+Every refresh and logout checks BlacklistedToken for the token's jti, and the
+answer is nearly always "not blacklisted". The jtis of unexpired blacklisted
+tokens are hashed into a Redis bitmap, so a jti whose bits are not all set is
+known to be absent without a query. Only possible members, i.e. blacklisted
+tokens and the occasional false positive, go to the database.
+
+A Bloom filter can not forget members, so prune_expired_tokens_task rebuilds
+it from the table after deleting expired tokens. Rebuilds run one at a time
+under REBUILD_LOCK_KEY, which holds a token renewed after every chunk. The
+filter is built in a staging key named after that token and renamed into
+place only while the lock is still held, and blacklist writes made during a
+rebuild go to both keys. A blacklist write that fails drops the filter and
+the lock, so lookups go to the database and a running rebuild is discarded.
+
+Only a filter installed by a rebuild is complete, so the rename also sets a
+marker bit past the last filter bit. Lookups and writes ignore a filter
+without it, e.g. after an invalidation, an eviction or a Redis restart, and
+lookups then go to the database while rebuild_token_blacklist_filter_task
+builds a new one in the background.
+"""
+import hashlib
+import logging
+import math
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+from redis import RedisError, WatchError
+
+from HabbitBackend.redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+FILTER_KEY = "blacklist:bloom"
+STAGING_KEY_PREFIX = "blacklist:bloom:staging:"
+REBUILD_LOCK_KEY = "blacklist:bloom:lock"
+REBUILD_REQUESTED_KEY = "blacklist:bloom:requested"
+STATS_KEY = "blacklist:stats"
+
+
+def filter_size() -> int:
+    """Bits needed for the configured capacity and false positive rate."""
+    capacity = settings.TOKEN_BLACKLIST_BLOOM_CAPACITY
+    error_rate = settings.TOKEN_BLACKLIST_BLOOM_ERROR_RATE
+    return math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+
+
+def marker_offset() -> int:
+    """Bit set only in a complete filter, right after the filter bits."""
+    return filter_size()
+
+
+def hash_count() -> int:
+    bits_per_member = filter_size() / settings.TOKEN_BLACKLIST_BLOOM_CAPACITY
+    return max(1, round(bits_per_member * math.log(2)))
+
+
+def _offsets(jti: str) -> List[int]:
+    """Bit offsets of `jti`, using double hashing over one sha256 digest."""
+    digest = hashlib.sha256(jti.encode()).digest()
+    first = int.from_bytes(digest[:8], "big")
+    second = int.from_bytes(digest[8:16], "big") | 1
+    size = filter_size()
+    return [(first + index * second) % size for index in range(hash_count())]
+
+
+def _blacklisted_jtis() -> Iterable[str]:
+    BlacklistedToken = apps.get_model("token_blacklist", "BlacklistedToken")
+    return (
+        BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+        .order_by()
+        .values_list("token__jti", flat=True)
+        .iterator(chunk_size=settings.TOKEN_BLACKLIST_BLOOM_CHUNK_SIZE)
+    )
+
+
+def staging_key(lock_token: str) -> str:
+    return f"{STAGING_KEY_PREFIX}{lock_token}"
+
+
+def _renew_lock(lock_token: str) -> bool:
+    """Extend the rebuild lock, unless it no longer holds `lock_token`."""
+    with get_redis_connection().pipeline() as pipe:
+        try:
+            pipe.watch(REBUILD_LOCK_KEY)
+            # a watching pipeline runs commands immediately
+            if pipe.get(REBUILD_LOCK_KEY) != lock_token.encode():  # type: ignore
+                return False
+            pipe.multi()
+            pipe.expire(REBUILD_LOCK_KEY, settings.TOKEN_BLACKLIST_BLOOM_LOCK_TIMEOUT)
+            pipe.execute()
+            return True
+        except WatchError:
+            return False
+
+
+def _release(lock_token: str) -> None:
+    """Delete the rebuild lock and staging key, unless the lock changed hands."""
+    connection = get_redis_connection()
+    connection.delete(staging_key(lock_token))
+
+    with connection.pipeline() as pipe:
+        try:
+            pipe.watch(REBUILD_LOCK_KEY)
+            if pipe.get(REBUILD_LOCK_KEY) == lock_token.encode():  # type: ignore
+                pipe.multi()
+                pipe.delete(REBUILD_LOCK_KEY)
+                pipe.execute()
+        except WatchError:
+            pass
+
+
+def _install(lock_token: str) -> bool:
+    """Rename the staging filter into place if the lock is still held."""
+    with get_redis_connection().pipeline() as pipe:
+        try:
+            pipe.watch(REBUILD_LOCK_KEY)
+            if pipe.get(REBUILD_LOCK_KEY) != lock_token.encode():  # type: ignore
+                return False
+            pipe.multi()
+            pipe.setbit(staging_key(lock_token), marker_offset(), 1)
+            pipe.rename(staging_key(lock_token), FILTER_KEY)
+            pipe.persist(FILTER_KEY)
+            pipe.execute()
+            return True
+        except WatchError:
+            return False
+
+
+def rebuild() -> Optional[int]:
+    """
+    Rebuild the filter from the blacklist table, returns the members added.
+    None when another rebuild holds the lock, or this one lost it before the
+    filter was renamed into place.
+    """
+    connection = get_redis_connection()
+    lock_token = uuid.uuid4().hex
+    timeout = settings.TOKEN_BLACKLIST_BLOOM_LOCK_TIMEOUT
+
+    # taken before the table is read, so add() writes every later blacklisted
+    # jti to this rebuild's staging key
+    if not connection.set(REBUILD_LOCK_KEY, lock_token, nx=True, ex=timeout):
+        return None
+
+    try:
+        staging = staging_key(lock_token)
+        chunk_size = settings.TOKEN_BLACKLIST_BLOOM_CHUNK_SIZE
+        pipe = connection.pipeline(transaction=False)
+        # the last bit is always set so an empty filter still exists
+        pipe.setbit(staging, filter_size() - 1, 1)
+        pipe.expire(staging, timeout)
+        added = 0
+
+        for added, jti in enumerate(_blacklisted_jtis(), start=1):
+            for offset in _offsets(jti):
+                pipe.setbit(staging, offset, 1)
+            if added % chunk_size == 0:
+                pipe.expire(staging, timeout)
+                pipe.execute()
+                if not _renew_lock(lock_token):
+                    logger.warning("Token blacklist filter rebuild lost its lock.")
+                    return None
+
+        pipe.execute()
+        if not _install(lock_token):
+            logger.warning("Token blacklist filter rebuild lost its lock.")
+            return None
+        return added
+    finally:
+        _release(lock_token)
+
+
+def invalidate() -> None:
+    """Drop the filter and abandon a running rebuild, lookups use the table."""
+    try:
+        get_redis_connection().delete(
+            FILTER_KEY, REBUILD_LOCK_KEY, REBUILD_REQUESTED_KEY
+        )
+    except RedisError:
+        logger.exception("Token blacklist filter could not be invalidated.")
+
+
+def add(jti: str) -> None:
+    """
+    Record a newly blacklisted jti in the live filter, if it is complete, and
+    the staging filter of a running rebuild. When that fails the filter is
+    invalidated, so the jti is never reported as certainly not blacklisted.
+    """
+    try:
+        with get_redis_connection().pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(FILTER_KEY, REBUILD_LOCK_KEY)
+                    # a watching pipeline runs commands immediately
+                    built = pipe.getbit(FILTER_KEY, marker_offset())
+                    lock_token = pipe.get(REBUILD_LOCK_KEY)
+                    keys = [FILTER_KEY] if built else []
+                    if lock_token is not None:
+                        keys.append(staging_key(lock_token.decode()))  # type: ignore
+
+                    pipe.multi()
+                    for key in keys:
+                        for offset in _offsets(jti):
+                            pipe.setbit(key, offset, 1)
+                    if lock_token is not None:
+                        pipe.expire(
+                            keys[-1], settings.TOKEN_BLACKLIST_BLOOM_LOCK_TIMEOUT
+                        )
+                    pipe.execute()
+                    return
+                except WatchError:
+                    continue
+    except RedisError:
+        logger.exception("Token blacklist filter write failed.")
+        invalidate()
+
+
+def request_rebuild() -> None:
+    """Start a rebuild in the background, at most once per lock timeout."""
+    from account.api.v1.tasks import rebuild_token_blacklist_filter_task
+
+    if get_redis_connection().set(
+        REBUILD_REQUESTED_KEY,
+        1,
+        nx=True,
+        ex=settings.TOKEN_BLACKLIST_BLOOM_LOCK_TIMEOUT,
+    ):
+        rebuild_token_blacklist_filter_task.delay()
+
+
+def might_contain(jti: str) -> Optional[bool]:
+    """
+    False when `jti` is certainly not blacklisted and True when it may be.
+    None when there is no complete filter and the database has to be asked.
+    """
+    try:
+        connection = get_redis_connection()
+        pipe = connection.pipeline()
+        pipe.getbit(FILTER_KEY, marker_offset())
+        for offset in _offsets(jti):
+            pipe.getbit(FILTER_KEY, offset)
+        built, *bits = pipe.execute()
+
+        if not built:
+            request_rebuild()
+            return None
+
+        found = all(bits)
+        pipe = connection.pipeline(transaction=False)
+        pipe.hincrby(STATS_KEY, "checks", 1)
+        if found:
+            pipe.hincrby(STATS_KEY, "positives", 1)
+        pipe.execute()
+        return found
+    except RedisError:
+        logger.exception("Token blacklist filter unavailable.")
+        return None
+
+
+def record_false_positive() -> None:
+    try:
+        get_redis_connection().hincrby(STATS_KEY, "false_positives", 1)
+    except RedisError:
+        logger.exception("Token blacklist filter unavailable.")
+
+
+def metrics() -> Dict[str, float]:
+    """Blacklist table sizes and the observed filter false positive rate."""
+    OutstandingToken = apps.get_model("token_blacklist", "OutstandingToken")
+    BlacklistedToken = apps.get_model("token_blacklist", "BlacklistedToken")
+
+    try:
+        stats = {
+            key.decode(): int(value)
+            for key, value in get_redis_connection().hgetall(STATS_KEY).items()
+        }
+    except RedisError:
+        logger.exception("Token blacklist filter unavailable.")
+        stats = {}
+
+    checks = stats.get("checks", 0)
+    false_positives = stats.get("false_positives", 0)
+    negatives = checks - stats.get("positives", 0) + false_positives
+
+    return {
+        "outstanding_tokens": OutstandingToken.objects.count(),
+        "blacklisted_tokens": BlacklistedToken.objects.count(),
+        "filter_checks": checks,
+        "filter_false_positives": false_positives,
+        "filter_false_positive_rate": (
+            false_positives / negatives if negatives else 0.0
+        ),
+    }
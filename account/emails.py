@@ -0,0 +1,117 @@
+"""
+Batched transactional email.
+
+Outgoing messages are plain dicts pushed onto a Redis list, the outbox. The
+first message pushed into an empty window schedules one flush, which drains
+the outbox in batches of EMAIL_BATCH_SIZE and sends every batch over a
+single backend connection instead of one SMTP session per message. HTML
+templates are compiled once per process.
+
+A message is a dict with "subject", "to", "body" and optionally
+"html_template" and "context", plus the "attempt" it is on once it failed.
+"""
+import json
+from functools import lru_cache
+from smtplib import SMTPException
+from typing import Any, Dict, List, Optional, Sequence
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.template.backends.django import Template
+from django.template.loader import get_template
+
+from HabbitBackend.redis_client import get_redis_connection
+
+OUTBOX_KEY = "emails:outbox"
+FLUSH_SCHEDULED_KEY = "emails:flush-scheduled"
+
+RESET_PASSWORD_TEMPLATE = "account/api/v1/templates/resetpassword.html"
+
+
+@lru_cache(maxsize=None)
+def get_cached_template(name: str) -> Template:
+    return get_template(name)
+
+
+def reset_password_otp_email(email: str, token: int) -> Dict[str, Any]:
+    return {
+        "subject": "Reset Password OTP",
+        "to": [email],
+        "body": (
+            f"Use the following OTP to complete your password reset {token}. "
+            "OTP is valid for 5 minutes"
+        ),
+        "html_template": RESET_PASSWORD_TEMPLATE,
+        "context": {"otp": token},
+    }
+
+
+def build_message(
+    payload: Dict[str, Any], connection: Optional[BaseEmailBackend] = None
+) -> EmailMultiAlternatives:
+    message = EmailMultiAlternatives(
+        payload["subject"],
+        payload["body"],
+        settings.EMAIL_HOST_USER,
+        payload["to"],
+        connection=connection,
+    )
+
+    if payload.get("html_template"):
+        template = get_cached_template(payload["html_template"])
+        message.attach_alternative(
+            template.render(payload.get("context", {})), "text/html"
+        )
+
+    return message
+
+
+def push(payloads: Sequence[Dict[str, Any]]) -> bool:
+    """
+    Add messages to the outbox. True when no flush is scheduled for the
+    current window and the caller has to schedule one.
+    """
+    pipe = get_redis_connection().pipeline(transaction=False)
+    pipe.rpush(OUTBOX_KEY, *(json.dumps(payload) for payload in payloads))
+    pipe.set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=settings.EMAIL_BATCH_WINDOW * 10)
+    return bool(pipe.execute()[1])
+
+
+def pop_batch(size: int) -> List[Dict[str, Any]]:
+    pipe = get_redis_connection().pipeline(transaction=True)
+    pipe.lrange(OUTBOX_KEY, 0, size - 1)
+    pipe.ltrim(OUTBOX_KEY, size, -1)
+    return [json.loads(payload) for payload in pipe.execute()[0]]
+
+
+def start_flush() -> None:
+    """Let the next push schedule another flush, called as a flush starts."""
+    get_redis_connection().delete(FLUSH_SCHEDULED_KEY)
+
+
+def send_batch(
+    payloads: Sequence[Dict[str, Any]], connection: Optional[BaseEmailBackend] = None
+) -> List[Dict[str, Any]]:
+    """
+    Send messages over one connection, returns the ones that failed. If the
+    connection can not be opened every message failed.
+    """
+    connection = connection or get_connection()
+    failed = []
+
+    try:
+        connection.open()
+    except (SMTPException, OSError):
+        return list(payloads)
+
+    try:
+        for payload in payloads:
+            try:
+                build_message(payload, connection).send()
+            except (SMTPException, OSError):
+                failed.append(payload)
+    finally:
+        connection.close()
+
+    return failed
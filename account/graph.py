@@ -0,0 +1,272 @@
+"""
+Redis backed cache of the social graph.
+
+Every user gets two Redis sets, the ids of the users following them and the
+ids of the users they follow. Only unblocked UserFollowing rows are part of
+the graph, so the cardinalities match CustomUser.follower_count and
+CustomUser.following_count.
+
+Sets are loaded from the database on a cache miss and written through by
+UserFollowingManager once a follow, unfollow or (un)block is committed. A set
+always holds the LOADED marker member so an empty but loaded set can be told
+apart from a missing one.
+
+Every write through also bumps a short lived version key next to each set it
+concerns, whether the set is cached or not. Loads watch the set and its
+version key, so a load that read the database before a change committed is
+discarded and retried instead of caching the stale rows.
+"""
+import logging
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from redis import RedisError, WatchError
+
+from HabbitBackend.redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+FOLLOWERS = "followers"
+FOLLOWING = "following"
+LOADED = b"loaded"
+# seconds a version key outlives its last write through, far longer than a load
+VERSION_TIMEOUT = 5 * 60
+
+
+def graph_key(direction: str, user_id: int) -> str:
+    return f"graph:{direction}:{user_id}"
+
+
+def version_key(key: str) -> str:
+    return f"{key}:version"
+
+
+def _load_many(direction: str, user_ids: List[int]) -> Dict[int, List[int]]:
+    UserFollowing = apps.get_model("account", "UserFollowing")
+    active = UserFollowing.objects.filter(blocked=False).order_by()
+    ids: Dict[int, List[int]] = {user_id: [] for user_id in user_ids}
+
+    if direction == FOLLOWERS:
+        rows = active.filter(followed_user_id__in=user_ids).values_list(
+            "followed_user_id", "user_id"
+        )
+    else:
+        rows = active.filter(user_id__in=user_ids).values_list(
+            "user_id", "followed_user_id"
+        )
+
+    for user_id, other_user_id in rows:
+        ids[user_id].append(other_user_id)
+
+    return ids
+
+
+def _load_ids(direction: str, user_id: int) -> List[int]:
+    return _load_many(direction, [user_id])[user_id]
+
+
+def _load(direction: str, user_id: int) -> None:
+    """Cache a set from the database, unless a write through races the load."""
+    key = graph_key(direction, user_id)
+
+    with get_redis_connection().pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(key, version_key(key))
+                # a watching pipeline runs commands immediately
+                if pipe.sismember(key, LOADED):
+                    return
+                ids = _load_ids(direction, user_id)
+                pipe.multi()
+                pipe.sadd(key, LOADED, *ids)
+                pipe.expire(key, settings.SOCIAL_GRAPH_CACHE_TIMEOUT)
+                pipe.execute()
+                return
+            except WatchError:
+                continue
+
+
+def _ensure_loaded(*entries: Tuple[str, int]) -> None:
+    """Load the given sets from the database if they are not cached."""
+    pipe = get_redis_connection().pipeline(transaction=False)
+
+    for direction, user_id in entries:
+        pipe.sismember(graph_key(direction, user_id), LOADED)
+
+    for (direction, user_id), loaded in zip(entries, pipe.execute()):
+        if not loaded:
+            _load(direction, user_id)
+
+
+def _decode(members: Iterable[Any]) -> Set[int]:
+    return {int(member) for member in members if member != LOADED}
+
+
+def is_following(user_id: int, followed_user_id: int) -> bool:
+    """Whether `user_id` follows `followed_user_id` without being blocked."""
+    try:
+        key = graph_key(FOLLOWING, user_id)
+        pipe = get_redis_connection().pipeline(transaction=False)
+        pipe.sismember(key, LOADED)
+        pipe.sismember(key, followed_user_id)
+        loaded, member = pipe.execute()
+
+        if loaded:
+            return bool(member)
+
+        _load(FOLLOWING, user_id)
+        return bool(get_redis_connection().sismember(key, followed_user_id))
+    except RedisError:
+        logger.exception("Social graph cache unavailable.")
+        return followed_user_id in _load_ids(FOLLOWING, user_id)
+
+
+def get_ids(direction: str, user_id: int) -> Set[int]:
+    """Ids of the followers or followed users of a user."""
+    try:
+        _ensure_loaded((direction, user_id))
+        return _decode(get_redis_connection().smembers(graph_key(direction, user_id)))
+    except RedisError:
+        logger.exception("Social graph cache unavailable.")
+        return set(_load_ids(direction, user_id))
+
+
+def count(direction: str, user_id: int) -> int:
+    """Number of followers or followed users of a user."""
+    try:
+        _ensure_loaded((direction, user_id))
+        return get_redis_connection().scard(graph_key(direction, user_id)) - 1
+    except RedisError:
+        logger.exception("Social graph cache unavailable.")
+        return len(_load_ids(direction, user_id))
+
+
+def intersection(*entries: Tuple[str, int]) -> Set[int]:
+    """
+    Intersect several cached sets, e.g. the mutuals of a user are
+    intersection((FOLLOWERS, user_id), (FOLLOWING, user_id)).
+    """
+    try:
+        _ensure_loaded(*entries)
+        keys = [graph_key(direction, user_id) for direction, user_id in entries]
+        return _decode(get_redis_connection().sinter(keys))
+    except RedisError:
+        logger.exception("Social graph cache unavailable.")
+        sets = [set(_load_ids(direction, user_id)) for direction, user_id in entries]
+        return set.intersection(*sets)
+
+
+def mutuals(user_id: int) -> Set[int]:
+    """Users that follow `user_id` and are followed back."""
+    return intersection((FOLLOWERS, user_id), (FOLLOWING, user_id))
+
+
+def _write(follows: Iterable[Tuple[int, int]], add: bool) -> None:
+    """
+    Apply follow changes to the sets that are already cached. Missing sets are
+    left alone, they are loaded with the change on their next read.
+    """
+    follows = list(follows)
+
+    if not follows:
+        return
+
+    try:
+        connection = get_redis_connection()
+        entries = []
+        for user_id, followed_user_id in follows:
+            entries.append((graph_key(FOLLOWING, user_id), followed_user_id))
+            entries.append((graph_key(FOLLOWERS, followed_user_id), user_id))
+
+        pipe = connection.pipeline(transaction=False)
+        for key, _ in entries:
+            pipe.incr(version_key(key))
+            pipe.expire(version_key(key), VERSION_TIMEOUT)
+            pipe.sismember(key, LOADED)
+        loaded = pipe.execute()[2::3]
+
+        pipe = connection.pipeline(transaction=False)
+        for (key, member), is_loaded in zip(entries, loaded):
+            if not is_loaded:
+                continue
+            if add:
+                pipe.sadd(key, member)
+            else:
+                pipe.srem(key, member)
+        pipe.execute()
+    except RedisError:
+        logger.exception("Social graph cache write through failed.")
+
+
+def add_follows(follows: Iterable[Tuple[int, int]]) -> None:
+    _write(follows, add=True)
+
+
+def remove_follows(follows: Iterable[Tuple[int, int]]) -> None:
+    _write(follows, add=False)
+
+
+def _replace(user_ids: List[int]) -> Optional[int]:
+    """
+    Replace the cached sets of `user_ids` with freshly loaded ones in a single
+    transaction, so readers see either the old or the new sets. Returns the
+    number of follows written, or None if a write through touched one of the
+    sets while it was loaded.
+    """
+    timeout = settings.SOCIAL_GRAPH_CACHE_TIMEOUT
+    keys = [
+        graph_key(direction, user_id)
+        for user_id in user_ids
+        for direction in (FOLLOWERS, FOLLOWING)
+    ]
+
+    with get_redis_connection().pipeline() as pipe:
+        try:
+            pipe.watch(*keys, *(version_key(key) for key in keys))
+            loaded = {
+                direction: _load_many(direction, user_ids)
+                for direction in (FOLLOWERS, FOLLOWING)
+            }
+            pipe.multi()
+            for direction, ids in loaded.items():
+                for user_id in user_ids:
+                    key = graph_key(direction, user_id)
+                    pipe.delete(key)
+                    pipe.sadd(key, LOADED, *ids[user_id])
+                    pipe.expire(key, timeout)
+            pipe.execute()
+        except WatchError:
+            return None
+
+    return sum(len(ids) for ids in loaded[FOLLOWING].values())
+
+
+def warm(user_ids: Iterable[int], chunk_size: int) -> int:
+    """
+    Rebuild the cached sets of `user_ids`, loading and replacing `chunk_size`
+    users at a time. A chunk whose sets were written through while it was
+    loaded is retried one user at a time, so a concurrent (un)follow is never
+    overwritten by the rows read before it. Returns the number of follows
+    written.
+    """
+    user_ids = iter(user_ids)
+    written = 0
+
+    while True:
+        chunk = list(islice(user_ids, chunk_size))
+
+        if not chunk:
+            return written
+
+        replaced = _replace(chunk)
+        if replaced is not None:
+            written += replaced
+            continue
+
+        for user_id in chunk:
+            replaced = None
+            while replaced is None:
+                replaced = _replace([user_id])
+            written += replaced
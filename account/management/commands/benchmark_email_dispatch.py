@@ -0,0 +1,67 @@
+import time
+from typing import Any, Callable
+
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management import BaseCommand, CommandParser
+from django.template.loader import get_template
+
+from account import emails
+
+
+class Command(BaseCommand):
+    """Django command to compare per message and batched email sending"""
+
+    help = (
+        "Send N password reset emails one connection per message, then through "
+        "the batched outbox, and report messages/sec for both."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--emails", type=int, default=10000)
+        parser.add_argument(
+            "--backend", default="django.core.mail.backends.locmem.EmailBackend"
+        )
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def timed(self, label: str, count: int, send: Callable[[], None]) -> None:
+        mail.outbox = []
+        start = time.perf_counter()
+        send()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"{label}: {count / elapsed:.0f} emails/sec")
+
+    def handle(self, *args: list[Any], **options: Any) -> None:
+        count = options["emails"]
+        backend = options["backend"]
+        payloads = [
+            emails.reset_password_otp_email(f"user-{index}@example.com", 123456)
+            for index in range(count)
+        ]
+
+        def send_one_by_one() -> None:
+            for payload in payloads:
+                html = get_template(payload["html_template"]).render(payload["context"])
+                message = EmailMultiAlternatives(
+                    payload["subject"],
+                    payload["body"],
+                    to=payload["to"],
+                    connection=get_connection(backend),
+                )
+                message.attach_alternative(html, "text/html")
+                message.send()
+
+        def send_batched() -> None:
+            connection = get_connection(backend)
+            batch_size = options["batch_size"]
+            remaining = payloads
+            while remaining:
+                emails.push(remaining[:batch_size])
+                remaining = remaining[batch_size:]
+            while batch := emails.pop_batch(options["batch_size"]):
+                emails.send_batch(batch, connection)
+
+        self.timed("one connection per email", count, send_one_by_one)
+        self.timed("batched outbox", count, send_batched)
+        emails.start_flush()
+        self.stdout.write(self.style.SUCCESS("Benchmark finished."))
@@ -0,0 +1,40 @@
+import time
+from typing import Any
+
+from django.core.management import BaseCommand, CommandParser
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from account.api.v1.serializers import UserSerializer
+
+
+class Command(BaseCommand):
+    """Django command to measure signup throughput"""
+
+    help = "Sign up synthetic users through UserSerializer and roll them back."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--signups", type=int, default=50)
+
+    def handle(self, *args: list[Any], **options: Any) -> None:
+        signups = options["signups"]
+
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for index in range(signups):
+                serializer = UserSerializer(
+                    data={
+                        "email": f"signup-benchmark-{index}@example.com",
+                        "password": "benchmark-password",
+                    }
+                )
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{signups / elapsed:.1f} signups/sec, "
+            f"{len(queries) / signups:.1f} queries per signup"
+        )
+        self.stdout.write(self.style.SUCCESS("Benchmark finished."))
@@ -0,0 +1,85 @@
+import random
+import statistics
+import string
+import time
+from typing import Any, Callable, Iterator, List
+
+from django.core.management import BaseCommand, CommandParser
+from django.db import connection, transaction
+
+from account.models import CustomUser
+from account.search import autocomplete_users, search_users
+
+
+class Command(BaseCommand):
+    """Django command to measure user search latency on synthetic users"""
+
+    help = (
+        "Insert synthetic users, time search and autocomplete queries and "
+        "roll everything back."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--users", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def generate_users(self, count: int, rng: random.Random) -> Iterator[CustomUser]:
+        for index in range(count):
+            name = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 12)))
+            yield CustomUser(
+                username=f"{name}-{index}",
+                email=f"{name}.{index}@bench.example.com",
+                password="!",
+            )
+
+    def timed(self, query: Callable[[str], Any], terms: List[str]) -> List[float]:
+        timings = []
+        for term in terms:
+            start = time.perf_counter()
+            list(query(term))
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def report(self, label: str, timings: List[float]) -> None:
+        p50, p95, p99 = (
+            statistics.quantiles(timings, n=100)[index] for index in (49, 94, 98)
+        )
+        self.stdout.write(
+            f"{label}: p50={p50:.2f}ms p95={p95:.2f}ms p99={p99:.2f}ms "
+            f"({len(timings)} queries)"
+        )
+
+    def handle(self, *args: list[Any], **options: Any) -> None:
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+
+        with transaction.atomic():
+            users = self.generate_users(options["users"], rng)
+            while batch := [user for _, user in zip(range(batch_size), users)]:
+                CustomUser.objects.bulk_create(batch, batch_size=batch_size)
+
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE account_customuser")
+
+            sample = CustomUser.objects.order_by("?").values_list(
+                "username", flat=True
+            )[: options["queries"]]
+            prefixes = [username[: rng.randint(2, 4)] for username in sample]
+            fragments = [username[1:5] for username in sample]
+            queryset = CustomUser.objects.filter(is_active=True)
+
+            self.report(
+                "search",
+                self.timed(lambda term: search_users(queryset, term), fragments),
+            )
+            self.report(
+                "autocomplete",
+                self.timed(lambda term: autocomplete_users(queryset, term), prefixes),
+            )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("Benchmark finished."))
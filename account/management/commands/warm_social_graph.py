@@ -0,0 +1,26 @@
+from typing import Any
+
+from django.core.management import BaseCommand, CommandParser
+
+from account import graph
+from account.models import CustomUser
+
+
+class Command(BaseCommand):
+    """Django command to load the social graph cache from the database"""
+
+    help = "Rebuild the social graph cache of every user, chunk by chunk."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args: list[Any], **options: Any) -> None:
+        chunk_size = options["chunk_size"]
+        user_ids = (
+            CustomUser.objects.order_by("id")
+            .values_list("id", flat=True)
+            .iterator(chunk_size=chunk_size)
+        )
+
+        written = graph.warm(user_ids, chunk_size)
+        self.stdout.write(self.style.SUCCESS(f"Cached {written} follows."))
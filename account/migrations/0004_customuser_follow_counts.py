@@ -0,0 +1,62 @@
+# Generated by Django 3.2.2 on 2026-10-18 03:38
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_follow_counts(apps, schema_editor):
+    CustomUser = apps.get_model("account", "CustomUser")
+    UserFollowing = apps.get_model("account", "UserFollowing")
+    active = UserFollowing.objects.filter(blocked=False).order_by()
+
+    followers = (
+        active.filter(followed_user=OuterRef("pk"))
+        .values("followed_user")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    following = (
+        active.filter(user=OuterRef("pk"))
+        .values("user")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+
+    CustomUser.objects.update(
+        follower_count=Coalesce(Subquery(followers), 0),
+        following_count=Coalesce(Subquery(following), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("account", "0003_rename_dob_customuser_date_of_birth"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="follower_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="customuser",
+            name="following_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="customuser",
+            name="is_active",
+            field=models.BooleanField(
+                default=True,
+                help_text=(
+                    "Designates whether this user should be treated as active. "
+                    "Unselect this instead of deleting accounts."
+                ),
+                verbose_name="active",
+            ),
+        ),
+        migrations.RunPython(backfill_follow_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.2 on 2026-10-18 03:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("account", "0004_customuser_follow_counts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FollowSuggestion",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(primary_key=True, serialize=False, unique=True),
+                ),
+                ("score", models.PositiveIntegerField()),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "suggested_user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="follow_suggestions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-score", "suggested_user"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="followsuggestion",
+            index=models.Index(
+                fields=["user", "-score", "suggested_user"],
+                name="follow_suggestion_rank",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="followsuggestion",
+            constraint=models.UniqueConstraint(
+                fields=("user", "suggested_user"), name="unique_follow_suggestion"
+            ),
+        ),
+    ]
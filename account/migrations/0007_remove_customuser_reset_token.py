@@ -0,0 +1,17 @@
+# Generated by Django 3.2.2 on 2026-10-18 04:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("account", "0006_customuser_search_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="customuser",
+            name="reset_token",
+        ),
+    ]
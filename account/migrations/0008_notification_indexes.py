@@ -0,0 +1,44 @@
+from django.db import migrations
+
+# (index name, indexed columns) on the django-notifications table
+NOTIFICATION_INDEXES = [
+    # unread counts and the unread notification lookups
+    ("notifications_recipient_unread_ts", '"recipient_id", "unread", "timestamp"'),
+    # the notification list, ordered by timestamp then unread
+    ("notifications_recipient_ts_unread", '"recipient_id", "timestamp", "unread"'),
+]
+
+
+def create_notification_indexes(apps, schema_editor):
+    concurrently = (
+        "CONCURRENTLY " if schema_editor.connection.vendor == "postgresql" else ""
+    )
+
+    for name, columns in NOTIFICATION_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX {concurrently}IF NOT EXISTS "{name}" '
+            f'ON "notifications_notification" ({columns})'
+        )
+
+
+def drop_notification_indexes(apps, schema_editor):
+    concurrently = (
+        "CONCURRENTLY " if schema_editor.connection.vendor == "postgresql" else ""
+    )
+
+    for name, _ in NOTIFICATION_INDEXES:
+        schema_editor.execute(f'DROP INDEX {concurrently}IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("account", "0007_remove_customuser_reset_token"),
+        ("notifications", "0008_index_together_recipient_unread"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_notification_indexes, drop_notification_indexes),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.2.2 on 2026-10-18 04:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.NOTIFICATIONS_NOTIFICATION_MODEL),
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("account", "0009_notification_deletion_jobs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationGroup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(primary_key=True, serialize=False, unique=True),
+                ),
+                ("verb", models.CharField(max_length=255)),
+                ("target_object_id", models.CharField(max_length=255)),
+                ("window_start", models.DateTimeField()),
+                ("actor_count", models.PositiveIntegerField(default=0)),
+                ("sample_actor_ids", models.JSONField(default=list)),
+                (
+                    "notification",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="group",
+                        to=settings.NOTIFICATIONS_NOTIFICATION_MODEL,
+                    ),
+                ),
+                (
+                    "recipient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "target_content_type",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="contenttypes.contenttype",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="notificationgroup",
+            constraint=models.UniqueConstraint(
+                fields=(
+                    "recipient",
+                    "verb",
+                    "target_content_type",
+                    "target_object_id",
+                    "window_start",
+                ),
+                name="unique_notification_group",
+            ),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.2.2 on 2026-10-18 04:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_group_actors(apps, schema_editor):
+    # only the sampled actors are known, later repeats of other actors
+    # still count as new
+    NotificationGroup = apps.get_model("account", "NotificationGroup")
+    NotificationGroupActor = apps.get_model("account", "NotificationGroupActor")
+    CustomUser = apps.get_model("account", "CustomUser")
+    groups = NotificationGroup.objects.only("id", "sample_actor_ids").iterator()
+
+    for group in groups:
+        actor_ids = CustomUser.objects.filter(
+            id__in=group.sample_actor_ids
+        ).values_list("id", flat=True)
+        NotificationGroupActor.objects.bulk_create(
+            [
+                NotificationGroupActor(group_id=group.id, actor_id=actor_id)
+                for actor_id in actor_ids
+            ],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("account", "0010_notification_groups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationGroupActor",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(primary_key=True, serialize=False, unique=True),
+                ),
+                (
+                    "actor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "group",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="actors",
+                        to="account.notificationgroup",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="notificationgroupactor",
+            constraint=models.UniqueConstraint(
+                fields=("group", "actor"), name="unique_notification_group_actor"
+            ),
+        ),
+        migrations.RunPython(backfill_group_actors, migrations.RunPython.noop),
+    ]
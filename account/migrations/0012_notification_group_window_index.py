@@ -0,0 +1,18 @@
+# Generated by Django 3.2.2 on 2026-10-18 05:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("account", "0011_notification_group_actors"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="notificationgroup",
+            name="window_start",
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
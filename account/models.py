@@ -1,15 +1,24 @@
-import random
-from typing import Any, Optional, Sequence, Tuple
+from collections import Counter
+from datetime import datetime
+from typing import Any, Iterable, List, Optional, Sequence, Set, Tuple
 
 from django.apps import apps
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.contrib.auth.validators import UnicodeUsernameValidator
-from django.core import signing
-from django.db import models
-from django.db.models import F, Q, QuerySet
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, models, transaction
+from django.db.models import Case, F, Q, QuerySet, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
 from django.db.utils import IntegrityError
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from notifications.models import Notification
+
+from account import auth_cache, graph, realtime, suggestions, unread
+from HabbitBackend.counts import saved_fields
 
 
 class CustomUserManager(UserManager):
@@ -69,6 +78,81 @@ class CustomUserManager(UserManager):
             username=username, email=email, password=password, **extra_fields
         )
 
+    def create_signup_user(
+        self,
+        email: str,
+        password: Optional[str] = None,
+        username: Optional[str] = None,
+        **extra_fields: Any,
+    ) -> "CustomUser":
+        """
+        Create an active user hashing the password once, in one transaction.
+
+        Users signing up without a username get `{email-prefix}-{id}`. On
+        PostgreSQL the id is reserved from the sequence first so the row is
+        written by a single INSERT, elsewhere the username is set by an UPDATE
+        right after it.
+        """
+        user = self.model(
+            email=email, username=username, is_active=True, **extra_fields
+        )
+        user.password = make_password(password)
+        connection = connections[self.db]
+
+        with transaction.atomic(using=self.db):
+            if user.username:
+                user.save(force_insert=True, using=self.db)
+            elif connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT nextval(pg_get_serial_sequence(%s, %s))",
+                        [self.model._meta.db_table, "id"],
+                    )
+                    user.id = cursor.fetchone()[0]
+                user.username = user.default_username()
+                user.save(force_insert=True, using=self.db)
+            else:
+                user.save(force_insert=True, using=self.db)
+                user.username = user.default_username()
+                self.filter(id=user.id).update(username=user.username)
+
+        return user
+
+    def adjust_follow_counts(
+        self, follows: Iterable[Tuple[int, int]], delta: int
+    ) -> int:
+        """
+        Atomically shift the counts of `(user_id, followed_user_id)` follow
+        pairs by `delta` in a single UPDATE: the following count of each
+        follower and the follower count of each followed user.
+        """
+        following: Counter[int] = Counter()
+        followers: Counter[int] = Counter()
+
+        for user_id, followed_user_id in follows:
+            following[user_id] += delta
+            followers[followed_user_id] += delta
+
+        if not following:
+            return 0
+
+        return self.filter(id__in={*following, *followers}).update(
+            following_count=Case(
+                *[
+                    When(id=user_id, then=Greatest(F("following_count") + count, 0))
+                    for user_id, count in following.items()
+                ],
+                default=F("following_count"),
+            ),
+            follower_count=Case(
+                *[
+                    When(id=user_id, then=Greatest(F("follower_count") + count, 0))
+                    for user_id, count in followers.items()
+                ],
+                default=F("follower_count"),
+            ),
+        )
+
 
 class CustomUser(AbstractUser):
 
@@ -107,7 +191,12 @@ class CustomUser(AbstractUser):
         blank=True,
     )
     location = models.CharField(max_length=100, null=True, blank=True)
-    reset_token = models.CharField(max_length=150, null=True, blank=True)
+    # denormalized counts of unblocked UserFollowing rows, see UserFollowing.save
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # notifications with an id up to this one were deleted by the user and are
+    # hidden until a NotificationDeletionJob removes them
+    notifications_watermark = models.IntegerField(default=0)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["password"]
@@ -117,23 +206,207 @@ class CustomUser(AbstractUser):
     class Meta(AbstractUser.Meta):
         abstract = False
 
-    def generate_resettoken(self) -> Tuple[int, str]:
-        unsigned_token = random.randint(100000, 999999)
-        signer = signing.TimestampSigner()
-        signed_token = signer.sign_object(
-            {"token": unsigned_token, "email": self.email}
+    def save(self, **kwargs: Any) -> None:
+        kwargs["update_fields"] = saved_fields(
+            self, ["follower_count", "following_count"], kwargs.get("update_fields")
         )
-        return unsigned_token, signed_token
+        super().save(**kwargs)
+
+    def visible_notifications(self) -> QuerySet[Notification]:
+        return self.notifications.filter(id__gt=self.notifications_watermark)
 
-    def add_followers(self, followers: Sequence[Any]) -> None:
-        for follower in followers:
-            UserFollowing.objects.create(user=self, following_user=follower)
+    def default_username(self) -> str:
+        return f'{str(self.email).split("@")[0]}-{self.id}'
+
+    def add_followers(self, followers: Sequence[Any]) -> List[int]:
+        """Make `followers` (users or ids) follow this user in one batch."""
+        follows = UserFollowing.objects.bulk_follow(
+            [(getattr(follower, "id", follower), self.id) for follower in followers]
+        )
+        return [user_id for user_id, _ in follows]
 
     def remove_followers(self, followers: Sequence[Any]) -> None:
-        UserFollowing.objects.filter(user=self, following_user__in=followers).delete()
+        UserFollowing.objects.filter(followed_user=self, user__in=followers).delete()
 
     def get_followers(self) -> QuerySet:
-        return UserFollowing.objects.filter(user=self)
+        return UserFollowing.objects.filter(followed_user=self)
+
+
+class UserFollowingManager(models.Manager):
+    def record_follow_changes(
+        self, follows: Sequence[Tuple[int, int]], delta: int
+    ) -> None:
+        """
+        Apply `(user_id, followed_user_id)` follows that became active (delta 1)
+        or inactive (delta -1) to the follow counts, and to the social graph
+        cache once the transaction commits.
+        """
+        follows = list(follows)
+        CustomUser.objects.adjust_follow_counts(follows, delta)
+        write = graph.add_follows if delta > 0 else graph.remove_follows
+
+        def on_commit() -> None:
+            write(follows)
+            suggestions.mark_changed([user_id for user_id, _ in follows])
+            auth_cache.invalidate_user(
+                *{user_id for follow in follows for user_id in follow}
+            )
+
+        transaction.on_commit(on_commit, using=self.db)
+
+    def record_block_changes(self, follows: Sequence[Tuple[int, int]]) -> None:
+        """
+        Flag both users of `(user_id, followed_user_id)` follows that were
+        blocked, unblocked or deleted while blocked for follow suggestions once
+        the transaction commits, as a block hides each from the other.
+        """
+        user_ids = {user_id for follow in follows for user_id in follow}
+        transaction.on_commit(lambda: suggestions.mark_changed(user_ids), using=self.db)
+
+    def follow(
+        self, user: CustomUser, followed_user: CustomUser
+    ) -> Tuple["UserFollowing", bool]:
+        """
+        Idempotently make `user` follow `followed_user`.
+
+        The row is written with a single INSERT ... ON CONFLICT DO NOTHING that
+        relies on the unique_followers constraint, so concurrent or repeated
+        calls never raise. Returns the relation and whether it was created.
+        """
+        if user.id == followed_user.id:
+            raise IntegrityError("unique_followers")
+
+        if graph.is_following(user.id, followed_user.id):
+            existing = self.filter(user=user, followed_user=followed_user).first()
+            if existing:
+                return existing, False
+
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        opts = self.model._meta
+        date_created = timezone.now()
+
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {quote(opts.db_table)} "
+                    f"({quote('user_id')}, {quote('followed_user_id')}, "
+                    f"{quote('blocked')}, {quote('date_created')}) "
+                    "VALUES (%s, %s, %s, %s) ON CONFLICT DO NOTHING "
+                    f"RETURNING {quote('id')}",
+                    [
+                        user.id,
+                        followed_user.id,
+                        False,
+                        connection.ops.adapt_datetimefield_value(date_created),
+                    ],
+                )
+                row = cursor.fetchone()
+
+            if row is None:
+                return self.get(user=user, followed_user=followed_user), False
+
+            self.record_follow_changes([(user.id, followed_user.id)], 1)
+
+        instance = self.model(
+            id=row[0],
+            user=user,
+            followed_user=followed_user,
+            blocked=False,
+            date_created=date_created,
+        )
+        instance._state.adding = False
+        instance._state.db = self.db
+        instance._loaded_blocked = False
+        instance.sync_loaded_counts(1)
+        return instance, True
+
+    def bulk_follow(self, follows: Sequence[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """
+        Create `(user_id, followed_user_id)` follow pairs with batched
+        INSERT ... ON CONFLICT DO NOTHING RETURNING statements and update the
+        counts of every affected user in one statement. Returns the newly
+        created pairs.
+
+        Only the pairs a statement actually inserted are returned, so
+        concurrent or repeated calls never count or notify a pair twice.
+        """
+        follows = list(
+            dict.fromkeys(
+                (user_id, followed_user_id)
+                for user_id, followed_user_id in follows
+                if user_id != followed_user_id
+            )
+        )
+
+        if not follows:
+            return []
+
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        columns = ["user_id", "followed_user_id", "blocked", "date_created"]
+        batch_size = connection.ops.bulk_batch_size(columns, follows)
+        date_created = connection.ops.adapt_datetimefield_value(timezone.now())
+        inserted: Set[Tuple[int, int]] = set()
+
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                for start in range(0, len(follows), batch_size):
+                    end = start + batch_size
+                    batch = follows[start:end]
+                    cursor.execute(
+                        f"INSERT INTO {quote(self.model._meta.db_table)} "
+                        f"({', '.join(quote(column) for column in columns)}) "
+                        "VALUES "
+                        + ", ".join(["(%s, %s, %s, %s)"] * len(batch))
+                        + " ON CONFLICT DO NOTHING "
+                        f"RETURNING {quote('user_id')}, {quote('followed_user_id')}",
+                        [
+                            value
+                            for user_id, followed_user_id in batch
+                            for value in (
+                                user_id,
+                                followed_user_id,
+                                False,
+                                date_created,
+                            )
+                        ],
+                    )
+                    inserted.update((row[0], row[1]) for row in cursor.fetchall())
+
+            created = [follow for follow in follows if follow in inserted]
+            self.record_follow_changes(created, 1)
+
+        return created
+
+    def unfollow(self, user_id: int, followed_user_id: int) -> bool:
+        """
+        Idempotently remove a follow relation with a single DELETE ... RETURNING.
+        Returns whether a relation was removed.
+        """
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {quote(self.model._meta.db_table)} "
+                    f"WHERE {quote('user_id')} = %s "
+                    f"AND {quote('followed_user_id')} = %s "
+                    f"RETURNING {quote('blocked')}",
+                    [user_id, followed_user_id],
+                )
+                row = cursor.fetchone()
+
+            if row is None:
+                return False
+
+            if row[0]:
+                self.record_block_changes([(user_id, followed_user_id)])
+            else:
+                self.record_follow_changes([(user_id, followed_user_id)], -1)
+
+        return True
 
 
 class UserFollowing(models.Model):
@@ -147,6 +420,8 @@ class UserFollowing(models.Model):
     blocked = models.BooleanField(default=False)
     date_created = models.DateTimeField(auto_now_add=True, db_index=True)
 
+    objects = UserFollowingManager()
+
     class Meta:
         ordering = ["-date_created"]
         constraints = [
@@ -160,7 +435,286 @@ class UserFollowing(models.Model):
     def __str__(self) -> str:
         return f"{self.user.email} follows {self.followed_user.email}"
 
+    @classmethod
+    def from_db(
+        cls, db: Optional[str], field_names: Sequence[str], values: Sequence[Any]
+    ) -> "UserFollowing":
+        instance = super().from_db(db, field_names, values)
+        # remember the stored state so save() can tell a (un)block apart
+        if "blocked" in field_names:
+            instance._loaded_blocked = instance.blocked
+        return instance
+
     def save(self, **kwargs: Any) -> None:
-        if self.followed_user.id == self.user.id:
+        if self.followed_user_id == self.user_id:
             raise IntegrityError("unique_followers")
-        return super().save(**kwargs)
+
+        if self._state.adding:
+            delta = 0 if self.blocked else 1
+        elif self.blocked != getattr(self, "_loaded_blocked", self.blocked):
+            delta = -1 if self.blocked else 1
+        else:
+            delta = 0
+        block_changed = self.blocked if self._state.adding else bool(delta)
+
+        with transaction.atomic():
+            super().save(**kwargs)
+            follow = (self.user_id, self.followed_user_id)
+            if delta:
+                UserFollowing.objects.record_follow_changes([follow], delta)
+            if block_changed:
+                UserFollowing.objects.record_block_changes([follow])
+
+        self._loaded_blocked = self.blocked
+        self.sync_loaded_counts(delta)
+
+    def sync_loaded_counts(self, delta: int) -> None:
+        """Keep already loaded users in step with a follow count change."""
+        if not delta:
+            return
+
+        if self._meta.get_field("user").is_cached(self):
+            self.user.following_count = max(self.user.following_count + delta, 0)
+
+        if self._meta.get_field("followed_user").is_cached(self):
+            self.followed_user.follower_count = max(
+                self.followed_user.follower_count + delta, 0
+            )
+
+
+class FollowSuggestion(models.Model):
+    """Precomputed "people you may know" entry, see account.suggestions."""
+
+    id = models.AutoField(primary_key=True, unique=True, null=False)
+    user = models.ForeignKey(
+        CustomUser, related_name="follow_suggestions", on_delete=models.CASCADE
+    )
+    suggested_user = models.ForeignKey(
+        CustomUser, related_name="+", on_delete=models.CASCADE
+    )
+    # number of users followed by `user` that follow `suggested_user`
+    score = models.PositiveIntegerField()
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-score", "suggested_user"]
+        indexes = [
+            models.Index(
+                fields=["user", "-score", "suggested_user"],
+                name="follow_suggestion_rank",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "suggested_user"], name="unique_follow_suggestion"
+            ),
+        ]
+
+
+class NotificationDeletionJob(models.Model):
+    """Background deletion of a user's notifications, see DeleteAllNotificationsView."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (COMPLETED, "Completed"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.AutoField(primary_key=True, unique=True, null=False)
+    user = models.ForeignKey(
+        CustomUser,
+        related_name="notification_deletion_jobs",
+        on_delete=models.CASCADE,
+    )
+    # the user's notifications with an id up to this one are deleted
+    watermark = models.IntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    deleted = models.PositiveIntegerField(default=0)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_completed = models.DateTimeField(null=True, blank=True)
+
+
+class NotificationGroupManager(models.Manager):
+    def bump(
+        self,
+        recipient_id: int,
+        verb: str,
+        target_content_type_id: int,
+        target_object_id: str,
+        window_start: datetime,
+        actor_id: int,
+    ) -> Tuple["NotificationGroup", bool]:
+        """
+        Add an actor to a group, counting it only if it is new to the group.
+
+        The group is locked with an INSERT ... ON CONFLICT DO UPDATE that relies
+        on the unique_notification_group constraint and stays locked until the
+        transaction ends, so callers can update the group's notification without
+        racing concurrent bumps. The actor is recorded with an INSERT ... ON
+        CONFLICT DO NOTHING relying on unique_notification_group_actor, and only
+        an inserted row adds to actor_count, which the caller saves. Returns the
+        group and whether the actor was new.
+        """
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        actors_table = quote(NotificationGroupActor._meta.db_table)
+        sample_field = self.model._meta.get_field("sample_actor_ids")
+        key = ", ".join(
+            quote(column)
+            for column in [
+                "recipient_id",
+                "verb",
+                "target_content_type_id",
+                "target_object_id",
+                "window_start",
+            ]
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} "
+                f"({key}, "
+                f"{quote('actor_count')}, {quote('sample_actor_ids')}) "
+                "VALUES (%s, %s, %s, %s, %s, 0, %s) "
+                f"ON CONFLICT ({key}) "
+                # a no-op update, so the existing row is locked and returned
+                f"DO UPDATE SET {quote('actor_count')} = "
+                f"{table}.{quote('actor_count')} "
+                f"RETURNING {quote('id')}, {quote('notification_id')}, "
+                f"{quote('actor_count')}, {quote('sample_actor_ids')}",
+                [
+                    recipient_id,
+                    verb,
+                    target_content_type_id,
+                    target_object_id,
+                    connection.ops.adapt_datetimefield_value(window_start),
+                    sample_field.get_db_prep_value([], connection),
+                ],
+            )
+            group_id, notification_id, actor_count, sample_actor_ids = cursor.fetchone()
+
+            cursor.execute(
+                f"INSERT INTO {actors_table} "
+                f"({quote('group_id')}, {quote('actor_id')}) VALUES (%s, %s) "
+                f"ON CONFLICT DO NOTHING RETURNING {quote('id')}",
+                [group_id, actor_id],
+            )
+            new_actor = cursor.fetchone() is not None
+
+        instance = self.model(
+            id=group_id,
+            recipient_id=recipient_id,
+            verb=verb,
+            target_content_type_id=target_content_type_id,
+            target_object_id=target_object_id,
+            window_start=window_start,
+            notification_id=notification_id,
+            actor_count=actor_count + new_actor,
+            sample_actor_ids=sample_field.from_db_value(
+                sample_actor_ids, None, connection
+            ),
+        )
+        instance._state.adding = False
+        instance._state.db = self.db
+        return instance, new_actor
+
+
+class NotificationGroup(models.Model):
+    """
+    Aggregation state of the notification merging every `verb` on a target
+    sent to a recipient within one NOTIFICATION_GROUP_WINDOW.
+    """
+
+    id = models.AutoField(primary_key=True, unique=True, null=False)
+    recipient = models.ForeignKey(
+        CustomUser, related_name="+", on_delete=models.CASCADE
+    )
+    verb = models.CharField(max_length=255)
+    target_content_type = models.ForeignKey(
+        ContentType, related_name="+", on_delete=models.CASCADE
+    )
+    target_object_id = models.CharField(max_length=255)
+    # indexed for prune_notification_groups_task
+    window_start = models.DateTimeField(db_index=True)
+    notification = models.OneToOneField(
+        Notification,
+        related_name="group",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+    )
+    actor_count = models.PositiveIntegerField(default=0)
+    # ids of the most recent actors, newest first
+    sample_actor_ids = models.JSONField(default=list)
+
+    objects = NotificationGroupManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "recipient",
+                    "verb",
+                    "target_content_type",
+                    "target_object_id",
+                    "window_start",
+                ],
+                name="unique_notification_group",
+            ),
+        ]
+
+
+class NotificationGroupActor(models.Model):
+    """An actor already counted in a NotificationGroup's actor_count."""
+
+    id = models.AutoField(primary_key=True, unique=True, null=False)
+    group = models.ForeignKey(
+        NotificationGroup, related_name="actors", on_delete=models.CASCADE
+    )
+    actor = models.ForeignKey(CustomUser, related_name="+", on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["group", "actor"], name="unique_notification_group_actor"
+            ),
+        ]
+
+
+@receiver(post_delete, sender=UserFollowing)
+def decrement_follow_counts(
+    sender: Any, instance: UserFollowing, **kwargs: Any
+) -> None:
+    """Keep the follow counts and graph cache in step with deleted rows."""
+    manager = UserFollowing.objects.db_manager(kwargs.get("using"))
+    follow = (instance.user_id, instance.followed_user_id)
+    if instance.blocked:
+        manager.record_block_changes([follow])
+    else:
+        manager.record_follow_changes([follow], -1)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user(sender: Any, instance: CustomUser, **kwargs: Any) -> None:
+    """Drop the cached row and tokens of a user that was written or deleted."""
+    auth_cache.invalidate_user(instance.id, using=kwargs.get("using"))
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_count(
+    sender: Any, instance: Notification, created: bool, **kwargs: Any
+) -> None:
+    """Count and publish new notifications, reload the count when one is edited."""
+    if created:
+        if instance.unread:
+            unread.adjust({instance.recipient_id: 1})
+        realtime.publish_notifications([instance])
+    else:
+        unread.invalidate([instance.recipient_id])
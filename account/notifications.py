@@ -0,0 +1,151 @@
+from collections import Counter
+from datetime import datetime
+from typing import Any, Iterable, List
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
+from django.utils import timezone
+from notifications.models import Notification
+
+from account import realtime, unread
+from account.models import CustomUser, NotificationGroup, NotificationGroupActor
+
+FOLLOW_VERB = "followed"
+
+
+def build_follow_notifications(
+    user: CustomUser, recipient_ids: Iterable[int]
+) -> List[Notification]:
+    """Build unsaved notifications telling each recipient `user` followed them."""
+    actor_content_type = ContentType.objects.get_for_model(user)
+    message = f"{user.username} started following you."
+
+    return [
+        Notification(
+            recipient_id=recipient_id,
+            actor_content_type=actor_content_type,
+            actor_object_id=str(user.id),
+            verb=FOLLOW_VERB,
+            data={"message": message, "user": user.id},
+        )
+        for recipient_id in recipient_ids
+    ]
+
+
+def notify_followed_users(
+    user: CustomUser, recipient_ids: Iterable[int]
+) -> List[Notification]:
+    """Notify users that `user` followed them with a single INSERT."""
+    notifications = Notification.objects.bulk_create(
+        build_follow_notifications(user, recipient_ids)
+    )
+    unread.adjust(Counter(notification.recipient_id for notification in notifications))
+    realtime.publish_notifications(notifications)
+    return notifications
+
+
+def group_message(actor: CustomUser, actor_count: int, verb: str, subject: str) -> str:
+    """Message naming the latest actor and how many others did the same."""
+    others = actor_count - 1
+    if others == 1:
+        return f"{actor.username} and 1 other {verb} {subject}."
+    if others > 1:
+        return f"{actor.username} and {others} others {verb} {subject}."
+    return f"{actor.username} {verb} {subject}."
+
+
+def notify_grouped(
+    recipient_id: int,
+    actor: CustomUser,
+    verb: str,
+    target: models.Model,
+    subject: str,
+    **data: Any,
+) -> Notification:
+    """
+    Tell a user `actor` did `verb` on `target`, merged with every other actor
+    that did the same within the current NOTIFICATION_GROUP_WINDOW.
+
+    The group's count of distinct actors is bumped with atomic upserts, and the group's
+    notification is rewritten in place and marked unread again instead of a
+    new row being inserted per actor. `subject` completes the message, e.g.
+    "your playlist Sabaton", and `data` is added to the notification's data.
+    """
+    window = settings.NOTIFICATION_GROUP_WINDOW
+    now = timezone.now()
+    window_start = datetime.fromtimestamp(
+        now.timestamp() // window * window, tz=timezone.utc
+    )
+    actor_content_type = ContentType.objects.get_for_model(actor)
+    target_content_type = ContentType.objects.get_for_model(target)
+
+    with transaction.atomic():
+        group, _ = NotificationGroup.objects.bump(
+            recipient_id,
+            verb,
+            target_content_type.id,
+            str(target.pk),
+            window_start,
+            actor.id,
+        )
+        was_unread = None
+        if group.notification_id is not None:
+            was_unread = (
+                Notification.objects.filter(
+                    id=group.notification_id,
+                    recipient__notifications_watermark__lt=group.notification_id,
+                )
+                .values_list("unread", flat=True)
+                .first()
+            )
+
+        if was_unread is None:
+            # first actor of the window, or the user deleted the notification
+            group.actor_count = 1
+            group.sample_actor_ids = []
+            if group.notification_id is not None:
+                NotificationGroupActor.objects.filter(group_id=group.id).exclude(
+                    actor_id=actor.id
+                ).delete()
+
+        group.sample_actor_ids = [actor.id] + [
+            actor_id for actor_id in group.sample_actor_ids if actor_id != actor.id
+        ][: settings.NOTIFICATION_GROUP_SAMPLE_SIZE - 1]
+        notification = Notification(
+            id=group.notification_id,
+            recipient_id=recipient_id,
+            actor_content_type=actor_content_type,
+            actor_object_id=str(actor.id),
+            verb=verb,
+            target_content_type=target_content_type,
+            target_object_id=str(target.pk),
+            timestamp=now,
+            data={
+                "message": group_message(actor, group.actor_count, verb, subject),
+                "user": actor.id,
+                "actors": group.sample_actor_ids,
+                "actor_count": group.actor_count,
+                **data,
+            },
+        )
+
+        if was_unread is None:
+            notification.id = None
+            notification.save()
+        else:
+            Notification.objects.filter(id=notification.id).update(
+                unread=True,
+                actor_object_id=notification.actor_object_id,
+                timestamp=notification.timestamp,
+                data=notification.data,
+            )
+            notification._state.adding = False
+            if not was_unread:
+                unread.adjust({recipient_id: 1})
+            realtime.publish_notifications([notification])
+
+        group.notification_id = notification.id
+        group.save(update_fields=["notification", "actor_count", "sample_actor_ids"])
+
+    return notification
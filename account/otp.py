@@ -0,0 +1,109 @@
+"""
+Password reset one time passwords.
+
+OTPs live in Redis, keyed by email, and disappear on their own after
+PASSWORD_RESET_OTP_TIMEOUT seconds, so issuing, checking and expiring them
+never touches the user table. Only a keyed hash of the OTP is stored, along
+with the id of the user it was issued to so the reset does not look the user
+up again.
+
+A wrong guess increments the OTP's attempt counter and PASSWORD_RESET_MAX_ATTEMPTS
+wrong guesses burn it. New OTPs are rate limited per email and per client IP
+over PASSWORD_RESET_RATE_WINDOW seconds.
+"""
+import random
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from HabbitBackend.redis_client import get_redis_connection
+
+VALID = "valid"
+INVALID = "invalid"
+EXPIRED = "expired"
+
+
+def otp_key(email: str) -> str:
+    return f"otp:{email}"
+
+
+def rate_key(scope: str, value: str) -> str:
+    return f"otp:rate:{scope}:{value}"
+
+
+def _digest(email: str, token: str) -> str:
+    return salted_hmac("account.otp", f"{email}:{token}").hexdigest()
+
+
+def allow_request(email: str, ident: Optional[str]) -> bool:
+    """Count a new OTP request, False once the email or IP hit their limit."""
+    window = settings.PASSWORD_RESET_RATE_WINDOW
+    limits = [(rate_key("email", email), settings.PASSWORD_RESET_EMAIL_RATE_LIMIT)]
+
+    if ident:
+        limits.append((rate_key("ip", ident), settings.PASSWORD_RESET_IP_RATE_LIMIT))
+
+    pipe = get_redis_connection().pipeline(transaction=False)
+    for key, _ in limits:
+        # the window starts with the first request and is not extended
+        pipe.set(key, 0, ex=window, nx=True)
+        pipe.incr(key)
+    counts = pipe.execute()[1::2]
+
+    return all(count <= limit for count, (_, limit) in zip(counts, limits))
+
+
+def issue(email: str, user_id: int) -> int:
+    """Create a new OTP for user `user_id` with `email`, replacing any earlier one."""
+    token = random.SystemRandom().randint(100000, 999999)
+    timeout = settings.PASSWORD_RESET_OTP_TIMEOUT
+    key = otp_key(email)
+
+    pipe = get_redis_connection().pipeline(transaction=True)
+    pipe.delete(key)
+    pipe.hset(
+        key,
+        mapping={
+            "digest": _digest(email, str(token)),
+            "expires_at": time.time() + timeout,
+            "attempts": 0,
+            "user": user_id,
+        },
+    )
+    pipe.expire(key, timeout)
+    pipe.execute()
+    return token
+
+
+def verify(email: str, token: str) -> str:
+    """Check `token` against the OTP of `email`: VALID, INVALID or EXPIRED."""
+    connection = get_redis_connection()
+    key = otp_key(email)
+    digest, expires_at = connection.hmget(key, ["digest", "expires_at"])
+
+    if digest is None or expires_at is None or float(expires_at) <= time.time():
+        connection.delete(key)
+        return EXPIRED
+
+    if constant_time_compare(digest.decode(), _digest(email, token)):
+        return VALID
+
+    if connection.hincrby(key, "attempts", 1) >= settings.PASSWORD_RESET_MAX_ATTEMPTS:
+        connection.delete(key)
+
+    return INVALID
+
+
+def consume(email: str) -> Optional[int]:
+    """
+    Burn the OTP of `email` and return the id of the user it was issued to,
+    None if it was already used or expired.
+    """
+    key = otp_key(email)
+    pipe = get_redis_connection().pipeline(transaction=True)
+    pipe.hget(key, "user")
+    pipe.delete(key)
+    user_id, deleted = pipe.execute()
+    return int(user_id) if deleted and user_id else None
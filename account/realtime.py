@@ -0,0 +1,37 @@
+"""Real-time notification events, published through HabbitBackend.centrifugo."""
+from typing import Any, Dict, Iterable
+
+from notifications.models import Notification
+
+from HabbitBackend import centrifugo
+
+NOTIFICATION_CREATED = "notification.created"
+
+
+def notification_event(notification: Notification) -> Dict[str, Any]:
+    """
+    Payload announcing a notification to its recipient.
+
+    It leaves out the recipient and the row id, so the events of a fan-out
+    are equal and coalesced into a single broadcast.
+    """
+    return {
+        "type": NOTIFICATION_CREATED,
+        "verb": notification.verb,
+        "actor": notification.actor_object_id,
+        "target": notification.target_object_id,
+        "data": notification.data,
+    }
+
+
+def publish_notifications(notifications: Iterable[Notification]) -> None:
+    """Push new notifications to the personal channels of their recipients."""
+    centrifugo.publish_events(
+        [
+            (
+                centrifugo.user_channel(notification.recipient_id),
+                notification_event(notification),
+            )
+            for notification in notifications
+        ]
+    )
@@ -0,0 +1,93 @@
+"""
+Centrifugo connection and subscription tokens.
+
+Tokens are HS256 JWTs signed with CENTRIFUGO_HMAC_TOKEN and valid for
+CENTRIFUGO_TOKEN_LIFETIME seconds. Every signed token is cached in Redis,
+keyed by user and channel, and handed out again until
+CENTRIFUGO_TOKEN_REFRESH_MARGIN seconds before it expires. A reconnect storm
+after a Centrifugo restart is then answered from the cache, without signing
+or looking anything up, and clients always get a token that is still valid
+for at least the margin.
+"""
+import json
+import logging
+import re
+import time
+from typing import Any, Dict, Optional
+
+import jwt
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from redis import RedisError
+
+from HabbitBackend import centrifugo
+from HabbitBackend.redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_CHANNEL = re.compile(r"^playlist\.(\d+)$")
+
+
+def token_key(user_id: int, channel: Optional[str] = None) -> str:
+    if channel is None:
+        return f"centrifugo:token:{user_id}"
+    return f"centrifugo:token:{user_id}:{channel}"
+
+
+def can_subscribe(user_id: int, channel: str) -> bool:
+    """Users may subscribe to their personal channel and any playlist's channel."""
+    if channel == centrifugo.user_channel(user_id):
+        return True
+
+    match = PLAYLIST_CHANNEL.match(channel)
+    if match is None:
+        return False
+
+    PlayList = apps.get_model("thread", "PlayList")
+    return PlayList.objects.filter(id=int(match.group(1))).exists()
+
+
+def sign(user_id: int, channel: Optional[str] = None) -> Dict[str, Any]:
+    """A fresh connection token, or subscription token when `channel` is set."""
+    if not settings.CENTRIFUGO_HMAC_TOKEN:
+        raise ImproperlyConfigured("CENTRIFUGO_HMAC_TOKEN is not set.")
+
+    expires_at = int(time.time()) + settings.CENTRIFUGO_TOKEN_LIFETIME
+    claims: Dict[str, Any] = {"sub": str(user_id), "exp": expires_at}
+    if channel is not None:
+        claims["channel"] = channel
+
+    token = jwt.encode(claims, settings.CENTRIFUGO_HMAC_TOKEN, algorithm="HS256")
+    return {"token": token, "expires_at": expires_at}
+
+
+def get_token(user_id: int, channel: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    The cached or a freshly signed token of a user, with its expiry.
+
+    Returns None when the user may not subscribe to `channel`.
+    """
+    key = token_key(user_id, channel)
+
+    try:
+        cached = get_redis_connection().get(key)
+        if cached is not None:
+            return json.loads(cached)
+    except RedisError:
+        logger.exception("Centrifugo token cache unavailable.")
+
+    if channel is not None and not can_subscribe(user_id, channel):
+        return None
+
+    token = sign(user_id, channel)
+    timeout = (
+        settings.CENTRIFUGO_TOKEN_LIFETIME - settings.CENTRIFUGO_TOKEN_REFRESH_MARGIN
+    )
+
+    try:
+        get_redis_connection().set(key, json.dumps(token), ex=timeout)
+    except RedisError:
+        logger.exception("Centrifugo token cache write failed.")
+
+    return token
@@ -0,0 +1,64 @@
+"""
+User search.
+
+On PostgreSQL the lookups below are served by the pg_trgm GIN indexes added
+in migration 0006: icontains/istartswith compile to UPPER(column) LIKE, which
+uses the UPPER(...) gin_trgm_ops indexes, and trigram_similar (the `%`
+operator) uses the index on the raw username, which also catches typos.
+Results are ranked by trigram similarity.
+
+Other databases, i.e. SQLite in the test suite, fall back to plain
+icontains/istartswith and rank prefix matches first.
+"""
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections
+from django.db.models import Case, FloatField, Q, QuerySet, Value, When
+from django.db.models.functions import Greatest, Length
+
+SEARCH_RESULTS_LIMIT = 20
+
+
+def _is_postgres(queryset: QuerySet) -> bool:
+    return connections[queryset.db].vendor == "postgresql"
+
+
+def filter_users(queryset: QuerySet, term: str) -> QuerySet:
+    """Users whose username or email matches `term`, unranked."""
+    matches = Q(username__icontains=term) | Q(email__icontains=term)
+
+    if _is_postgres(queryset):
+        matches |= Q(username__trigram_similar=term)
+
+    return queryset.filter(matches)
+
+
+def search_users(
+    queryset: QuerySet, term: str, limit: int = SEARCH_RESULTS_LIMIT
+) -> QuerySet:
+    """Best `limit` matches for `term`, most similar first."""
+    queryset = filter_users(queryset, term)
+
+    if _is_postgres(queryset):
+        rank = Greatest(
+            TrigramSimilarity("username", term), TrigramSimilarity("email", term)
+        )
+    else:
+        rank = Case(
+            When(username__istartswith=term, then=Value(1.0)),
+            When(email__istartswith=term, then=Value(0.5)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+
+    return queryset.annotate(rank=rank).order_by("-rank", Length("username"), "id")[
+        :limit
+    ]
+
+
+def autocomplete_users(
+    queryset: QuerySet, prefix: str, limit: int = SEARCH_RESULTS_LIMIT
+) -> QuerySet:
+    """Users whose username or email starts with `prefix`, shortest first."""
+    return queryset.filter(
+        Q(username__istartswith=prefix) | Q(email__istartswith=prefix)
+    ).order_by(Length("username"), "username", "id")[:limit]
@@ -0,0 +1,186 @@
+"""
+"People you may know" follow suggestions.
+
+A user is suggested the accounts followed by the people they follow, scored
+by how many of those people follow them (friends of friends). Scores are
+precomputed in batches by compute_follow_suggestions_task and stored as
+FollowSuggestion rows, so the suggestions endpoint is a single indexed read.
+
+Only blocked=False follows are traversed, and pairs of users with a blocked
+relation in either direction are never suggested to each other.
+
+Users whose following list changed are collected in a Redis set. A changed
+user invalidates their own suggestions and those of everyone following them,
+since they are a friend of a friend for all of them.
+"""
+import heapq
+import logging
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Q
+from redis import RedisError
+
+from HabbitBackend.redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+CHANGED_USERS_KEY = "suggestions:changed"
+SUGGESTIONS_PER_USER = 20
+
+
+def mark_changed(user_ids: Iterable[int]) -> None:
+    """Flag users whose following list changed since the last run."""
+    user_ids = list(user_ids)
+
+    if not user_ids:
+        return
+
+    try:
+        get_redis_connection().sadd(CHANGED_USERS_KEY, *user_ids)
+    except RedisError:
+        logger.exception("Could not flag users for follow suggestions.")
+
+
+def _chunks(ids: Iterable[int], size: int) -> Iterator[List[int]]:
+    chunk: List[int] = []
+    for user_id in ids:
+        chunk.append(user_id)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _following(user_ids: Set[int], chunk_size: int) -> Dict[int, "array[int]"]:
+    """Compact adjacency snapshot of the unblocked follows of `user_ids`."""
+    UserFollowing = apps.get_model("account", "UserFollowing")
+    adjacency: Dict[int, "array[int]"] = defaultdict(lambda: array("q"))
+
+    for chunk in _chunks(sorted(user_ids), chunk_size):
+        rows = (
+            UserFollowing.objects.filter(blocked=False, user_id__in=chunk)
+            .order_by()
+            .values_list("user_id", "followed_user_id")
+        )
+        for user_id, followed_user_id in rows.iterator(chunk_size=chunk_size):
+            adjacency[user_id].append(followed_user_id)
+
+    return adjacency
+
+
+def _blocked(user_ids: List[int]) -> Dict[int, Set[int]]:
+    """Users that `user_ids` blocked or were blocked by."""
+    UserFollowing = apps.get_model("account", "UserFollowing")
+    blocked: Dict[int, Set[int]] = defaultdict(set)
+    rows = (
+        UserFollowing.objects.filter(blocked=True)
+        .filter(Q(user_id__in=user_ids) | Q(followed_user_id__in=user_ids))
+        .order_by()
+        .values_list("user_id", "followed_user_id")
+    )
+
+    for user_id, followed_user_id in rows:
+        blocked[user_id].add(followed_user_id)
+        blocked[followed_user_id].add(user_id)
+
+    return blocked
+
+
+def score(
+    user_ids: List[int], limit: int = SUGGESTIONS_PER_USER, chunk_size: int = 1000
+) -> Dict[int, List[Tuple[int, int]]]:
+    """Top `limit` (suggested_user_id, score) pairs for each of `user_ids`."""
+    following = _following(set(user_ids), chunk_size)
+    second_hop = _following(
+        {followed for user_id in user_ids for followed in following[user_id]},
+        chunk_size,
+    )
+    blocked = _blocked(user_ids)
+    results = {}
+
+    for user_id in user_ids:
+        direct = set(following[user_id])
+        excluded = direct | blocked[user_id] | {user_id}
+        scores: Counter[int] = Counter()
+
+        for followed_user_id in direct:
+            scores.update(
+                candidate
+                for candidate in second_hop[followed_user_id]
+                if candidate not in excluded
+            )
+
+        results[user_id] = heapq.nsmallest(
+            limit, scores.items(), key=lambda item: (-item[1], item[0])
+        )
+
+    return results
+
+
+def store(results: Dict[int, List[Tuple[int, int]]]) -> None:
+    """Replace the stored suggestions of the users in `results`."""
+    FollowSuggestion = apps.get_model("account", "FollowSuggestion")
+
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user_id__in=list(results)).delete()
+        FollowSuggestion.objects.bulk_create(
+            [
+                FollowSuggestion(
+                    user_id=user_id, suggested_user_id=suggested_user_id, score=count
+                )
+                for user_id, suggestions in results.items()
+                for suggested_user_id, count in suggestions
+            ]
+        )
+
+
+def refresh(user_ids: Iterable[int], batch_size: int) -> int:
+    """Recompute and store the suggestions of `user_ids` batch by batch."""
+    refreshed = 0
+
+    for batch in _chunks(user_ids, batch_size):
+        store(score(batch))
+        refreshed += len(batch)
+
+    return refreshed
+
+
+def refresh_changed(batch_size: int) -> int:
+    """
+    Recompute the suggestions of every user whose neighbourhood changed since
+    the last run. Returns the number of users recomputed.
+    """
+    UserFollowing = apps.get_model("account", "UserFollowing")
+    connection = get_redis_connection()
+    refreshed = 0
+
+    while True:
+        changed = [
+            int(user_id)
+            for user_id in connection.spop(CHANGED_USERS_KEY, batch_size) or []
+        ]
+
+        if not changed:
+            return refreshed
+
+        try:
+            followers = (
+                UserFollowing.objects.filter(
+                    blocked=False, followed_user_id__in=changed
+                )
+                .order_by("user_id")
+                .values_list("user_id", flat=True)
+                .distinct()
+            )
+            affected = dict.fromkeys(changed)
+            affected.update(dict.fromkeys(followers.iterator(chunk_size=batch_size)))
+            refreshed += refresh(affected, batch_size)
+        except Exception:
+            # put the batch back so the next run picks it up again
+            connection.sadd(CHANGED_USERS_KEY, *changed)
+            raise
@@ -0,0 +1,31 @@
+from typing import Any, Tuple
+
+from django.db import transaction
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.settings import api_settings
+
+from account import blacklist as blacklist_filter
+
+
+class RefreshToken(tokens.RefreshToken):
+    """
+    RefreshToken that only queries the blacklist table for jtis the
+    account.blacklist Bloom filter can not rule out.
+    """
+
+    def check_blacklist(self) -> None:
+        found = blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM])
+
+        if found is False:
+            return
+
+        super().check_blacklist()
+
+        if found:
+            blacklist_filter.record_false_positive()
+
+    def blacklist(self) -> Tuple[Any, bool]:
+        jti = self.payload[api_settings.JTI_CLAIM]
+        result = super().blacklist()
+        transaction.on_commit(lambda: blacklist_filter.add(jti))
+        return result
@@ -0,0 +1,121 @@
+"""
+Cached unread notification counts.
+
+Every user's count lives in a Redis hash next to a LOADED marker field, so a
+hash that only received increments before it was ever loaded is told apart
+from a loaded one and reloaded from the database. Counts are loaded with one
+COUNT over the (recipient, unread, timestamp) index and then kept up to date
+incrementally once notifications are created, marked as read or deleted.
+Keys expire UNREAD_NOTIFICATIONS_CACHE_TIMEOUT after they were loaded, which
+bounds any drift, increments do not extend it.
+"""
+import logging
+from typing import Iterable, List, Mapping, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from redis import RedisError, WatchError
+
+from HabbitBackend.redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+LOADED = b"loaded"
+COUNT = b"count"
+
+
+def unread_key(user_id: int) -> str:
+    return f"notifications:unread:{user_id}"
+
+
+def _load(user_id: int) -> int:
+    Notification = apps.get_model("notifications", "Notification")
+    return Notification.objects.filter(
+        recipient_id=user_id,
+        unread=True,
+        id__gt=F("recipient__notifications_watermark"),
+    ).count()
+
+
+def get_count(user_id: int) -> int:
+    """Number of unread notifications of a user."""
+    try:
+        key = unread_key(user_id)
+
+        with get_redis_connection().pipeline() as pipe:
+            while True:
+                try:
+                    # an increment while the count loads makes the write fail
+                    pipe.watch(key)
+                    fields: List[Optional[bytes]] = pipe.hmget(  # type: ignore
+                        key, [LOADED, COUNT]
+                    )
+                    loaded, cached = fields
+
+                    if loaded:
+                        return max(int(cached or 0), 0)
+
+                    count = _load(user_id)
+                    pipe.multi()
+                    pipe.hset(key, mapping={LOADED: 1, COUNT: count})
+                    pipe.expire(key, settings.UNREAD_NOTIFICATIONS_CACHE_TIMEOUT)
+                    pipe.execute()
+                    return count
+                except WatchError:
+                    continue
+    except RedisError:
+        logger.exception("Unread notifications cache unavailable.")
+        return _load(user_id)
+
+
+def _adjust(deltas: Mapping[int, int]) -> None:
+    changes = [
+        (unread_key(user_id), delta) for user_id, delta in deltas.items() if delta
+    ]
+
+    if not changes:
+        return
+
+    try:
+        connection = get_redis_connection()
+        pipe = connection.pipeline(transaction=False)
+        for key, delta in changes:
+            pipe.hincrby(key, COUNT, delta)
+            pipe.ttl(key)
+        ttls = pipe.execute()[1::2]
+
+        # only hashes created by the increment get a timeout, refreshing it
+        # on every increment would keep busy counts from ever being reloaded
+        pipe = connection.pipeline(transaction=False)
+        for (key, _), ttl in zip(changes, ttls):
+            if ttl < 0:
+                pipe.expire(key, settings.UNREAD_NOTIFICATIONS_CACHE_TIMEOUT)
+        pipe.execute()
+    except RedisError:
+        logger.exception("Unread notifications cache write failed.")
+
+
+def _invalidate(user_ids: Iterable[int]) -> None:
+    keys = [unread_key(user_id) for user_id in user_ids]
+
+    if not keys:
+        return
+
+    try:
+        get_redis_connection().delete(*keys)
+    except RedisError:
+        logger.exception("Unread notifications cache invalidation failed.")
+
+
+def adjust(deltas: Mapping[int, int]) -> None:
+    """Shift the counts of `{user_id: delta}` once the transaction commits."""
+    deltas = dict(deltas)
+    transaction.on_commit(lambda: _adjust(deltas))
+
+
+def invalidate(user_ids: Iterable[int]) -> None:
+    """Reload the counts of `user_ids` on their next read, after commit."""
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: _invalidate(user_ids))
@@ -0,0 +1,12 @@
+import pytest
+
+from account import auth_cache
+from HabbitBackend.redis_client import get_redis_connection
+
+
+@pytest.fixture(autouse=True)
+def flush_redis():
+    """Start every test with an empty in-memory Redis and token cache."""
+    get_redis_connection().flushall()
+    auth_cache.clear_tokens()
+    yield
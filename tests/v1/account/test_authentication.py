@@ -0,0 +1,98 @@
+import json
+import time
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from account import auth_cache
+from HabbitBackend.redis_client import get_redis_connection
+from tests.utils.TestCase import ViewTestCase
+from tests.v1.account.test_models import UserFactory, UserFollowingFactory
+
+
+class CachedJWTAuthenticationTests(ViewTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.url = reverse("api-account-v1:list-notifications")
+
+    def user_queries(self) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sum('FROM "account_customuser"' in query["sql"] for query in queries)
+
+    def test_user_is_served_from_cache(self):
+        self.assertEqual(self.user_queries(), 1)
+        self.assertEqual(self.user_queries(), 0)
+        self.assertEqual(auth_cache.get_user(self.user.id), self.user)
+
+    def test_only_user_fields_are_cached(self):
+        self.user_queries()
+        payload = get_redis_connection().get(auth_cache.user_key(self.user.id))
+
+        self.assertEqual(set(json.loads(payload)), set(auth_cache.USER_FIELDS))
+        self.assertNotIn(self.user.password.encode(), payload)
+
+        user = auth_cache.get_user(self.user.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(user.username, self.user.username)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.password, self.user.password)
+
+    def test_outdated_entry_is_a_miss(self):
+        get_redis_connection().set(
+            auth_cache.user_key(self.user.id), json.dumps({"id": self.user.id})
+        )
+
+        self.assertIsNone(auth_cache.get_user(self.user.id))
+        self.assertEqual(self.user_queries(), 1)
+
+    def test_deactivated_user_is_rejected(self):
+        self.user_queries()
+
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_drops_cached_user(self):
+        self.user_queries()
+
+        self.user.set_password("new-password")
+        self.user.save()
+
+        self.assertIsNone(auth_cache.get_user(self.user.id))
+        self.assertEqual(auth_cache._tokens, {})
+
+    def test_follow_drops_cached_counts(self):
+        self.user_queries()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserFollowingFactory.create(
+                user=self.user, followed_user=UserFactory.create(email="b@gmail.com")
+            )
+
+        self.assertIsNone(auth_cache.get_user(self.user.id))
+        self.user_queries()
+        self.assertEqual(auth_cache.get_user(self.user.id).following_count, 1)
+
+    def test_expired_token_is_verified_again(self):
+        raw_token = str(RefreshToken.for_user(self.user).access_token).encode()
+        auth_cache.set_token(raw_token, "token", self.user.id, time.time() - 1)
+
+        self.assertIsNone(auth_cache.get_token(raw_token))
+        self.assertNotIn(raw_token, auth_cache._tokens)
+
+    @override_settings(AUTH_TOKEN_CACHE_SIZE=2)
+    def test_token_cache_is_bounded(self):
+        expires_at = time.time() + 60
+        for raw_token in (b"a", b"b", b"c"):
+            auth_cache.set_token(raw_token, raw_token, self.user.id, expires_at)
+
+        self.assertEqual(list(auth_cache._tokens), [b"b", b"c"])
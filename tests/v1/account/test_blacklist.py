@@ -0,0 +1,184 @@
+import mock
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from redis import RedisError
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from account import blacklist
+from account.tokens import RefreshToken
+from HabbitBackend.redis_client import get_redis_connection
+from tests.v1.account.test_models import UserFactory
+
+
+class TokenBlacklistFilterTests(APITestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.refresh = RefreshToken.for_user(self.user)
+        self.url = reverse("api-account-v1:token_refresh")
+
+    def refresh_token(self, token: RefreshToken):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {"refresh": str(token)})
+
+        blacklist_queries = sum(
+            "token_blacklist_blacklistedtoken" in query["sql"] for query in queries
+        )
+        return response, blacklist_queries
+
+    def test_not_blacklisted_token_skips_query(self):
+        blacklist.rebuild()
+
+        response, blacklist_queries = self.refresh_token(self.refresh)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("access", response.data)
+        self.assertEqual(blacklist_queries, 0)
+        self.assertEqual(blacklist.metrics()["filter_checks"], 1)
+
+    def test_blacklisted_token_is_rejected(self):
+        blacklist.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.refresh.blacklist()
+
+        response, blacklist_queries = self.refresh_token(self.refresh)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(blacklist_queries, 1)
+
+    def test_missing_filter_is_built_in_the_background(self):
+        self.refresh.blacklist()
+
+        with mock.patch(
+            "account.api.v1.tasks.rebuild_token_blacklist_filter_task.delay"
+        ) as delay:
+            response, blacklist_queries = self.refresh_token(self.refresh)
+            self.refresh_token(self.refresh)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(blacklist_queries, 1)
+        delay.assert_called_once_with()
+        self.assertIsNone(blacklist.might_contain(self.refresh["jti"]))
+
+        blacklist.rebuild()
+        self.assertTrue(blacklist.might_contain(self.refresh["jti"]))
+
+    def test_invalidated_filter_is_not_trusted(self):
+        self.refresh.blacklist()
+        blacklist.rebuild()
+        blacklist.invalidate()
+        other = RefreshToken.for_user(self.user)
+
+        with mock.patch(
+            "account.api.v1.tasks.rebuild_token_blacklist_filter_task.delay"
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                other.blacklist()
+            self.assertIsNone(blacklist.might_contain(self.refresh["jti"]))
+            response, _ = self.refresh_token(self.refresh)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertFalse(get_redis_connection().exists(blacklist.FILTER_KEY))
+
+    def test_false_positive_is_recorded(self):
+        with mock.patch("account.blacklist.might_contain", return_value=True):
+            response, blacklist_queries = self.refresh_token(self.refresh)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(blacklist_queries, 1)
+        self.assertEqual(blacklist.metrics()["filter_false_positives"], 1)
+
+    def test_falls_back_to_database(self):
+        self.refresh.blacklist()
+        redis = mock.Mock()
+        redis.pipeline.side_effect = RedisError
+        redis.hincrby.side_effect = RedisError
+        redis.hgetall.side_effect = RedisError
+
+        with mock.patch("account.blacklist.get_redis_connection", return_value=redis):
+            response, blacklist_queries = self.refresh_token(self.refresh)
+            blacklist.record_false_positive()
+            metrics = blacklist.metrics()
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(blacklist_queries, 1)
+        self.assertEqual(metrics["blacklisted_tokens"], 1)
+        self.assertEqual(metrics["filter_false_positive_rate"], 0.0)
+
+    def test_logout_adds_token_to_filter(self):
+        blacklist.rebuild()
+        token = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + str(token.access_token))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("api-account-v1:logout-user"), {"refresh_token": str(token)}
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(blacklist.might_contain(token["jti"]))
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=token["jti"]))
+
+
+@override_settings(TOKEN_BLACKLIST_BLOOM_CHUNK_SIZE=1)
+class TokenBlacklistRebuildTests(TestCase):
+    def setUp(self) -> None:
+        self.redis = get_redis_connection()
+        blacklist.rebuild()
+
+    def rebuild_with(self, *jtis, during=lambda: None):
+        def stream():
+            for jti in jtis:
+                yield jti
+                during()
+
+        with mock.patch.object(blacklist, "_blacklisted_jtis", stream):
+            return blacklist.rebuild()
+
+    def test_rebuilds_run_one_at_a_time(self):
+        self.redis.set(blacklist.REBUILD_LOCK_KEY, "other")
+
+        self.assertIsNone(self.rebuild_with("jti-1"))
+        self.assertFalse(blacklist.might_contain("jti-1"))
+        self.assertEqual(self.redis.get(blacklist.REBUILD_LOCK_KEY), b"other")
+
+    def test_rebuild_that_lost_its_lock_is_discarded(self):
+        def steal_lock():
+            self.redis.set(blacklist.REBUILD_LOCK_KEY, "other")
+
+        self.assertIsNone(self.rebuild_with("jti-1", "jti-2", during=steal_lock))
+
+        self.assertFalse(blacklist.might_contain("jti-1"))
+        self.assertEqual(self.redis.get(blacklist.REBUILD_LOCK_KEY), b"other")
+        self.assertEqual(self.redis.keys(f"{blacklist.STAGING_KEY_PREFIX}*"), [])
+
+    def test_additions_during_a_rebuild_are_kept(self):
+        self.assertEqual(
+            self.rebuild_with("jti-1", during=lambda: blacklist.add("jti-late")), 1
+        )
+
+        self.assertTrue(blacklist.might_contain("jti-1"))
+        self.assertTrue(blacklist.might_contain("jti-late"))
+        self.assertEqual(self.redis.ttl(blacklist.FILTER_KEY), -1)
+        self.assertFalse(self.redis.exists(blacklist.REBUILD_LOCK_KEY))
+
+    def test_failed_addition_invalidates_the_filter(self):
+        self.redis.set(blacklist.REBUILD_LOCK_KEY, "other")
+
+        with mock.patch.object(
+            self.redis, "pipeline", side_effect=RedisError
+        ), mock.patch.object(
+            blacklist, "get_redis_connection", return_value=self.redis
+        ), self.assertLogs(
+            "account.blacklist", "ERROR"
+        ):
+            blacklist.add("jti-1")
+
+        self.assertFalse(self.redis.exists(blacklist.FILTER_KEY))
+        self.assertFalse(self.redis.exists(blacklist.REBUILD_LOCK_KEY))
+        # the next lookup asks the table and rebuilds the filter from it
+        self.assertIsNone(blacklist.might_contain("jti-1"))
+        self.assertFalse(blacklist.might_contain("jti-1"))
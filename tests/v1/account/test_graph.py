@@ -0,0 +1,142 @@
+from io import StringIO
+
+import mock
+from django.core.management import call_command
+from django.test import TestCase
+from redis import RedisError
+
+from account import graph
+from account.models import UserFollowing
+from tests.v1.account.test_models import UserFactory, UserFollowingFactory
+
+
+class SocialGraphTests(TestCase):
+    def setUp(self) -> None:
+        self.users = [
+            UserFactory.create(email=f"user-{index}@example.com") for index in range(4)
+        ]
+        self.ids = [user.id for user in self.users]
+        UserFollowingFactory.create(user=self.users[0], followed_user=self.users[1])
+        UserFollowingFactory.create(user=self.users[1], followed_user=self.users[0])
+        UserFollowingFactory.create(user=self.users[2], followed_user=self.users[0])
+        UserFollowingFactory.create(
+            user=self.users[3], followed_user=self.users[0], blocked=True
+        )
+
+    def test_queries_load_from_database_on_miss(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(graph.is_following(self.ids[0], self.ids[1]))
+
+        with self.assertNumQueries(0):
+            self.assertFalse(graph.is_following(self.ids[0], self.ids[2]))
+
+        self.assertEqual(
+            graph.get_ids(graph.FOLLOWERS, self.ids[0]), {self.ids[1], self.ids[2]}
+        )
+        self.assertEqual(graph.count(graph.FOLLOWERS, self.ids[0]), 2)
+        self.assertEqual(graph.count(graph.FOLLOWING, self.ids[3]), 0)
+        self.assertEqual(graph.mutuals(self.ids[0]), {self.ids[1]})
+
+    def test_write_through(self):
+        self.assertEqual(graph.count(graph.FOLLOWERS, self.ids[1]), 1)
+        self.assertFalse(graph.is_following(self.ids[2], self.ids[1]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserFollowing.objects.follow(self.users[2], self.users[1])
+
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(self.ids[2], self.ids[1]))
+            self.assertEqual(graph.count(graph.FOLLOWERS, self.ids[1]), 2)
+
+        follow = UserFollowing.objects.get(
+            user=self.users[2], followed_user=self.users[1]
+        )
+        follow.blocked = True
+        with self.captureOnCommitCallbacks(execute=True):
+            follow.save(update_fields=["blocked"])
+        self.assertFalse(graph.is_following(self.ids[2], self.ids[1]))
+
+        follow.blocked = False
+        with self.captureOnCommitCallbacks(execute=True):
+            follow.save(update_fields=["blocked"])
+        self.assertTrue(graph.is_following(self.ids[2], self.ids[1]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserFollowing.objects.unfollow(self.ids[2], self.ids[1])
+        self.assertFalse(graph.is_following(self.ids[2], self.ids[1]))
+        self.assertEqual(graph.count(graph.FOLLOWERS, self.ids[1]), 1)
+
+    def test_falls_back_to_database(self):
+        connection = mock.Mock()
+        connection.pipeline.side_effect = RedisError
+        connection.smembers.side_effect = RedisError
+
+        with mock.patch("account.graph.get_redis_connection", return_value=connection):
+            self.assertTrue(graph.is_following(self.ids[0], self.ids[1]))
+            self.assertEqual(graph.get_ids(graph.FOLLOWING, self.ids[0]), {self.ids[1]})
+            self.assertEqual(graph.count(graph.FOLLOWERS, self.ids[0]), 2)
+            self.assertEqual(graph.mutuals(self.ids[0]), {self.ids[1]})
+            graph.add_follows([(self.ids[2], self.ids[1])])
+
+    def test_warm_social_graph_command(self):
+        out = StringIO()
+        call_command("warm_social_graph", "--chunk-size", "2", stdout=out)
+        self.assertIn("Cached 3 follows.", out.getvalue())
+
+        with self.assertNumQueries(0):
+            self.assertEqual(graph.mutuals(self.ids[0]), {self.ids[1]})
+            self.assertEqual(graph.count(graph.FOLLOWING, self.ids[3]), 0)
+
+    def test_warm_keeps_concurrent_unfollows(self):
+        self.assertTrue(graph.is_following(self.ids[0], self.ids[1]))
+        load_many = graph._load_many
+        calls = []
+
+        def load_then_unfollow(direction, user_ids):
+            ids = load_many(direction, user_ids)
+            if not calls:
+                # an unfollow commits after the rows were read
+                UserFollowing.objects.filter(
+                    user=self.users[0], followed_user=self.users[1]
+                ).delete()
+                graph.remove_follows([(self.ids[0], self.ids[1])])
+            calls.append(user_ids)
+            return ids
+
+        with mock.patch.object(graph, "_load_many", load_then_unfollow):
+            self.assertEqual(graph.warm(self.ids, chunk_size=4), 2)
+
+        self.assertFalse(graph.is_following(self.ids[0], self.ids[1]))
+        self.assertEqual(graph.get_ids(graph.FOLLOWERS, self.ids[1]), set())
+        # the raced chunk was retried user by user
+        self.assertEqual(
+            calls[2:],
+            [
+                [user_id]
+                for user_id in self.ids
+                for _ in (graph.FOLLOWERS, graph.FOLLOWING)
+            ],
+        )
+
+    def test_lazy_load_keeps_concurrent_unfollows(self):
+        load_many = graph._load_many
+        calls = []
+
+        def load_then_unfollow(direction, user_ids):
+            ids = load_many(direction, user_ids)
+            if not calls:
+                # an unfollow commits after the rows were read, before they
+                # are cached
+                UserFollowing.objects.filter(
+                    user=self.users[0], followed_user=self.users[1]
+                ).delete()
+                graph.remove_follows([(self.ids[0], self.ids[1])])
+            calls.append(user_ids)
+            return ids
+
+        with mock.patch.object(graph, "_load_many", load_then_unfollow):
+            self.assertFalse(graph.is_following(self.ids[0], self.ids[1]))
+
+        # the raced load was discarded and retried
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(graph.get_ids(graph.FOLLOWING, self.ids[0]), set())
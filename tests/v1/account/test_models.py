@@ -1,8 +1,6 @@
-from datetime import timedelta
-
+import mock
 import pytest
-from django.core import signing
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.utils import IntegrityError
 from django.test import TestCase
 from factory.django import DjangoModelFactory
@@ -34,23 +32,6 @@ class UserFollowingFactory(DjangoModelFactory):
         model = UserFollowing
 
 
-class TestCustomUserModel(TestCase):
-    def test_generate_resettoken(self):
-        user = UserFactory.create()
-        self.assertIsNone(user.reset_token)
-
-        raw_token, token = user.generate_resettoken()
-
-        # assert that the generated token is six digits
-        self.assertEqual(len(str(raw_token)), 6)
-
-        signer = signing.TimestampSigner()
-        data = signer.unsign_object(token, max_age=timedelta(minutes=10))
-
-        self.assertEqual(data["email"], user.email)
-        self.assertEqual(data["token"], raw_token)
-
-
 class TestUserFollowingModel(TestCase):
     def setUp(self) -> None:
         self.user1 = UserFactory.create()
@@ -84,3 +65,143 @@ class TestUserFollowingModel(TestCase):
                 user=self.user1,
                 followed_user=self.user1,
             )
+
+
+class TestFollowCounts(TestCase):
+    def setUp(self) -> None:
+        self.user1 = UserFactory.create()
+        self.user2 = UserFactory.create(email="user2@example.com")
+
+    def assertCounts(self, user, follower_count, following_count):
+        user.refresh_from_db()
+        self.assertEqual(user.follower_count, follower_count)
+        self.assertEqual(user.following_count, following_count)
+
+    def test_counts_follow_create_and_delete(self):
+        follow = UserFollowingFactory.create(user=self.user1, followed_user=self.user2)
+        self.assertCounts(self.user1, 0, 1)
+        self.assertCounts(self.user2, 1, 0)
+
+        follow.delete()
+        self.assertCounts(self.user1, 0, 0)
+        self.assertCounts(self.user2, 0, 0)
+
+    def test_counts_follow_block_and_unblock(self):
+        follow = UserFollowingFactory.create(user=self.user1, followed_user=self.user2)
+
+        follow = UserFollowing.objects.get(id=follow.id)
+        follow.blocked = True
+        follow.save(update_fields=["blocked"])
+        self.assertCounts(self.user1, 0, 0)
+        self.assertCounts(self.user2, 0, 0)
+
+        # saving again without a state change leaves the counts alone
+        follow.save(update_fields=["blocked"])
+        self.assertCounts(self.user2, 0, 0)
+
+        follow.blocked = False
+        follow.save(update_fields=["blocked"])
+        self.assertCounts(self.user1, 0, 1)
+        self.assertCounts(self.user2, 1, 0)
+
+    def test_counts_ignore_blocked_rows(self):
+        follow = UserFollowingFactory.create(
+            user=self.user1, followed_user=self.user2, blocked=True
+        )
+        self.assertCounts(self.user2, 0, 0)
+
+        UserFollowing.objects.filter(id=follow.id).delete()
+        self.assertCounts(self.user1, 0, 0)
+        self.assertCounts(self.user2, 0, 0)
+
+    def test_profile_save_keeps_concurrent_counts(self):
+        stale_user = CustomUser.objects.get(id=self.user2.id)
+        UserFollowingFactory.create(user=self.user1, followed_user=self.user2)
+
+        stale_user.bio = "updated"
+        stale_user.save()
+        self.assertCounts(self.user2, 1, 0)
+        self.assertEqual(self.user2.bio, "updated")
+
+
+class TestUserFollowingManager(TestCase):
+    def setUp(self) -> None:
+        self.user1 = UserFactory.create()
+        self.user2 = UserFactory.create(email="user2@example.com")
+
+    def test_follow(self):
+        follow, created = UserFollowing.objects.follow(self.user1, self.user2)
+        self.assertTrue(created)
+        self.assertEqual(follow, UserFollowing.objects.get(user=self.user1))
+        self.assertEqual(self.user2.follower_count, 1)
+
+        again, created = UserFollowing.objects.follow(self.user1, self.user2)
+        self.assertFalse(created)
+        self.assertEqual(again.id, follow.id)
+
+        self.user2.refresh_from_db()
+        self.assertEqual(self.user2.follower_count, 1)
+
+    def test_follow_self(self):
+        self.assertRaises(
+            IntegrityError, UserFollowing.objects.follow, self.user1, self.user1
+        )
+
+    def test_unfollow(self):
+        UserFollowing.objects.follow(self.user1, self.user2)
+
+        self.assertTrue(UserFollowing.objects.unfollow(self.user1.id, self.user2.id))
+        self.assertFalse(UserFollowing.objects.unfollow(self.user1.id, self.user2.id))
+
+        self.user1.refresh_from_db()
+        self.assertEqual(self.user1.following_count, 0)
+
+    def test_unfollow_blocked(self):
+        UserFollowingFactory.create(
+            user=self.user1, followed_user=self.user2, blocked=True
+        )
+
+        self.assertTrue(UserFollowing.objects.unfollow(self.user1.id, self.user2.id))
+
+        self.user2.refresh_from_db()
+        self.assertEqual(self.user2.follower_count, 0)
+
+    def test_bulk_follow_returns_inserted_pairs(self):
+        user3 = UserFactory.create(email="user3@example.com")
+        # inserted by a concurrent request, which also counted it
+        UserFollowing.objects.bulk_create(
+            [UserFollowing(user=self.user1, followed_user=self.user2)]
+        )
+        pairs = [(self.user1.id, self.user2.id), (self.user1.id, user3.id)]
+
+        with mock.patch.object(connection.ops, "bulk_batch_size", return_value=1):
+            self.assertEqual(
+                UserFollowing.objects.bulk_follow(pairs), [(self.user1.id, user3.id)]
+            )
+        self.assertEqual(UserFollowing.objects.bulk_follow(pairs), [])
+
+        self.user1.refresh_from_db()
+        self.assertEqual(self.user1.following_count, 1)
+
+
+class TestAddFollowers(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.followers = [
+            UserFactory.create(email=f"follower-{index}@example.com")
+            for index in range(3)
+        ]
+
+    def test_add_followers(self):
+        UserFollowingFactory.create(user=self.followers[0], followed_user=self.user)
+
+        added = self.user.add_followers([*self.followers, self.user])
+
+        self.assertEqual(added, [follower.id for follower in self.followers[1:]])
+        self.assertEqual(self.user.get_followers().count(), 3)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.follower_count, 3)
+
+        self.user.remove_followers(self.followers[:2])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.follower_count, 1)
@@ -0,0 +1,156 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from freezegun import freeze_time
+from notifications.models import Notification
+
+from account import unread
+from account.models import NotificationGroup, NotificationGroupActor
+from account.notifications import notify_grouped
+from tests.v1.account.test_models import UserFactory
+from tests.v1.thread.test_models import PlayListFactory
+from thread.models import Like
+from thread.notifications import notify_liked
+
+
+@override_settings(NOTIFICATION_GROUP_SAMPLE_SIZE=2)
+class NotifyGroupedTests(TestCase):
+    def setUp(self) -> None:
+        self.owner = UserFactory.create(email="owner@example.com", username="owner")
+        self.actors = [
+            UserFactory.create(email=f"actor-{index}@example.com", username=f"a{index}")
+            for index in range(4)
+        ]
+        self.playlist = PlayListFactory.create(created_by=self.owner)
+
+    def like(self, actor, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return notify_grouped(
+                self.owner.id,
+                actor,
+                "liked",
+                self.playlist,
+                "your playlist Sabaton",
+                playlist=self.playlist.id,
+                **kwargs,
+            )
+
+    def test_actors_are_merged_into_one_notification(self):
+        first = self.like(self.actors[0])
+        self.assertEqual(first.data["message"], "a0 liked your playlist Sabaton.")
+
+        self.like(self.actors[1])
+        self.assertEqual(
+            self.like(self.actors[2]).data["message"],
+            "a2 and 2 others liked your playlist Sabaton.",
+        )
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.id, first.id)
+        self.assertEqual(notification.actor_object_id, str(self.actors[2].id))
+        self.assertEqual(notification.data["actor_count"], 3)
+        self.assertEqual(
+            notification.data["actors"], [self.actors[2].id, self.actors[1].id]
+        )
+        self.assertEqual(notification.data["playlist"], self.playlist.id)
+        self.assertEqual(NotificationGroup.objects.get().actor_count, 3)
+        self.assertEqual(unread.get_count(self.owner.id), 1)
+
+    def test_merge_is_constant_queries(self):
+        self.like(self.actors[0])
+        self.like(self.actors[1])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.like(self.actors[2])
+        statements = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+        # group upsert, actor insert, unread lookup, notification update and
+        # group update
+        self.assertEqual(len(statements), 5)
+
+    def test_repeated_actor_is_sampled_once(self):
+        self.like(self.actors[0])
+        notification = self.like(self.actors[0])
+
+        self.assertEqual(notification.data["actors"], [self.actors[0].id])
+        self.assertEqual(notification.data["actor_count"], 1)
+        self.assertEqual(
+            notification.data["message"], "a0 liked your playlist Sabaton."
+        )
+
+    def test_repeated_actors_are_counted_once(self):
+        for _ in range(5):
+            like, liked = Like.objects.toggle(self.actors[0], self.playlist.id)
+            self.assertTrue(liked)
+            with self.captureOnCommitCallbacks(execute=True):
+                notify_liked(like)
+            Like.objects.toggle(self.actors[0], self.playlist.id)
+        self.like(self.actors[1])
+        notification = self.like(self.actors[0])
+
+        self.assertEqual(notification.data["actor_count"], 2)
+        self.assertEqual(
+            notification.data["actors"], [self.actors[0].id, self.actors[1].id]
+        )
+        self.assertEqual(
+            notification.data["message"], "a0 and 1 other liked your playlist Sabaton."
+        )
+        self.assertEqual(NotificationGroup.objects.get().actor_count, 2)
+        self.assertEqual(NotificationGroupActor.objects.count(), 2)
+
+    def test_read_notification_becomes_unread(self):
+        self.like(self.actors[0])
+        Notification.objects.update(unread=False)
+        unread.invalidate([self.owner.id])
+        self.assertEqual(unread.get_count(self.owner.id), 0)
+
+        self.like(self.actors[1])
+
+        self.assertTrue(Notification.objects.get().unread)
+        self.assertEqual(unread.get_count(self.owner.id), 1)
+
+    def test_new_window_starts_a_new_notification(self):
+        with freeze_time(timezone.now()) as frozen:
+            self.like(self.actors[0])
+            frozen.tick(timedelta(hours=6))
+            notification = self.like(self.actors[1])
+
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(notification.data["actor_count"], 1)
+
+    def test_deleted_notification_starts_a_new_one(self):
+        first = self.like(self.actors[0])
+        self.owner.notifications_watermark = first.id
+        self.owner.save()
+
+        notification = self.like(self.actors[1])
+
+        self.assertNotEqual(notification.id, first.id)
+        self.assertEqual(notification.data["actor_count"], 1)
+        self.assertEqual(
+            NotificationGroup.objects.get().notification_id, notification.id
+        )
+        self.assertEqual(
+            list(NotificationGroupActor.objects.values_list("actor_id", flat=True)),
+            [self.actors[1].id],
+        )
+        self.assertEqual(list(self.owner.visible_notifications()), [notification])
+
+        Notification.objects.filter(id=notification.id).delete()
+        self.assertFalse(NotificationGroup.objects.exists())
+
+    def test_targets_and_verbs_are_grouped_apart(self):
+        self.like(self.actors[0])
+        other = PlayListFactory.create(created_by=self.owner, title="other")
+        notify_grouped(self.owner.id, self.actors[1], "liked", other, "your playlist")
+        notify_grouped(
+            self.owner.id, self.actors[1], "commented on", self.playlist, "it"
+        )
+
+        self.assertEqual(Notification.objects.count(), 3)
@@ -0,0 +1,38 @@
+from django.test import TestCase, override_settings
+
+from account import otp
+
+
+class OTPStoreTests(TestCase):
+    def setUp(self) -> None:
+        self.email = "user@example.com"
+        self.token = str(otp.issue(self.email, 7))
+
+    def test_verify_and_consume(self):
+        self.assertEqual(len(self.token), 6)
+        self.assertEqual(otp.verify(self.email, self.token), otp.VALID)
+        self.assertEqual(otp.consume(self.email), 7)
+        self.assertIsNone(otp.consume(self.email))
+        self.assertEqual(otp.verify(self.email, self.token), otp.EXPIRED)
+
+    @override_settings(PASSWORD_RESET_MAX_ATTEMPTS=2)
+    def test_wrong_guesses_burn_the_token(self):
+        wrong = str(int(self.token) % 999999 + 1)
+
+        self.assertEqual(otp.verify(self.email, wrong), otp.INVALID)
+        self.assertEqual(otp.verify(self.email, wrong), otp.INVALID)
+        self.assertEqual(otp.verify(self.email, self.token), otp.EXPIRED)
+
+    def test_new_token_replaces_old_one(self):
+        token = str(otp.issue(self.email, 7))
+
+        if token != self.token:
+            self.assertEqual(otp.verify(self.email, self.token), otp.INVALID)
+        self.assertEqual(otp.verify(self.email, token), otp.VALID)
+
+    @override_settings(PASSWORD_RESET_IP_RATE_LIMIT=2)
+    def test_ip_rate_limit_spans_emails(self):
+        self.assertTrue(otp.allow_request("a@example.com", "10.0.0.1"))
+        self.assertTrue(otp.allow_request("b@example.com", "10.0.0.1"))
+        self.assertFalse(otp.allow_request("c@example.com", "10.0.0.1"))
+        self.assertTrue(otp.allow_request("c@example.com", "10.0.0.2"))
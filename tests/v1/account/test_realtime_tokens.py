@@ -0,0 +1,63 @@
+import time
+
+import jwt
+import mock
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from redis import RedisError
+
+from account import realtime_tokens
+from HabbitBackend.redis_client import get_redis_connection
+
+SECRET = "secret"
+
+
+@override_settings(CENTRIFUGO_HMAC_TOKEN=SECRET)
+class RealtimeTokenTests(TestCase):
+    def decode(self, token):
+        return jwt.decode(token["token"], SECRET, algorithms=["HS256"])
+
+    def test_connection_token(self):
+        token = realtime_tokens.get_token(7)
+
+        claims = self.decode(token)
+        self.assertEqual(claims["sub"], "7")
+        self.assertEqual(claims["exp"], token["expires_at"])
+        self.assertNotIn("channel", claims)
+        self.assertAlmostEqual(token["expires_at"], time.time() + 3600, delta=5)
+
+    def test_subscription_token(self):
+        token = realtime_tokens.get_token(7, "notifications#7")
+        self.assertEqual(self.decode(token)["channel"], "notifications#7")
+
+    def test_token_is_cached_until_refresh_margin(self):
+        token = realtime_tokens.get_token(7)
+
+        with mock.patch.object(realtime_tokens, "sign") as sign:
+            self.assertEqual(realtime_tokens.get_token(7), token)
+        sign.assert_not_called()
+
+        ttl = get_redis_connection().ttl(realtime_tokens.token_key(7))
+        self.assertAlmostEqual(ttl, 3600 - 300, delta=5)
+
+    def test_tokens_are_cached_per_channel(self):
+        self.assertNotEqual(
+            realtime_tokens.get_token(7, "notifications#7"),
+            realtime_tokens.get_token(7),
+        )
+
+    def test_forbidden_channels(self):
+        self.assertIsNone(realtime_tokens.get_token(7, "notifications#8"))
+        self.assertIsNone(realtime_tokens.get_token(7, "playlist.1"))
+        self.assertIsNone(realtime_tokens.get_token(7, "admin"))
+
+    def test_redis_failure_falls_back_to_signing(self):
+        with mock.patch.object(
+            realtime_tokens, "get_redis_connection", side_effect=RedisError
+        ):
+            self.assertEqual(self.decode(realtime_tokens.get_token(7))["sub"], "7")
+
+    @override_settings(CENTRIFUGO_HMAC_TOKEN=None)
+    def test_missing_secret(self):
+        with self.assertRaises(ImproperlyConfigured):
+            realtime_tokens.get_token(7)
@@ -33,6 +33,20 @@ class TestUserSerializer(SerializerTestCase):
         self.assertIsNotNone(form.token)
         self.assertEqual(CustomUser.objects.get(email=data["email"]), user)
 
+    def test_update_hashes_password(self) -> None:
+        form = self.serializer(
+            instance=self.user,
+            data={"bio": "Hello", "password": "new-password"},
+            partial=True,
+        )
+
+        form.is_valid(raise_exception=True)
+        form.save()
+
+        user = CustomUser.objects.get(id=self.user.id)
+        self.assertEqual(user.bio, "Hello")
+        self.assertTrue(user.check_password("new-password"))
+
     def test_to_representation(self) -> None:
         serializer = self.serializer(instance=self.user)
         data = serializer.to_representation(instance=self.user)
@@ -94,8 +108,8 @@ class TestFollowingSerializer(SerializerTestCase):
 
         self.INVALID_DATA = [
             {
-                "data": {"followed_user": self.follower_user.id},
-                "errors": {"followed_user": ["User is already being followed."]},
+                "data": {"followed_user": self.user.id},
+                "errors": {"followed_user": ["User can not follow themselves."]},
                 "label": "invalid follower",
             },
         ]
@@ -110,7 +124,6 @@ class TestFollowingSerializer(SerializerTestCase):
         )
 
     def test_invalid_data(self) -> None:
-        UserFollowingFactory.create(user=self.user, followed_user=self.follower_user)
         self.check_invalid_data(
             self.serializer, entries=self.INVALID_DATA, context={"user": self.user}
         )
@@ -121,6 +134,8 @@ class TestFollowingSerializer(SerializerTestCase):
         )
         serializer.is_valid()
         follower_transaction = serializer.save()
+        self.assertTrue(serializer.created)
+        self.follower_user.refresh_from_db()
 
         data = {
             "user": UserSerializer(instance=self.follower_user).data,
@@ -0,0 +1,87 @@
+from django.test import TestCase
+
+from account import suggestions
+from account.models import FollowSuggestion, UserFollowing
+from HabbitBackend.redis_client import get_redis_connection
+from tests.v1.account.test_models import UserFactory, UserFollowingFactory
+
+
+class FollowSuggestionsTests(TestCase):
+    def setUp(self) -> None:
+        self.users = [
+            UserFactory.create(email=f"user-{index}@example.com") for index in range(6)
+        ]
+        self.ids = [user.id for user in self.users]
+        for user, followed_user in [(0, 1), (0, 2), (1, 3), (1, 4), (2, 3), (2, 0)]:
+            UserFollowingFactory.create(
+                user=self.users[user], followed_user=self.users[followed_user]
+            )
+        # user 0 blocked user 5, who is followed by user 1
+        UserFollowingFactory.create(user=self.users[1], followed_user=self.users[5])
+        UserFollowingFactory.create(
+            user=self.users[5], followed_user=self.users[0], blocked=True
+        )
+
+    def test_score(self):
+        results = suggestions.score([self.ids[0], self.ids[3]], limit=5)
+
+        self.assertEqual(results[self.ids[0]], [(self.ids[3], 2), (self.ids[4], 1)])
+        self.assertEqual(results[self.ids[3]], [])
+
+    def test_score_limit(self):
+        results = suggestions.score([self.ids[0]], limit=1)
+        self.assertEqual(results[self.ids[0]], [(self.ids[3], 2)])
+
+    def test_refresh_changed(self):
+        suggestions.refresh(self.ids, batch_size=2)
+        self.assertEqual(
+            list(
+                FollowSuggestion.objects.filter(user=self.users[0]).values_list(
+                    "suggested_user_id", "score"
+                )
+            ),
+            [(self.ids[3], 2), (self.ids[4], 1)],
+        )
+
+        # user 2 now follows user 4, which changes what user 0 is suggested
+        with self.captureOnCommitCallbacks(execute=True):
+            UserFollowing.objects.follow(self.users[2], self.users[4])
+        self.assertTrue(
+            get_redis_connection().sismember(suggestions.CHANGED_USERS_KEY, self.ids[2])
+        )
+
+        # users 2 and 0 (a follower of 2) are recomputed
+        self.assertEqual(suggestions.refresh_changed(batch_size=10), 2)
+        self.assertEqual(
+            list(
+                FollowSuggestion.objects.filter(user=self.users[0]).values_list(
+                    "suggested_user_id", "score"
+                )
+            ),
+            [(self.ids[3], 2), (self.ids[4], 2)],
+        )
+        self.assertEqual(suggestions.refresh_changed(batch_size=10), 0)
+
+    def test_block_refreshes_both_users(self):
+        # user 4 is suggested to user 0 through user 1
+        with self.captureOnCommitCallbacks(execute=True):
+            follow, _ = UserFollowing.objects.follow(self.users[4], self.users[0])
+        suggestions.refresh(self.ids, batch_size=10)
+        get_redis_connection().delete(suggestions.CHANGED_USERS_KEY)
+        self.assertTrue(
+            FollowSuggestion.objects.filter(
+                user=self.users[0], suggested_user=self.users[4]
+            ).exists()
+        )
+
+        # user 0 blocks their follower, user 4
+        with self.captureOnCommitCallbacks(execute=True):
+            follow.blocked = True
+            follow.save()
+        suggestions.refresh_changed(batch_size=10)
+
+        self.assertFalse(
+            FollowSuggestion.objects.filter(
+                user=self.users[0], suggested_user=self.users[4]
+            ).exists()
+        )
@@ -0,0 +1,288 @@
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+
+import mock
+from django.contrib.contenttypes.models import ContentType
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from freezegun import freeze_time
+from notifications.models import Notification
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from account import blacklist, emails, suggestions
+from account.api.v1.tasks import (
+    compute_follow_suggestions_task,
+    delete_notifications_task,
+    prune_expired_tokens_task,
+    prune_notification_groups_task,
+    queue_email,
+    reconcile_follow_counts_task,
+    send_email_task,
+    send_queued_emails_task,
+)
+from account.models import (
+    CustomUser,
+    FollowSuggestion,
+    NotificationDeletionJob,
+    NotificationGroup,
+    NotificationGroupActor,
+)
+from account.notifications import notify_grouped
+from tests.v1.account.test_models import (
+    NotificationFactory,
+    UserFactory,
+    UserFollowingFactory,
+)
+from tests.v1.thread.test_models import PlayListFactory
+
+
+class ReconcileFollowCountsTaskTests(TestCase):
+    def setUp(self) -> None:
+        self.users = [
+            UserFactory.create(email=f"user-{index}@example.com") for index in range(3)
+        ]
+        UserFollowingFactory.create(user=self.users[0], followed_user=self.users[1])
+        UserFollowingFactory.create(user=self.users[2], followed_user=self.users[1])
+        UserFollowingFactory.create(
+            user=self.users[1], followed_user=self.users[0], blocked=True
+        )
+
+    def test_reconcile_repairs_drift(self):
+        CustomUser.objects.update(follower_count=7, following_count=0)
+
+        repaired = reconcile_follow_counts_task(chunk_size=2)
+
+        self.assertEqual(repaired, 3)
+        counts = dict(
+            CustomUser.objects.values_list("id", "follower_count").order_by("id")
+        )
+        self.assertEqual(
+            counts, {self.users[0].id: 0, self.users[1].id: 2, self.users[2].id: 0}
+        )
+        self.users[0].refresh_from_db()
+        self.assertEqual(self.users[0].following_count, 1)
+
+    def test_reconcile_without_drift(self):
+        self.assertEqual(reconcile_follow_counts_task(), 0)
+
+
+class ComputeFollowSuggestionsTaskTests(TestCase):
+    def setUp(self) -> None:
+        self.users = [
+            UserFactory.create(email=f"user-{index}@example.com") for index in range(3)
+        ]
+        UserFollowingFactory.create(user=self.users[0], followed_user=self.users[1])
+        UserFollowingFactory.create(user=self.users[1], followed_user=self.users[2])
+
+    def test_full_run(self):
+        self.assertEqual(compute_follow_suggestions_task(full=True), 3)
+        suggestion = FollowSuggestion.objects.get()
+        self.assertEqual(
+            (suggestion.user, suggestion.suggested_user, suggestion.score),
+            (self.users[0], self.users[2], 1),
+        )
+
+    def test_incremental_run(self):
+        suggestions.mark_changed([self.users[1].id])
+        self.assertEqual(compute_follow_suggestions_task(), 2)
+        self.assertTrue(FollowSuggestion.objects.filter(user=self.users[0]).exists())
+
+
+class PruneExpiredTokensTaskTests(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        now = timezone.now()
+        self.tokens = [
+            OutstandingToken.objects.create(
+                user=self.user,
+                jti=f"jti-{index}",
+                token="token",
+                expires_at=now + timedelta(days=offset),
+            )
+            for index, offset in enumerate([-2, -1, -1, 1])
+        ]
+        for token in self.tokens[1:]:
+            BlacklistedToken.objects.create(token=token)
+
+    def test_prune_deletes_expired_tokens(self):
+        metrics = prune_expired_tokens_task(batch_size=2)
+
+        self.assertEqual(metrics["pruned_tokens"], 3)
+        self.assertEqual(metrics["outstanding_tokens"], 1)
+        self.assertEqual(metrics["blacklisted_tokens"], 1)
+        self.assertEqual(
+            list(OutstandingToken.objects.values_list("jti", flat=True)), ["jti-3"]
+        )
+        self.assertTrue(blacklist.might_contain("jti-3"))
+        self.assertFalse(blacklist.might_contain("jti-1"))
+
+
+class EmailDispatchTests(TestCase):
+    def setUp(self) -> None:
+        self.payloads = [
+            emails.reset_password_otp_email(f"user-{index}@example.com", 123456)
+            for index in range(5)
+        ]
+
+    @override_settings(EMAIL_BATCH_SIZE=2)
+    def test_queued_emails_are_sent_in_batches(self):
+        with mock.patch(
+            "account.api.v1.tasks.send_queued_emails_task.apply_async"
+        ) as flush:
+            queue_email(*self.payloads[:3])
+            queue_email(*self.payloads[3:])
+
+        flush.assert_called_once()
+
+        with mock.patch.object(
+            mail.get_connection().__class__, "open", autospec=True
+        ) as open_connection:
+            sent = send_queued_emails_task()
+
+        self.assertEqual(sent, 5)
+        self.assertEqual(open_connection.call_count, 3)
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [payload["to"] for payload in self.payloads],
+        )
+        self.assertIn("123456", mail.outbox[0].alternatives[0][0])
+        self.assertEqual(emails.pop_batch(10), [])
+
+    def test_failed_emails_are_retried_with_backoff(self):
+        emails.push(self.payloads[:2])
+
+        with mock.patch.object(
+            emails.EmailMultiAlternatives, "send", side_effect=[1, SMTPException]
+        ), mock.patch("account.api.v1.tasks.send_email_task.apply_async") as retry:
+            self.assertEqual(send_queued_emails_task(), 1)
+
+        retry.assert_called_once_with(
+            ({**self.payloads[1], "attempt": 1},), countdown=30
+        )
+
+    @override_settings(EMAIL_MAX_RETRIES=1)
+    def test_retry_gives_up(self):
+        payload = {**self.payloads[0], "attempt": 1}
+
+        with mock.patch.object(
+            mail.get_connection().__class__, "open", side_effect=OSError
+        ), mock.patch("account.api.v1.tasks.send_email_task.apply_async") as retry:
+            self.assertFalse(send_email_task(payload))
+
+        retry.assert_not_called()
+        self.assertEqual(mail.outbox, [])
+
+    def test_single_retry_sends(self):
+        self.assertTrue(send_email_task(self.payloads[0]))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+
+        call_command("benchmark_email_dispatch", "--emails", "30", stdout=out)
+
+        self.assertIn("one connection per email", out.getvalue())
+        self.assertIn("batched outbox", out.getvalue())
+        self.assertEqual(emails.pop_batch(10), [])
+
+
+@override_settings(NOTIFICATION_DELETE_BATCH_SIZE=2, NOTIFICATION_DELETE_PAUSE=0)
+class DeleteNotificationsTaskTests(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.other_user = UserFactory.create(email="other@example.com")
+        content_type = ContentType.objects.get_for_model(self.user)
+        NotificationFactory.create_batch(
+            size=5, recipient=self.user, actor_content_type=content_type
+        )
+        self.kept = NotificationFactory.create(
+            recipient=self.other_user, actor_content_type=content_type
+        )
+        self.job = NotificationDeletionJob.objects.create(
+            user=self.user, watermark=self.kept.id
+        )
+        self.newer = NotificationFactory.create(
+            recipient=self.user, actor_content_type=content_type
+        )
+
+    def test_deletes_hidden_notifications_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(delete_notifications_task(self.job.id), 5)
+
+        deletes = [
+            q
+            for q in queries
+            if q["sql"].startswith('DELETE FROM "notifications_notification"')
+        ]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual(
+            set(Notification.objects.values_list("id", flat=True)),
+            {self.kept.id, self.newer.id},
+        )
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, NotificationDeletionJob.COMPLETED)
+        self.assertEqual(self.job.deleted, 5)
+        self.assertIsNotNone(self.job.date_completed)
+
+    def test_failure_is_recorded(self):
+        with mock.patch(
+            "account.api.v1.tasks.time.sleep", side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            delete_notifications_task(self.job.id)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, NotificationDeletionJob.FAILED)
+        self.assertEqual(self.job.deleted, 2)
+
+
+@override_settings(NOTIFICATION_GROUP_WINDOW=60 * 60)
+class PruneNotificationGroupsTaskTests(TestCase):
+    def setUp(self) -> None:
+        self.owner = UserFactory.create(email="owner@example.com", username="owner")
+        self.actors = [
+            UserFactory.create(email=f"actor-{index}@example.com", username=f"a{index}")
+            for index in range(2)
+        ]
+        self.playlists = [
+            PlayListFactory.create(created_by=self.owner, title=f"p{index}")
+            for index in range(3)
+        ]
+
+    def like(self, playlist):
+        for actor in self.actors:
+            notify_grouped(self.owner.id, actor, "liked", playlist, "your playlist")
+
+    def test_closed_windows_are_pruned_in_batches(self):
+        with freeze_time(timezone.now()) as frozen:
+            self.like(self.playlists[0])
+            self.like(self.playlists[1])
+            frozen.tick(timedelta(hours=1))
+            self.like(self.playlists[2])
+            open_group = NotificationGroup.objects.get(
+                target_object_id=str(self.playlists[2].id)
+            )
+
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(prune_notification_groups_task(batch_size=1), 2)
+
+        group_deletes = [
+            query
+            for query in queries
+            if query["sql"].startswith('DELETE FROM "account_notificationgroup"')
+        ]
+        self.assertEqual(len(group_deletes), 2)
+        self.assertEqual(list(NotificationGroup.objects.all()), [open_group])
+        self.assertEqual(
+            set(NotificationGroupActor.objects.values_list("group_id", flat=True)),
+            {open_group.id},
+        )
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertEqual(prune_notification_groups_task(), 0)
@@ -0,0 +1,108 @@
+import mock
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from redis import RedisError
+
+from account import unread
+from account.notifications import notify_followed_users
+from HabbitBackend.redis_client import get_redis_connection
+from tests.v1.account.test_models import NotificationFactory, UserFactory
+
+
+class UnreadCountTests(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.actor = UserFactory.create(email="actor@example.com", username="actor")
+
+    def notify(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return NotificationFactory.create(
+                recipient=self.user,
+                actor_content_type=ContentType.objects.get_for_model(self.user),
+                **kwargs,
+            )
+
+    def test_count_is_cached(self):
+        self.notify()
+        self.notify(unread=False)
+
+        self.assertEqual(unread.get_count(self.user.id), 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(unread.get_count(self.user.id), 1)
+        self.assertEqual(len(queries), 0)
+
+    def test_new_notifications_are_counted(self):
+        self.assertEqual(unread.get_count(self.user.id), 0)
+
+        self.notify()
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_followed_users(self.actor, [self.user.id])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(unread.get_count(self.user.id), 2)
+        self.assertEqual(len(queries), 0)
+
+    def test_increments_before_load_are_ignored(self):
+        self.notify()
+
+        self.assertEqual(
+            get_redis_connection().hget(unread.unread_key(self.user.id), unread.COUNT),
+            b"1",
+        )
+        self.assertEqual(unread.get_count(self.user.id), 1)
+
+    def test_increments_during_load_are_kept(self):
+        self.notify()
+        load = unread._load
+
+        def load_then_notify(user_id):
+            count = load(user_id)
+            if count == 1:
+                # a notification commits after the count was read
+                self.notify()
+            return count
+
+        with mock.patch.object(unread, "_load", side_effect=load_then_notify):
+            self.assertEqual(unread.get_count(self.user.id), 2)
+
+        self.assertEqual(unread.get_count(self.user.id), 2)
+
+    def test_increments_do_not_extend_the_timeout(self):
+        unread.get_count(self.user.id)
+        key = unread.unread_key(self.user.id)
+        get_redis_connection().expire(key, 10)
+
+        self.notify()
+
+        self.assertLessEqual(get_redis_connection().ttl(key), 10)
+        self.assertEqual(unread.get_count(self.user.id), 1)
+
+        other = UserFactory.create(email="other@example.com", username="other")
+        with self.captureOnCommitCallbacks(execute=True):
+            unread.adjust({other.id: 1})
+        self.assertGreater(get_redis_connection().ttl(unread.unread_key(other.id)), 10)
+
+    def test_edited_notification_reloads_count(self):
+        notification = self.notify()
+        self.assertEqual(unread.get_count(self.user.id), 1)
+
+        notification.unread = False
+        with self.captureOnCommitCallbacks(execute=True):
+            notification.save()
+
+        self.assertEqual(unread.get_count(self.user.id), 0)
+
+    def test_falls_back_to_database(self):
+        self.notify()
+        redis = mock.Mock()
+        redis.hmget.side_effect = RedisError
+        redis.pipeline.side_effect = RedisError
+        redis.delete.side_effect = RedisError
+
+        with mock.patch("account.unread.get_redis_connection", return_value=redis):
+            self.assertEqual(unread.get_count(self.user.id), 1)
+            with self.captureOnCommitCallbacks(execute=True):
+                unread.adjust({self.user.id: 1})
+                unread.invalidate([self.user.id])
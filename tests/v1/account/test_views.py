@@ -1,5 +1,12 @@
+from io import StringIO
+
 import mock
+from django.contrib.auth.hashers import make_password
 from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from freezegun import freeze_time
 from notifications.models import Notification
@@ -7,14 +14,21 @@ from rest_framework import status
 from rest_framework.test import APITestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from account import emails, otp
 from account.api.v1.serializers import FollowerSerializer, FollowingSerializer
-from account.models import CustomUser, UserFollowing
+from account.models import (
+    CustomUser,
+    FollowSuggestion,
+    NotificationDeletionJob,
+    UserFollowing,
+)
 from tests.utils.TestCase import ViewTestCase
 from tests.v1.account.test_models import (
     NotificationFactory,
     UserFactory,
     UserFollowingFactory,
 )
+from tests.v1.thread.test_models import PlayListFactory
 
 
 class AuthViewsTests(APITestCase):
@@ -40,6 +54,40 @@ class AuthViewsTests(APITestCase):
         # assert that the user created is active
         user = CustomUser.objects.get(id=response.data["id"])
         self.assertEqual(user.is_active, True)
+        self.assertEqual(user.username, "jason")
+        self.assertTrue(user.check_password("12345678"))
+
+    def test_signup_hashes_password_once(self):
+        """Test signup derives the username and writes the user once."""
+        data = {"email": "new.user@example.com", "password": "12345678"}
+
+        with mock.patch(
+            "account.models.make_password", wraps=make_password
+        ) as hasher, CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("api-account-v1:auth-views-list"), data)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user = CustomUser.objects.get(id=response.data["id"])
+        self.assertEqual(user.username, f"new.user-{user.id}")
+        self.assertTrue(user.is_active)
+        self.assertTrue(user.check_password("12345678"))
+        self.assertEqual(hasher.call_count, 1)
+        user_writes = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith(("INSERT", "UPDATE"))
+            and '"account_customuser"' in query["sql"]
+        ]
+        # SQLite has no sequence to reserve the id from, PostgreSQL only INSERTs
+        self.assertEqual(len(user_writes), 2)
+
+    def test_signup_benchmark_command(self):
+        out = StringIO()
+
+        call_command("benchmark_signup", "--signups", "2", stdout=out)
+
+        self.assertIn("signups/sec", out.getvalue())
+        self.assertEqual(CustomUser.objects.count(), 1)
 
     def test_logout_successful(self):
         """Test user logout."""
@@ -64,7 +112,7 @@ class ResetPasswordViewsetTests(APITestCase):
         data = {"email": self.user.email}
 
         with mock.patch(
-            "account.api.v1.tasks.send_reset_password_otp_to_user_email_task.delay"
+            "account.api.v1.tasks.send_queued_emails_task.apply_async"
         ) as email_task:
             response = self.client.post(
                 reverse("api-account-v1:reset-password-gettoken"),
@@ -73,14 +121,62 @@ class ResetPasswordViewsetTests(APITestCase):
 
         email_task.assert_called_once()
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.user.refresh_from_db()
-        self.assertIsNotNone(self.user.reset_token)
+        self.assertEqual(response.json(), {"status": "success"})
+        (payload,) = emails.pop_batch(10)
+        token = str(payload["context"]["otp"])
+        self.assertEqual(otp.verify(self.user.email, token), otp.VALID)
+        self.assertNotIn(token, response.content.decode())
+
+    def test_generate_token_is_rate_limited(self):
+        """Test an email can only request a limited number of tokens."""
+        url = reverse("api-account-v1:reset-password-gettoken")
+
+        with mock.patch(
+            "account.api.v1.tasks.send_queued_emails_task.apply_async"
+        ), self.settings(PASSWORD_RESET_EMAIL_RATE_LIMIT=2):
+            responses = [
+                self.client.post(url, {"email": self.user.email}) for _ in range(3)
+            ]
+
+        self.assertEqual(
+            [response.status_code for response in responses],
+            [
+                status.HTTP_200_OK,
+                status.HTTP_200_OK,
+                status.HTTP_429_TOO_MANY_REQUESTS,
+            ],
+        )
+
+    def test_reset_flow_queries(self):
+        """Test the whole flow reads the user once and writes the password once."""
+        with mock.patch(
+            "account.api.v1.tasks.send_queued_emails_task.apply_async"
+        ), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("api-account-v1:reset-password-gettoken"),
+                {"email": self.user.email},
+            )
+            (payload,) = emails.pop_batch(10)
+            data = {"token": payload["context"]["otp"], "email": self.user.email}
+            self.client.post(
+                reverse("api-account-v1:reset-password-validatetoken"), data
+            )
+            response = self.client.post(
+                reverse("api-account-v1:reset-password-resetpassword"),
+                {**data, "password": "1122334455"},
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user_queries = [
+            query["sql"].split()[0]
+            for query in queries
+            if '"account_customuser"' in query["sql"]
+        ]
+        self.assertEqual(user_queries, ["SELECT", "UPDATE"])
 
     def test_validate_token__successful(self):
         """Test Validate reset password token view."""
-        unsigned_token, signed_token = self.user.generate_resettoken()
-        self.user.reset_token = signed_token
-        self.user.save()
+        unsigned_token = otp.issue(self.user.email, self.user.id)
         data = {"token": unsigned_token, "email": self.user.email}
 
         response = self.client.post(
@@ -91,9 +187,7 @@ class ResetPasswordViewsetTests(APITestCase):
 
     def test_validate_token__failed_invalid_token(self):
         """Test validate reset password fails if wrong token is sent."""
-        unsigned_token, signed_token = self.user.generate_resettoken()
-        self.user.reset_token = signed_token
-        self.user.save()
+        unsigned_token = otp.issue(self.user.email, self.user.id)
         data = {"token": unsigned_token + 1, "email": self.user.email}
 
         response = self.client.post(
@@ -106,9 +200,7 @@ class ResetPasswordViewsetTests(APITestCase):
     @freeze_time("2022-09-21 01:00:00")
     def test_validate_token__failed_expired_token(self):
         """Test validate reset password fails if token is expired."""
-        unsigned_token, signed_token = self.user.generate_resettoken()
-        self.user.reset_token = signed_token
-        self.user.save()
+        unsigned_token = otp.issue(self.user.email, self.user.id)
         data = {"token": unsigned_token, "email": self.user.email}
 
         with freeze_time("2022-09-21 02:00:00"):
@@ -124,9 +216,7 @@ class ResetPasswordViewsetTests(APITestCase):
 
     def test_resetpassword_successful(self):
         """Test reset user password with token."""
-        unsigned_token, signed_token = self.user.generate_resettoken()
-        self.user.reset_token = signed_token
-        self.user.save()
+        unsigned_token = otp.issue(self.user.email, self.user.id)
         data = {
             "token": unsigned_token,
             "email": self.user.email,
@@ -140,13 +230,12 @@ class ResetPasswordViewsetTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.user.refresh_from_db()
-        self.assertIsNone(self.user.reset_token)
+        self.assertTrue(self.user.check_password("1122334455"))
+        self.assertEqual(otp.verify(self.user.email, str(unsigned_token)), otp.EXPIRED)
 
     def test_resetpassword_failed_invalid_token(self):
         """Test reset user password with token fails if wrong token is sent."""
-        unsigned_token, signed_token = self.user.generate_resettoken()
-        self.user.reset_token = signed_token
-        self.user.save()
+        unsigned_token = otp.issue(self.user.email, self.user.id)
         data = {
             "token": unsigned_token + 1,
             "email": self.user.email,
@@ -164,9 +253,7 @@ class ResetPasswordViewsetTests(APITestCase):
     @freeze_time("2022-09-21 01:00:00")
     def test_resetpassword__failed_expired_token(self):
         """Test reset user password with token fails if token is expired.."""
-        unsigned_token, signed_token = self.user.generate_resettoken()
-        self.user.reset_token = signed_token
-        self.user.save()
+        unsigned_token = otp.issue(self.user.email, self.user.id)
         data = {
             "token": unsigned_token,
             "email": self.user.email,
@@ -206,6 +293,27 @@ class ListFollowersViewTests(ViewTestCase):
         results = response.data["results"]
         self.assertEqual(len(results), 0)
 
+    def test_list_followers_query_count_is_constant(self):
+        """Test embedded users are not loaded one query per row."""
+        UserFollowingFactory.create(user=self.followed_user, followed_user=self.user)
+
+        # authenticate once so both pages resolve the user from the cache
+        self.client.get(self.url)
+
+        with CaptureQueriesContext(connection) as single_page:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data["results"]), 1)
+
+        for index in range(9):
+            follower = UserFactory.create(email=f"follower-{index}@gmail.com")
+            UserFollowingFactory.create(user=follower, followed_user=self.user)
+
+        with CaptureQueriesContext(connection) as full_page:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data["results"]), 10)
+
+        self.assertEqual(len(single_page), len(full_page))
+
 
 class RetrieveFollowerViewTests(ViewTestCase):
     def setUp(self) -> None:
@@ -223,6 +331,7 @@ class RetrieveFollowerViewTests(ViewTestCase):
         )
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        follower_transaction = UserFollowing.objects.get(id=follower_transaction.id)
         serializer = FollowerSerializer(instance=follower_transaction)
         self.assertDictEqual(response.data, serializer.data)
 
@@ -254,10 +363,27 @@ class BlockFollowerViewTests(ViewTestCase):
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-        follower_transaction.refresh_from_db()
+        follower_transaction = UserFollowing.objects.get(id=follower_transaction.id)
         serializer = FollowerSerializer(instance=follower_transaction)
         self.assertDictEqual(response.data, serializer.data)
 
+    def test_block_follower_loads_each_user_once(self):
+        """Test the path user is taken from the authenticated user."""
+        UserFollowingFactory.create(followed_user=self.user, user=self.follower_user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data={"blocked": True})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user_lookups = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith("SELECT")
+            and 'FROM "account_customuser"' in query["sql"]
+        ]
+        # the JWT authentication lookup only
+        self.assertEqual(len(user_lookups), 1)
+
     def test_block_follower_not_found(self):
         """Test retrieve follower not found."""
         data = {"blocked": True}
@@ -291,24 +417,64 @@ class ListCreateFollowingViewTests(ViewTestCase):
         results = response.data["results"]
         self.assertEqual(len(results), 1)
 
+    def test_list_followed_users_query_count_is_constant(self):
+        """Test embedded users are not loaded one query per row."""
+        UserFollowingFactory.create(user=self.user, followed_user=self.followed_user)
+
+        # authenticate once so both pages resolve the user from the cache
+        self.client.get(self.url)
+
+        with CaptureQueriesContext(connection) as single_page:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data["results"]), 1)
+
+        for index in range(9):
+            followed = UserFactory.create(email=f"followed-{index}@gmail.com")
+            UserFollowingFactory.create(user=self.user, followed_user=followed)
+
+        with CaptureQueriesContext(connection) as full_page:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data["results"]), 10)
+
+        self.assertEqual(len(single_page), len(full_page))
+
     def test_follow_user_success(self):
         data = {"followed_user": self.followed_user.id}
         response = self.client.post(self.url, data=data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(
+            Notification.objects.filter(recipient=self.followed_user).exists()
+        )
         follower_transaction = UserFollowing.objects.get(
             followed_user=response.data["user"].get("id")
         )
         serializer = FollowingSerializer(instance=follower_transaction)
         self.assertDictEqual(response.data, serializer.data)
 
-    def test_follow_user_faliure(self):
-        """Ensure failure when trying to follow already followed user."""
-        UserFollowingFactory.create(user=self.user, followed_user=self.followed_user)
+    def test_follow_user_is_idempotent(self):
+        """Ensure following an already followed user changes nothing."""
+        follower_transaction = UserFollowingFactory.create(
+            user=self.user, followed_user=self.followed_user
+        )
 
         data = {"followed_user": self.followed_user.id}
         response = self.client.post(self.url, data=data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["following_since"], follower_transaction.date_created
+        )
+        self.assertEqual(UserFollowing.objects.filter(user=self.user).count(), 1)
+
+    def test_follow_self_faliure(self):
+        data = {"followed_user": self.user.id}
+        response = self.client.post(self.url, data=data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_follow_user_invalid_path_id(self):
+        url = reverse("api-account-v1:following-list", kwargs={"id": "me"})
+        response = self.client.post(url, data={"followed_user": self.followed_user.id})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     def test_follow_user_not_permitted(self):
         url = reverse(
             "api-account-v1:following-list", kwargs={"id": self.followed_user.id}
@@ -320,6 +486,60 @@ class ListCreateFollowingViewTests(ViewTestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
 
+class BulkFollowViewTests(ViewTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.users = [
+            UserFactory.create(email=f"suggested-{index}@gmail.com")
+            for index in range(3)
+        ]
+        self.url = reverse("api-account-v1:following-bulk", kwargs={"id": self.user.id})
+
+    def test_bulk_follow_success(self):
+        UserFollowingFactory.create(user=self.user, followed_user=self.users[0])
+        user_ids = [user.id for user in self.users]
+
+        response = self.client.post(
+            self.url, data={"followed_users": user_ids}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"followed_users": user_ids[1:]})
+        self.assertEqual(UserFollowing.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(
+            Notification.objects.filter(recipient__in=self.users[1:]).count(), 2
+        )
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.following_count, 3)
+
+        response = self.client.post(
+            self.url, data={"followed_users": user_ids}, format="json"
+        )
+        self.assertEqual(response.data, {"followed_users": []})
+
+    def test_bulk_follow_invalid_users(self):
+        response = self.client.post(
+            self.url, data={"followed_users": [self.user.id]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            self.url, data={"followed_users": [self.users[0].id, 0]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data, {"followed_users": ["Users with ids [0] do not exist."]}
+        )
+
+    def test_bulk_follow_not_permitted(self):
+        url = reverse("api-account-v1:following-bulk", kwargs={"id": self.users[0].id})
+        response = self.client.post(
+            url, data={"followed_users": [self.users[1].id]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
 class RetrieveRemoveFollowingViewTests(ViewTestCase):
     def setUp(self) -> None:
         super().setUp()
@@ -349,6 +569,10 @@ class RetrieveRemoveFollowingViewTests(ViewTestCase):
         UserFollowingFactory.create(user=self.user, followed_user=self.followed_user)
         response = self.client.delete(self.url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(UserFollowing.objects.filter(user=self.user).exists())
+
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_delete_followed_user__failed_not_permitted(self):
         UserFollowingFactory.create(user=self.user, followed_user=self.followed_user)
@@ -480,6 +704,86 @@ class MarkAllNotificationsAsReadViewTests(ViewTestCase):
         )
 
 
+class UnreadNotificationsCountViewTests(ViewTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.notifications = NotificationFactory.create_batch(
+            size=3,
+            recipient=self.user,
+            actor_content_type=ContentType.objects.get_for_model(self.user),
+        )
+        self.url = reverse("api-account-v1:unread-notifications-count")
+
+    def unread_count(self) -> int:
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["unread"]
+
+    def test_unread_count(self):
+        self.assertEqual(self.unread_count(), 3)
+
+    def test_mark_all_as_read_resets_count(self):
+        self.assertEqual(self.unread_count(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("api-account-v1:mark-all-notifications-as-read"))
+
+        self.assertEqual(self.unread_count(), 0)
+
+    def test_delete_updates_count(self):
+        self.assertEqual(self.unread_count(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(
+                reverse(
+                    "api-account-v1:notification-details",
+                    kwargs={"pk": self.notifications[0].pk},
+                )
+            )
+        self.assertEqual(self.unread_count(), 2)
+
+        with mock.patch(
+            "account.api.v1.tasks.delete_notifications_task.delay"
+        ), self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse("api-account-v1:delete-all-notifications"))
+        self.assertEqual(self.unread_count(), 0)
+
+
+@override_settings(CENTRIFUGO_HMAC_TOKEN="secret")
+class RealtimeTokenViewTests(ViewTestCase):
+    def test_connection_token(self):
+        url = reverse("api-account-v1:realtime-connection-token")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {"token", "expires_at"})
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(url)
+        self.assertEqual(cached.data, response.data)
+        self.assertEqual(len(queries), 0)
+
+    def test_subscription_token(self):
+        playlist = PlayListFactory.create(created_by=self.user)
+        url = reverse("api-account-v1:realtime-subscription-token")
+
+        for channel in [f"notifications#{self.user.id}", f"playlist.{playlist.id}"]:
+            response = self.client.get(url, {"channel": channel})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data["channel"], channel)
+            self.assertIn("token", response.data)
+
+    def test_subscription_token_errors(self):
+        url = reverse("api-account-v1:realtime-subscription-token")
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(
+            url, {"channel": f"notifications#{self.user.id + 1}"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
 class DeleteAllNotificationsViewTests(ViewTestCase):
     def setUp(self) -> None:
         super().setUp()
@@ -501,8 +805,146 @@ class DeleteAllNotificationsViewTests(ViewTestCase):
         self.url = reverse("api-account-v1:delete-all-notifications")
 
     def test_delete_all_notifications(self):
+        with mock.patch(
+            "account.api.v1.tasks.delete_notifications_task.delay"
+        ) as task, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(path=self.url)
 
-        response = self.client.delete(path=self.url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], NotificationDeletionJob.PENDING)
+        task.assert_called_once_with(response.data["id"])
 
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertEqual(0, Notification.objects.filter(recipient=self.user).count())
+        # hidden right away, deleted by the task
+        response = self.client.get(reverse("api-account-v1:list-notifications"))
+        self.assertEqual(response.data["results"], [])
+        self.assertEqual(8, Notification.objects.filter(recipient=self.user).count())
+
+        new_notification = NotificationFactory.create(
+            recipient=self.user,
+            actor_content_type=ContentType.objects.get_for_model(self.user),
+        )
+        response = self.client.get(reverse("api-account-v1:list-notifications"))
+        self.assertEqual(
+            [item["id"] for item in response.data["results"]], [new_notification.id]
+        )
+
+    def test_deletion_job_status(self):
+        job = NotificationDeletionJob.objects.create(user=self.user, watermark=1)
+        other_job = NotificationDeletionJob.objects.create(
+            user=UserFactory.create(email="other@example.com"), watermark=1
+        )
+
+        response = self.client.get(
+            reverse("api-account-v1:notification-deletion-job", kwargs={"pk": job.pk})
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], NotificationDeletionJob.PENDING)
+
+        response = self.client.get(
+            reverse(
+                "api-account-v1:notification-deletion-job", kwargs={"pk": other_job.pk}
+            )
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class FollowSuggestionsViewTests(ViewTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.users = [
+            UserFactory.create(email=f"suggested-{index}@gmail.com")
+            for index in range(3)
+        ]
+        for score, user in enumerate(self.users, start=1):
+            FollowSuggestion.objects.create(
+                user=self.user, suggested_user=user, score=score
+            )
+        self.url = reverse("api-account-v1:user-views-suggestions")
+
+    def test_list_suggestions(self):
+        UserFollowingFactory.create(user=self.user, followed_user=self.users[0])
+        self.users[1].is_active = False
+        self.users[1].save()
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item["user"]["id"], item["score"]) for item in response.data],
+            [(self.users[2].id, 3)],
+        )
+
+    def test_blocked_users_are_not_suggested(self):
+        UserFollowingFactory.create(
+            user=self.users[0], followed_user=self.user, blocked=True
+        )
+        UserFollowingFactory.create(
+            user=self.user, followed_user=self.users[1], blocked=True
+        )
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(
+            [item["user"]["id"] for item in response.data], [self.users[2].id]
+        )
+
+
+class UserSearchViewTests(ViewTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.alice = UserFactory.create(username="alice", email="alice@gmail.com")
+        self.malice = UserFactory.create(username="malice", email="m@gmail.com")
+        self.bob = UserFactory.create(username="bob", email="alice.bob@gmail.com")
+        self.carl = UserFactory.create(username="carl", email="carl@gmail.com")
+
+    def test_list_users_search_filter(self):
+        url = reverse("api-account-v1:user-views-list")
+
+        response = self.client.get(url, {"search": "ALIC"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {item["id"] for item in response.data["results"]},
+            {self.alice.id, self.malice.id, self.bob.id},
+        )
+
+    def test_search_ranks_prefix_matches_first(self):
+        url = reverse("api-account-v1:user-views-search")
+
+        response = self.client.get(url, {"search": "alice"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["id"] for item in response.data],
+            [self.alice.id, self.bob.id, self.malice.id],
+        )
+
+    def test_autocomplete(self):
+        url = reverse("api-account-v1:user-views-autocomplete")
+
+        response = self.client.get(url, {"search": "ca"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data], [self.carl.id])
+
+    def test_search_requires_term(self):
+        url = reverse("api-account-v1:user-views-search")
+
+        response = self.client.get(url, {"search": " "})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("search", response.data)
+
+
+class BenchmarkUserSearchCommandTests(ViewTestCase):
+    def test_benchmark_rolls_back(self):
+        users = CustomUser.objects.count()
+        out = StringIO()
+
+        call_command(
+            "benchmark_user_search", "--users", "50", "--queries", "5", stdout=out
+        )
+
+        self.assertIn("search: p50=", out.getvalue())
+        self.assertIn("autocomplete: p50=", out.getvalue())
+        self.assertEqual(users, CustomUser.objects.count())
@@ -1,5 +1,6 @@
-from django.db import IntegrityError, transaction
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from factory.django import DjangoModelFactory
 
 from tests.v1.account.test_models import UserFactory
@@ -135,3 +136,142 @@ class TestLikeModel(TestCase):
                 created_by=self.user,
                 comment=comment,
             )
+
+
+class TestDenormalizedCounts(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.other_user = UserFactory.create(email="TestCounts@example.com")
+        self.playlist = PlayListFactory.create(created_by=self.other_user)
+
+    def counts(self):
+        self.playlist.refresh_from_db()
+        return self.playlist.like_count, self.playlist.comment_count
+
+    def test_like_count(self) -> None:
+        like = LikeFactory.create(created_by=self.user, playlist=self.playlist)
+        self.assertEqual(self.playlist.like_count, 1)
+        self.assertEqual(self.counts(), (1, 0))
+
+        # likes of comments are not counted on the playlist
+        comment = CommentFactory.create(created_by=self.user, playlist=self.playlist)
+        LikeFactory.create(created_by=self.other_user, comment=comment).delete()
+
+        like.delete()
+        self.assertEqual(self.counts(), (0, 1))
+
+    def test_comment_and_reply_counts(self) -> None:
+        comment = CommentFactory.create(created_by=self.user, playlist=self.playlist)
+        reply = CommentFactory.create(
+            created_by=self.other_user, playlist=self.playlist, replying=comment
+        )
+        CommentFactory.create(
+            created_by=self.user, playlist=self.playlist, replying=reply
+        )
+        other = CommentFactory.create(created_by=self.user, playlist=self.playlist)
+
+        self.assertEqual(comment.reply_count, 1)
+        self.assertEqual(self.counts(), (0, 4))
+
+        reply.delete()
+        comment.refresh_from_db()
+        self.assertEqual(comment.reply_count, 0)
+        # the reply's own reply is deleted with it
+        self.assertEqual(self.counts(), (0, 2))
+
+        other.delete()
+        comment.delete()
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_saves_keep_concurrent_counts(self) -> None:
+        comment = CommentFactory.create(created_by=self.user, playlist=self.playlist)
+        stale_playlist = PlayList.objects.get(id=self.playlist.id)
+        stale_comment = Comment.objects.get(id=comment.id)
+        LikeFactory.create(created_by=self.user, playlist=self.playlist)
+        CommentFactory.create(
+            created_by=self.other_user, playlist=self.playlist, replying=comment
+        )
+
+        stale_playlist.title = "renamed"
+        stale_playlist.save()
+        stale_comment.content = "edited"
+        stale_comment.save()
+
+        self.assertEqual(self.counts(), (1, 2))
+        self.assertEqual(self.playlist.title, "renamed")
+        comment.refresh_from_db()
+        self.assertEqual((comment.content, comment.reply_count), ("edited", 1))
+
+
+class TestLikeToggle(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.other_user = UserFactory.create(email="TestLikeToggle@example.com")
+        self.playlist = PlayListFactory.create(created_by=self.other_user)
+
+    def statements(self, queries):
+        return [
+            query["sql"]
+            for query in queries.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+
+    def test_like_and_unlike(self) -> None:
+        with CaptureQueriesContext(connection) as queries:
+            like, liked = Like.objects.toggle(self.user, playlist_id=self.playlist.id)
+        # the insert and the like count
+        self.assertEqual(len(self.statements(queries)), 2)
+        self.assertTrue(liked)
+        self.assertEqual(Like.objects.get().id, like.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(like.playlist.created_by_id, self.other_user.id)
+
+        with CaptureQueriesContext(connection) as queries:
+            unliked, liked = Like.objects.toggle(
+                self.user, playlist_id=self.playlist.id
+            )
+        self.assertEqual(len(self.statements(queries)), 3)
+        self.assertFalse(liked)
+        self.assertEqual(unliked.id, like.id)
+        self.assertFalse(Like.objects.exists())
+        self.playlist.refresh_from_db()
+        self.assertEqual(self.playlist.like_count, 0)
+
+    def test_like_comment(self) -> None:
+        comment = CommentFactory.create(
+            created_by=self.other_user, playlist=self.playlist
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            like, liked = Like.objects.toggle(self.user, comment_id=comment.id)
+        # the insert and the comment's creator and playlist
+        self.assertEqual(len(self.statements(queries)), 2)
+        self.assertTrue(liked)
+        with self.assertNumQueries(0):
+            self.assertEqual(like.comment.created_by_id, self.other_user.id)
+            self.assertEqual(like.comment.playlist_id, self.playlist.id)
+
+    def test_own_and_missing_targets(self) -> None:
+        comment = CommentFactory.create(created_by=self.user, playlist=self.playlist)
+
+        self.assertEqual(
+            Like.objects.toggle(self.user, comment_id=comment.id), (None, False)
+        )
+        self.assertEqual(
+            Like.objects.toggle(self.user, playlist_id=self.playlist.id + 1),
+            (None, False),
+        )
+        self.assertFalse(Like.objects.exists())
+
+    def test_likes_are_unique(self) -> None:
+        comment = CommentFactory.create(
+            created_by=self.other_user, playlist=self.playlist
+        )
+        LikeFactory.create(created_by=self.user, playlist=self.playlist)
+        LikeFactory.create(created_by=self.user, comment=comment)
+
+        for target in [{"playlist": self.playlist}, {"comment": comment}]:
+            with transaction.atomic():
+                self.assertRaises(
+                    IntegrityError, LikeFactory.create, created_by=self.user, **target
+                )
@@ -0,0 +1,261 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import mock
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from account.notifications import notify_followed_users
+from account.realtime import NOTIFICATION_CREATED
+from HabbitBackend import centrifugo
+from tests.utils.TestCase import ViewTestCase
+from tests.v1.account.test_models import UserFactory
+from tests.v1.thread.test_models import CommentFactory, LikeFactory, PlayListFactory
+from thread import realtime
+
+
+class StubCentrifugoHandler(BaseHTTPRequestHandler):
+    """Records API requests and answers every command with an empty result."""
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        commands = [json.loads(line) for line in body.split("\n") if line]
+        self.server.requests.append((self.headers["Authorization"], commands))
+
+        reply = "\n".join(json.dumps({"result": {}}) for _ in commands).encode()
+        self.send_response(self.server.status)
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class CentrifugoStubMixin:
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubCentrifugoHandler)
+        cls.server.requests = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.settings_override = override_settings(
+            CENTRIFUGO_API=f"http://127.0.0.1:{cls.server.server_port}/api",
+            CENTRIFUGO_API_KEY="api-key",
+            CENTRIFUGO_FLUSH_INTERVAL=3600,
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.settings_override.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        super().setUp()
+        centrifugo.flush()
+        self.server.requests.clear()
+        self.server.status = 200
+
+    def sent_commands(self):
+        centrifugo.flush()
+        return [command for _, commands in self.server.requests for command in commands]
+
+
+class CentrifugoPublisherTests(CentrifugoStubMixin, TestCase):
+    def test_events_are_published_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            centrifugo.publish(["playlist.1"], {"type": "test"})
+            self.assertEqual(centrifugo.flush(), 0)
+
+        self.assertEqual(self.server.requests, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(centrifugo.flush(), 1)
+
+        authorization, commands = self.server.requests[0]
+        self.assertEqual(authorization, "apikey api-key")
+        self.assertEqual(
+            commands,
+            [
+                {
+                    "method": "publish",
+                    "params": {
+                        "channel": "playlist.1",
+                        "data": {"type": "test"},
+                        "skip_history": False,
+                    },
+                }
+            ],
+        )
+
+    def test_batch_is_coalesced_into_one_request(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            centrifugo.publish(["a", "b"], {"type": "shared"})
+            centrifugo.publish(["c"], {"type": "shared"})
+            centrifugo.publish(["a"], {"type": "shared"})
+            centrifugo.publish(["a"], {"type": "other"})
+
+        self.assertEqual(centrifugo.flush(), 2)
+        self.assertEqual(len(self.server.requests), 1)
+        broadcast, publish = self.server.requests[0][1]
+        self.assertEqual(broadcast["method"], "broadcast")
+        self.assertEqual(broadcast["params"]["channels"], ["a", "b", "c"])
+        self.assertEqual(publish["method"], "publish")
+        self.assertEqual(publish["params"]["data"], {"type": "other"})
+
+    @override_settings(CENTRIFUGO_BATCH_SIZE=2)
+    def test_buffer_is_sent_in_batches(self):
+        with mock.patch.object(centrifugo, "_wakeup") as wakeup:
+            with self.captureOnCommitCallbacks(execute=True):
+                for index in range(5):
+                    centrifugo.publish([f"playlist.{index}"], {"index": index})
+
+        wakeup.set.assert_called()
+        self.assertEqual(centrifugo.flush(), 5)
+        self.assertEqual(
+            [len(commands) for _, commands in self.server.requests], [2, 2, 1]
+        )
+
+    @override_settings(CENTRIFUGO_BUFFER_SIZE=2)
+    def test_full_buffer_drops_oldest_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(3):
+                centrifugo.publish([f"playlist.{index}"], {"index": index})
+
+        channels = [command["params"]["channel"] for command in self.sent_commands()]
+        self.assertEqual(channels, ["playlist.1", "playlist.2"])
+
+    def test_failed_batch_is_dropped(self):
+        self.server.status = 500
+        with self.captureOnCommitCallbacks(execute=True):
+            centrifugo.publish(["playlist.1"], {"type": "test"})
+
+        with self.assertLogs("HabbitBackend.centrifugo", "ERROR"):
+            self.assertEqual(centrifugo.flush(), 0)
+        self.assertEqual(centrifugo.flush(), 0)
+        self.assertEqual(len(self.server.requests), 1)
+
+    @override_settings(CENTRIFUGO_API=None)
+    def test_nothing_is_published_without_api(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            centrifugo.publish(["playlist.1"], {"type": "test"})
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(centrifugo.flush(), 0)
+
+    def test_follow_notifications_are_broadcast(self):
+        user = UserFactory.create(email="actor@example.com", username="actor")
+        recipients = [
+            UserFactory.create(email=f"recipient-{index}@example.com")
+            for index in range(3)
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_followed_users(user, [recipient.id for recipient in recipients])
+
+        (command,) = self.sent_commands()
+        self.assertEqual(command["method"], "broadcast")
+        self.assertEqual(
+            command["params"]["channels"],
+            [centrifugo.user_channel(recipient.id) for recipient in recipients],
+        )
+        self.assertEqual(command["params"]["data"]["type"], NOTIFICATION_CREATED)
+
+
+class ThreadEventTests(CentrifugoStubMixin, ViewTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.owner = UserFactory.create(email="owner@example.com")
+        self.playlist = PlayListFactory.create(created_by=self.owner)
+
+    def thread_commands(self):
+        return [
+            command
+            for command in self.sent_commands()
+            if command["params"]["data"]["type"] != NOTIFICATION_CREATED
+        ]
+
+    def test_like_is_published(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("api-thread-v1:like-list"), data={"playlist": self.playlist.id}
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        (command,) = self.thread_commands()
+        self.assertEqual(
+            command["params"]["channels"],
+            [
+                centrifugo.playlist_channel(self.playlist.id),
+                centrifugo.user_channel(self.owner.id),
+            ],
+        )
+        self.assertEqual(
+            command["params"]["data"],
+            {
+                "type": realtime.LIKE_CREATED,
+                "like": response.data["id"],
+                "user": self.user.id,
+                "playlist": self.playlist.id,
+                "comment": None,
+            },
+        )
+
+    def test_unlike_is_published(self):
+        like = LikeFactory.create(created_by=self.user, playlist=self.playlist)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(
+                reverse("api-thread-v1:like-detail", kwargs={"id": like.id})
+            )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        (command,) = self.thread_commands()
+        self.assertEqual(command["params"]["data"]["type"], realtime.LIKE_DELETED)
+        self.assertEqual(command["params"]["data"]["like"], like.id)
+
+    def test_comment_like_goes_to_comment_owner(self):
+        comment = CommentFactory.create(created_by=self.owner, playlist=self.playlist)
+        like = LikeFactory.create(created_by=self.user, comment=comment, playlist=None)
+
+        self.assertEqual(
+            realtime.like_channels(like),
+            [
+                centrifugo.playlist_channel(self.playlist.id),
+                centrifugo.user_channel(self.owner.id),
+            ],
+        )
+
+    def test_reply_is_published(self):
+        replied = UserFactory.create(email="replied@example.com")
+        comment = CommentFactory.create(created_by=replied, playlist=self.playlist)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse(
+                    "api-thread-v1:playlist-comments", kwargs={"id": self.playlist.id}
+                ),
+                data={
+                    "playlist": self.playlist.id,
+                    "replying": comment.id,
+                    "content": "reply",
+                },
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        (command,) = self.thread_commands()
+        self.assertEqual(
+            command["params"]["channels"],
+            [
+                centrifugo.playlist_channel(self.playlist.id),
+                centrifugo.user_channel(self.owner.id),
+                centrifugo.user_channel(replied.id),
+            ],
+        )
+        self.assertEqual(command["params"]["data"]["type"], realtime.COMMENT_CREATED)
+        self.assertEqual(command["params"]["data"]["replying"], comment.id)
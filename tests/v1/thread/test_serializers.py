@@ -1,4 +1,5 @@
 from django.http import HttpRequest
+from rest_framework.exceptions import ValidationError
 from rest_framework.request import Request
 
 from account.api.v1.serializers import NotificationSerializer
@@ -70,6 +71,18 @@ class LikeSerializerTest(SerializerTestCase):
             context={"request": self.request},
         )
 
+    def test_concurrent_like_is_rejected(self) -> None:
+        LikeFactory.create(created_by=self.user, playlist=self.playlist)
+        serializer = self.serializer(context={"request": self.request})
+
+        with self.assertRaises(ValidationError) as raised:
+            serializer.create({"playlist": self.playlist})
+
+        self.assertEqual(
+            raised.exception.detail,
+            {"non_field_errors": ["User has already liked this playlist."]},
+        )
+
     def test_to_representation(self) -> None:
         serializer = self.serializer(
             data={"playlist": self.playlist.id}, context={"request": self.request}
@@ -77,17 +90,38 @@ class LikeSerializerTest(SerializerTestCase):
 
         serializer.is_valid()
         like = serializer.save()
+        self.playlist.refresh_from_db()
+        self.assertEqual(self.playlist.like_count, 1)
 
         expected_data = {
             "id": like.id,
             "created_by": self.user.id,
             "date_created": serializer.data["date_created"],
-            "playlist": PlayListSerializer(instance=self.playlist).data,
+            "playlist": {
+                "id": self.playlist.id,
+                "title": self.playlist.title,
+                "cover_image": None,
+                "like_count": 1,
+                "comment_count": 0,
+            },
             "comment": None,
         }
 
         self.assertDictEqual(expected_data, serializer.data)
 
+    def test_expanded_representation(self) -> None:
+        like = LikeFactory.create(created_by=self.user, playlist=self.playlist)
+        http_request = HttpRequest()
+        http_request.GET["expand"] = "playlist"
+
+        serializer = self.serializer(
+            instance=like, context={"request": Request(http_request)}
+        )
+
+        self.assertEqual(
+            serializer.data["playlist"], PlayListSerializer(instance=self.playlist).data
+        )
+
 
 class PlayListSerializerTests(SerializerTestCase):
     def setUp(self) -> None:
@@ -206,6 +240,7 @@ class CommentSerializerTests(SerializerTestCase):
             "id",
             "content",
             "created_by",
+            "reply_count",
         ]
 
     def test_required_fields(self) -> None:
@@ -239,6 +274,7 @@ class CommentSerializerTests(SerializerTestCase):
             "content": self.comment1.content,
             "attachments": [],
             "date_created": serializer.data["date_created"],
+            "reply_count": 1,
             "replies": [comment.id],
         }
         self.assertDictEqual(expected_data, serializer.data)
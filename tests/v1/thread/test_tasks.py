@@ -0,0 +1,126 @@
+import time
+
+import mock
+from django.test import TestCase, override_settings
+from notifications.models import Notification
+
+from account import unread
+from HabbitBackend.celery import app
+from tests.v1.account.test_models import UserFactory, UserFollowingFactory
+from tests.v1.thread.test_models import CommentFactory, LikeFactory, PlayListFactory
+from thread.api.v1.tasks import (
+    fan_out_completed_task,
+    fan_out_playlist_notifications_task,
+    notify_liked_task,
+    reconcile_thread_counts_task,
+)
+from thread.models import Comment, Like, PlayList
+from thread.notifications import PUBLISH_VERB
+
+
+@override_settings(NOTIFICATION_FANOUT_CHUNK_SIZE=2)
+class PlayListFanOutTaskTests(TestCase):
+    def setUp(self) -> None:
+        self.creator = UserFactory.create(email="creator@example.com")
+        self.followers = [
+            UserFactory.create(email=f"follower-{index}@example.com")
+            for index in range(5)
+        ]
+        for follower in self.followers:
+            UserFollowingFactory.create(user=follower, followed_user=self.creator)
+        UserFollowingFactory.create(
+            user=UserFactory.create(email="blocked@example.com"),
+            followed_user=self.creator,
+            blocked=True,
+        )
+        UserFollowingFactory.create(
+            user=UserFactory.create(email="inactive@example.com", is_active=False),
+            followed_user=self.creator,
+        )
+        self.playlist = PlayListFactory.create(created_by=self.creator)
+
+    def test_fan_out_notifies_unblocked_followers(self):
+        self.assertEqual(unread.get_count(self.followers[0].id), 0)
+
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, "task_always_eager", False)
+
+        with mock.patch(
+            "thread.api.v1.tasks.fan_out_completed_task.run",
+            wraps=fan_out_completed_task.run,
+        ) as completed, self.captureOnCommitCallbacks(execute=True):
+            chunks = fan_out_playlist_notifications_task(self.playlist.id, time.time())
+
+        self.assertEqual(chunks, 3)
+        notifications = Notification.objects.filter(verb=PUBLISH_VERB)
+        self.assertEqual(
+            sorted(notifications.values_list("recipient_id", flat=True)),
+            [follower.id for follower in self.followers],
+        )
+        self.assertEqual(notifications[0].target, self.playlist)
+        self.assertEqual(notifications[0].data["playlist"], self.playlist.id)
+        self.assertEqual(unread.get_count(self.followers[0].id), 1)
+        completed.assert_called_once()
+        self.assertEqual(completed.call_args[0][0], [2, 2, 1])
+
+    def test_fan_out_without_followers(self):
+        playlist = PlayListFactory.create(created_by=self.followers[0])
+
+        self.assertEqual(fan_out_playlist_notifications_task(playlist.id, 0), 0)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_completed_reports_throughput(self):
+        now = time.time()
+
+        metrics = fan_out_completed_task([2, 2, 1], self.playlist.id, now - 3, now - 1)
+
+        self.assertEqual(metrics["rows"], 5)
+        self.assertAlmostEqual(metrics["rows_per_second"], 5, delta=0.5)
+        self.assertAlmostEqual(metrics["latency_seconds"], 3, delta=0.5)
+
+
+class NotifyLikedTaskTests(TestCase):
+    def test_owner_is_notified_unless_unliked(self):
+        owner = UserFactory.create(email="owner@example.com")
+        playlist = PlayListFactory.create(created_by=owner)
+        like = LikeFactory.create(created_by=UserFactory.create(), playlist=playlist)
+
+        self.assertTrue(notify_liked_task(like.id))
+        self.assertEqual(owner.notifications.get().verb, "liked")
+
+        like.delete()
+        self.assertFalse(notify_liked_task(like.id))
+        self.assertEqual(owner.notifications.count(), 1)
+
+
+class ReconcileThreadCountsTaskTests(TestCase):
+    def test_drift_is_repaired(self):
+        creator = UserFactory.create(email="creator@example.com")
+        fan = UserFactory.create(email="fan@example.com")
+        playlists = [
+            PlayListFactory.create(created_by=creator, title=f"playlist-{index}")
+            for index in range(3)
+        ]
+        comment = CommentFactory.create(created_by=fan, playlist=playlists[0])
+        CommentFactory.create(created_by=fan, playlist=playlists[0], replying=comment)
+        LikeFactory.create(created_by=fan, playlist=playlists[1])
+        LikeFactory.create(created_by=fan, playlist=playlists[2])
+
+        # bulk deletes skip the model methods that keep the counts
+        Like.objects.filter(playlist=playlists[1]).delete()
+        Comment.objects.filter(replying=comment).delete()
+        PlayList.objects.filter(id=playlists[2].id).update(comment_count=5)
+
+        self.assertEqual(reconcile_thread_counts_task(chunk_size=2), 4)
+
+        self.assertEqual(
+            list(
+                PlayList.objects.order_by("id").values_list(
+                    "like_count", "comment_count"
+                )
+            ),
+            [(0, 1), (0, 0), (1, 0)],
+        )
+        comment.refresh_from_db()
+        self.assertEqual(comment.reply_count, 0)
+        self.assertEqual(reconcile_thread_counts_task(), 0)
@@ -0,0 +1,168 @@
+from datetime import timedelta
+
+import mock
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from freezegun import freeze_time
+from redis import RedisError
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from HabbitBackend.redis_client import get_redis_connection
+from tests.utils.TestCase import ViewTestCase
+from tests.v1.account.test_models import UserFactory
+from tests.v1.thread.test_models import PlayListFactory
+from thread import unique_viewers
+from thread.unique_viewers import HyperLogLog
+
+
+class HyperLogLogTests(TestCase):
+    def test_estimate_is_within_two_percent(self):
+        sketch = HyperLogLog()
+        for value in range(50000):
+            sketch.add(str(value))
+
+        self.assertAlmostEqual(sketch.count(), 50000, delta=1000)
+        self.assertEqual(len(sketch.registers), 2**HyperLogLog.PRECISION)
+
+    def test_small_counts_are_exact_enough(self):
+        sketch = HyperLogLog()
+        self.assertEqual(sketch.count(), 0)
+
+        for value in ["1", "2", "3", "2", "1"]:
+            sketch.add(value)
+
+        self.assertEqual(sketch.count(), 3)
+        self.assertFalse(sketch.add("3"))
+        self.assertEqual(HyperLogLog(bytes(sketch.registers)).count(), 3)
+
+
+class UniqueViewersTests(TestCase):
+    def setUp(self) -> None:
+        self.playlist = PlayListFactory.create(created_by=UserFactory.create())
+
+    def record(self, *viewer_ids):
+        for viewer_id in viewer_ids:
+            unique_viewers.record_viewer(self.playlist.id, viewer_id)
+
+    def test_viewers_are_counted_once(self):
+        self.record(1, 2, 1, 3, 2)
+
+        self.assertEqual(unique_viewers.count_viewers(self.playlist.id), 3)
+        self.assertEqual(unique_viewers.count_viewers(self.playlist.id + 1), 0)
+
+    def test_sketch_size_is_constant(self):
+        key = unique_viewers.viewers_key(self.playlist.id)
+        self.record(1)
+        size = get_redis_connection().strlen(key)
+
+        self.record(*range(2, 2000))
+
+        self.assertEqual(get_redis_connection().strlen(key), size)
+        self.assertAlmostEqual(
+            unique_viewers.count_viewers(self.playlist.id), 1999, delta=40
+        )
+
+    def test_daily_viewers(self):
+        with freeze_time(timezone.now()) as frozen:
+            self.record(1, 2)
+            frozen.tick(timedelta(days=1))
+            self.record(2, 3, 4)
+
+            days = unique_viewers.daily_viewers(self.playlist.id, 3)
+            today = timezone.localdate()
+
+        self.assertEqual(
+            days,
+            [
+                (today, 3),
+                (today - timedelta(days=1), 2),
+                (today - timedelta(days=2), 0),
+            ],
+        )
+        self.assertEqual(unique_viewers.count_viewers(self.playlist.id), 4)
+
+    @override_settings(UNIQUE_VIEWERS_DAILY_RETENTION=2)
+    def test_daily_sketches_expire(self):
+        self.record(1)
+
+        key = unique_viewers.viewers_key(self.playlist.id, timezone.localdate())
+        self.assertEqual(get_redis_connection().ttl(key), 2 * 24 * 60 * 60)
+        self.assertEqual(
+            get_redis_connection().ttl(unique_viewers.viewers_key(self.playlist.id)),
+            -1,
+        )
+
+    @override_settings(UNIQUE_VIEWERS_BACKEND="redis")
+    def test_redis_backend(self):
+        self.record(1, 2, 1)
+
+        self.assertEqual(unique_viewers.count_viewers(self.playlist.id), 2)
+        self.assertEqual(
+            unique_viewers.daily_viewers(self.playlist.id, 1),
+            [(timezone.localdate(), 2)],
+        )
+
+    def test_redis_failure(self):
+        with mock.patch.object(
+            unique_viewers, "get_redis_connection", side_effect=RedisError
+        ), self.assertLogs("thread.unique_viewers", "ERROR"):
+            self.record(1)
+            self.assertIsNone(unique_viewers.count_viewers(self.playlist.id))
+            self.assertEqual(
+                unique_viewers.daily_viewers(self.playlist.id, 1),
+                [(timezone.localdate(), None)],
+            )
+
+
+class PlayListUniqueViewersViewTests(ViewTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.playlist = PlayListFactory.create(created_by=self.user)
+
+    def test_retrieve_records_the_viewer(self):
+        url = reverse("api-thread-v1:playlist-detail", kwargs={"id": self.playlist.id})
+
+        self.assertEqual(self.client.get(url).data["unique_viewers"], 1)
+        self.assertEqual(self.client.get(url).data["unique_viewers"], 1)
+
+        other = UserFactory.create(email="other@example.com", username="other")
+        token = RefreshToken.for_user(other).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(self.client.get(url).data["unique_viewers"], 2)
+
+    @override_settings(PLAYLIST_STATS_DAYS=2)
+    def test_stats(self):
+        unique_viewers.record_viewer(self.playlist.id, self.user.id)
+        url = reverse("api-thread-v1:playlist-stats", kwargs={"id": self.playlist.id})
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        today = timezone.localdate()
+        self.assertEqual(
+            response.json(),
+            {
+                "id": self.playlist.id,
+                "views": 0,
+                "unique_viewers": 1,
+                "daily_unique_viewers": [
+                    {"date": today.isoformat(), "unique_viewers": 1},
+                    {
+                        "date": (today - timedelta(days=1)).isoformat(),
+                        "unique_viewers": 0,
+                    },
+                ],
+            },
+        )
+
+    def test_stats_are_for_the_creator(self):
+        playlist = PlayListFactory.create(
+            created_by=UserFactory.create(email="other@example.com", username="other")
+        )
+        url = reverse("api-thread-v1:playlist-stats", kwargs={"id": playlist.id})
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
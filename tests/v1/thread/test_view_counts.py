@@ -0,0 +1,115 @@
+from io import StringIO
+
+import mock
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from redis import RedisError
+from rest_framework import status
+
+from HabbitBackend.redis_client import get_redis_connection
+from tests.utils.TestCase import ViewTestCase
+from tests.v1.account.test_models import UserFactory
+from tests.v1.thread.test_models import PlayListFactory
+from thread import view_counts
+from thread.api.v1.tasks import flush_playlist_views_task
+from thread.models import PlayList, PlayListViewFlush
+
+
+class PlayListViewCountTests(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.playlists = [
+            PlayListFactory.create(created_by=self.user, title=f"playlist-{index}")
+            for index in range(3)
+        ]
+
+    def record(self, playlist, views):
+        for _ in range(views):
+            view_counts.record_view(playlist.id)
+
+    def views(self):
+        return list(PlayList.objects.order_by("id").values_list("views", flat=True))
+
+    @override_settings(PLAYLIST_VIEWS_FLUSH_BATCH_SIZE=1)
+    def test_flush_adds_buffered_views(self):
+        self.record(self.playlists[0], 3)
+        self.record(self.playlists[2], 1)
+
+        with self.assertNumQueries(7):
+            # savepoint, batch lookup and insert, one UPDATE per batch of
+            # playlists, pruning and release
+            self.assertEqual(flush_playlist_views_task(), 4)
+
+        self.assertEqual(self.views(), [3, 0, 1])
+        self.assertEqual(PlayListViewFlush.objects.get().views, 4)
+        self.assertFalse(get_redis_connection().exists(view_counts.FLUSHING_KEY))
+        self.assertEqual(view_counts.flush(), 0)
+
+    def test_views_are_not_counted_twice_after_a_crash(self):
+        self.record(self.playlists[0], 2)
+
+        with mock.patch.object(view_counts, "_release", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                view_counts.flush()
+        self.assertEqual(self.views(), [2, 0, 0])
+
+        self.record(self.playlists[0], 1)
+        # the crashed batch is released without being applied again
+        self.assertEqual(view_counts.flush(), 0)
+        self.assertEqual(view_counts.flush(), 1)
+        self.assertEqual(self.views(), [3, 0, 0])
+
+    def test_views_are_not_lost_after_a_crash(self):
+        self.record(self.playlists[1], 2)
+
+        with mock.patch.object(view_counts, "add_views", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                view_counts.flush()
+        self.assertEqual(self.views(), [0, 0, 0])
+        self.assertFalse(PlayListViewFlush.objects.exists())
+
+        self.record(self.playlists[1], 1)
+        self.assertEqual(view_counts.flush(), 2)
+        self.assertEqual(view_counts.flush(), 1)
+        self.assertEqual(self.views(), [0, 3, 0])
+
+    def test_deleted_playlist_is_skipped(self):
+        self.record(self.playlists[0], 1)
+        self.record(self.playlists[1], 1)
+        self.playlists[1].delete()
+
+        self.assertEqual(view_counts.flush(), 2)
+        self.assertEqual(self.views(), [1, 0])
+
+    def test_redis_failure_drops_the_view(self):
+        with mock.patch.object(
+            view_counts, "get_redis_connection", side_effect=RedisError
+        ), self.assertLogs("thread.view_counts", "ERROR"):
+            view_counts.record_view(self.playlists[0].id)
+
+
+class PlayListDetailViewCountTests(ViewTestCase):
+    def test_retrieve_records_a_view(self):
+        playlist = PlayListFactory.create(created_by=self.user)
+        url = reverse("api-thread-v1:playlist-detail", kwargs={"id": playlist.id})
+
+        for _ in range(2):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        view_counts.flush()
+        response = self.client.get(url)
+        self.assertEqual(response.data["views"], 2)
+
+
+class BenchmarkPlayListViewsCommandTests(TransactionTestCase):
+    def test_command(self):
+        out = StringIO()
+        call_command(
+            "benchmark_playlist_views", "--hits", "20", "--concurrency", "1", stdout=out
+        )
+
+        self.assertIn("views/sec", out.getvalue())
+        self.assertIn("Benchmark finished.", out.getvalue())
+        self.assertFalse(PlayList.objects.exists())
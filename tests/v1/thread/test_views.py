@@ -1,3 +1,6 @@
+import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 
@@ -10,6 +13,7 @@ from tests.v1.thread.test_models import (
     PlayListCategoryFactory,
     PlayListFactory,
 )
+from thread.models import Like, PlayList
 
 
 class AttachmentListCreateViewTest(ViewTestCase):
@@ -103,6 +107,161 @@ class LikeDetailViewTest(ViewTestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
 
+class LikeQueryCountTest(ViewTestCase):
+    """Like pages load their playlists in a fixed number of queries."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.creator = UserFactory.create(email="creator@gmail.com")
+        self.categories = [
+            PlayListCategoryFactory.create(title=title) for title in ["Pop", "Rock"]
+        ]
+
+    def like_playlists(self, count: int) -> None:
+        for _ in range(count):
+            playlist = PlayListFactory.create(
+                created_by=self.creator, title=f"playlist-{PlayList.objects.count()}"
+            )
+            playlist.categories.set(self.categories)
+            playlist.songs.set(
+                [AttachementFactory.create(created_by=self.creator) for _ in range(2)]
+            )
+            LikeFactory.create(created_by=self.user, playlist=playlist)
+
+    def get(self, url: str, expected: int, **params: str) -> bytes:
+        # authenticate once so every request resolves the user from the cache
+        self.client.get(url, params)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), expected)
+        return response.content
+
+    def test_list_views(self):
+        urls = [reverse("api-thread-v1:like-list"), reverse("api-thread-v1:user-likes")]
+
+        self.like_playlists(1)
+        for url in urls:
+            self.get(url, 2)
+            self.get(url, 4, expand="playlist")
+
+        self.like_playlists(9)
+        for url in urls:
+            compact = self.get(url, 2)
+            expanded = self.get(url, 4, expand="playlist")
+            # ten compact playlists stay well under half the expanded page
+            self.assertLess(len(compact) * 2, len(expanded))
+
+        results = self.client.get(urls[0]).data["results"]
+        self.assertEqual(len(results), 10)
+        self.assertEqual(
+            set(results[0]["playlist"]),
+            {"id", "title", "cover_image", "like_count", "comment_count"},
+        )
+        self.assertEqual(results[0]["playlist"]["like_count"], 1)
+
+        results = self.client.get(urls[0], {"expand": "playlist"}).data["results"]
+        self.assertEqual(len(results[0]["playlist"]["songs"]), 2)
+
+    def test_detail_view(self):
+        self.like_playlists(1)
+        url = reverse("api-thread-v1:like-detail", kwargs={"id": Like.objects.get().id})
+
+        self.get(url, 2)
+        self.get(url, 4, expand="playlist")
+
+
+class LikeToggleViewTest(ViewTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.user_2 = UserFactory.create(email="ragna@gmail.com")
+        self.playlist = PlayListFactory.create(created_by=self.user_2)
+        self.url = reverse("api-thread-v1:like-toggle")
+
+    def test_toggle_playlist_like(self) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {"playlist": self.playlist.id})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        like = Like.objects.get()
+        self.assertEqual(
+            response.data,
+            {
+                "id": like.id,
+                "playlist": self.playlist.id,
+                "comment": None,
+                "liked": True,
+            },
+        )
+        self.assertEqual(self.user_2.notifications.count(), 1)
+
+        response = self.client.post(self.url, {"playlist": self.playlist.id})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["id"], like.id)
+        self.assertFalse(response.data["liked"])
+        self.assertFalse(Like.objects.exists())
+        self.playlist.refresh_from_db()
+        self.assertEqual(self.playlist.like_count, 0)
+
+    def test_toggle_statements(self) -> None:
+        # fills the cached user
+        self.client.get(reverse("api-thread-v1:like-list"))
+
+        with mock.patch(
+            "thread.api.v1.views.notify_liked_task.delay"
+        ) as delay, self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(
+            connection
+        ) as queries:
+            response = self.client.post(self.url, {"playlist": self.playlist.id})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        statements = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+        # the insert and the like count, notifying is left to the task
+        self.assertEqual(len(statements), 2)
+        delay.assert_called_once_with(Like.objects.get().id)
+
+    def test_toggle_comment_like(self) -> None:
+        comment = CommentFactory.create(created_by=self.user_2, playlist=self.playlist)
+
+        response = self.client.post(self.url, {"comment": comment.id})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Like.objects.get().comment_id, comment.id)
+
+    def test_own_content_can_not_be_liked(self) -> None:
+        playlist = PlayListFactory.create(created_by=self.user, title="mine")
+        comment = CommentFactory.create(created_by=self.user, playlist=self.playlist)
+
+        for data, kind in [
+            ({"playlist": playlist.id}, "playlist"),
+            ({"comment": comment.id}, "comment"),
+        ]:
+            response = self.client.post(self.url, data)
+
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(
+                response.data["non_field_errors"],
+                [f"User can not like their own {kind}."],
+            )
+
+        self.assertFalse(Like.objects.exists())
+
+    def test_invalid_target(self) -> None:
+        response = self.client.post(self.url, {"playlist": self.playlist.id + 1})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.post(
+            self.url, {"playlist": self.playlist.id, "comment": 1}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class UserLikeListViewTest(ViewTestCase):
     def test_view(self):
         user_2 = UserFactory.create(email="follower@gmail.com")
@@ -141,9 +300,100 @@ class PlayListListViewTest(ViewTestCase):
             "short_description": "Holla",
         }
 
-        response = self.client.post(self.url, data=data)
+        with mock.patch(
+            "thread.api.v1.tasks.fan_out_playlist_notifications_task.delay"
+        ) as fan_out, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, data=data)
+
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertGreater(len(response.data), 1)
+        fan_out.assert_called_once()
+        self.assertEqual(fan_out.call_args[0][0], response.data["id"])
+
+    def test_order_and_filter_by_counts(self) -> None:
+        liked = PlayListFactory.create(created_by=self.user_2, title="liked")
+        LikeFactory.create(created_by=self.user, playlist=liked)
+        CommentFactory.create(created_by=self.user, playlist=self.playlist)
+
+        response = self.client.get(self.url, {"ordering": "-like_count"})
+        self.assertEqual(
+            [
+                (playlist["id"], playlist["like_count"])
+                for playlist in response.data["results"]
+            ],
+            [(liked.id, 1), (self.playlist.id, 0)],
+        )
+
+        response = self.client.get(self.url, {"comment_count__gte": 1})
+        self.assertEqual(
+            [playlist["id"] for playlist in response.data["results"]],
+            [self.playlist.id],
+        )
+
+
+class PlayListQueryCountTest(ViewTestCase):
+    """The playlist views load categories and songs in a fixed number of queries."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.categories = [
+            PlayListCategoryFactory.create(title=title) for title in ["Pop", "Rock"]
+        ]
+
+    def create_playlists(self, count: int) -> None:
+        for _ in range(count):
+            playlist = PlayListFactory.create(
+                created_by=self.user, title=f"playlist-{PlayList.objects.count()}"
+            )
+            playlist.categories.set(self.categories)
+            playlist.songs.set(
+                [AttachementFactory.create(created_by=self.user) for _ in range(2)]
+            )
+
+    def assert_constant_queries(self, url: str, expected: int) -> None:
+        # authenticate once so every request resolves the user from the cache
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), expected)
+
+        category_query = next(
+            query["sql"]
+            for query in queries
+            if "thread_playlistcategory" in query["sql"]
+        )
+        self.assertNotIn("date_created", category_query)
+
+    def test_list_views(self):
+        urls = [
+            reverse("api-thread-v1:playlist-list"),
+            reverse("api-thread-v1:user-playlist"),
+        ]
+
+        self.create_playlists(1)
+        for url in urls:
+            self.assert_constant_queries(url, 3)
+
+        self.create_playlists(9)
+        for url in urls:
+            self.assert_constant_queries(url, 3)
+
+        results = self.client.get(urls[0]).data["results"]
+        self.assertEqual(len(results), 10)
+        self.assertEqual(len(results[0]["songs"]), 2)
+        self.assertEqual(
+            [category["title"] for category in results[0]["categories"]],
+            ["Pop", "Rock"],
+        )
+
+    def test_detail_view(self):
+        self.create_playlists(1)
+        playlist = PlayList.objects.get()
+        url = reverse("api-thread-v1:playlist-detail", kwargs={"id": playlist.id})
+
+        self.assert_constant_queries(url, 3)
 
 
 class PlayListDetailViewTest(ViewTestCase):
@@ -256,3 +506,66 @@ class PlayListCommentDetailViewTest(ViewTestCase):
 
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class GroupedNotificationViewTests(ViewTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.owner = UserFactory.create(email="owner@example.com", username="owner")
+        self.playlist = PlayListFactory.create(created_by=self.owner)
+
+    def test_likes_are_grouped(self):
+        LikeFactory.create(
+            created_by=UserFactory.create(email="ada@example.com", username="ada"),
+            playlist=self.playlist,
+        )
+        url = reverse("api-thread-v1:like-list")
+        other = UserFactory.create(email="other@example.com", username="other")
+
+        for user in [other, self.user]:
+            self.client.force_authenticate(user)
+            response = self.client.post(url, data={"playlist": self.playlist.id})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        notification = self.owner.notifications.get()
+        self.assertEqual(notification.verb, "liked")
+        self.assertEqual(notification.data["actor_count"], 2)
+        self.assertEqual(
+            notification.data["message"],
+            f"{self.user.username} and 1 other liked your playlist Sabaton.",
+        )
+
+    def test_comments_and_replies_are_grouped(self):
+        replied = UserFactory.create(email="replied@example.com", username="replied")
+        comment = CommentFactory.create(created_by=replied, playlist=self.playlist)
+        url = reverse(
+            "api-thread-v1:playlist-comments", kwargs={"id": self.playlist.id}
+        )
+
+        for _ in range(2):
+            response = self.client.post(
+                url,
+                data={
+                    "playlist": self.playlist.id,
+                    "replying": comment.id,
+                    "content": "reply",
+                },
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        commented = self.owner.notifications.get()
+        self.assertEqual(commented.verb, "commented on")
+        self.assertEqual(commented.data["actor_count"], 1)
+        self.assertEqual(commented.data["actors"], [self.user.id])
+
+        reply = replied.notifications.get()
+        self.assertEqual(reply.verb, "replied to")
+        self.assertEqual(reply.data["comment"], comment.id)
+
+    def test_own_content_is_not_notified(self):
+        playlist = PlayListFactory.create(created_by=self.user, title="mine")
+        url = reverse("api-thread-v1:playlist-comments", kwargs={"id": playlist.id})
+
+        response = self.client.post(url, data={"playlist": playlist.id, "content": "x"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(self.user.notifications.exists())
@@ -12,9 +12,18 @@ class IsCreatorOrReadOnly(permissions.BasePermission):
         if request.method in SAFE_METHODS:
             return True
 
-        return request.user == obj.created_by
+        return request.user.id == obj.created_by_id
 
     def has_permission(self, request: Request, view: View) -> bool:
+        # reads are allowed without loading the object a second time
+        if request.method in SAFE_METHODS:
+            return True
+
         return self.has_object_permission(
             request=request, view=view, obj=view.get_object()
         )
+
+
+class IsCreator(permissions.BasePermission):
+    def has_object_permission(self, request: Request, view: View, obj: Any) -> bool:
+        return request.user.id == obj.created_by_id
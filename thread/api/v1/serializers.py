@@ -1,9 +1,23 @@
-from typing import Any, Dict
+import time
+from typing import Any, Dict, Optional, Type
 
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.forms import ValidationError
+from drf_yasg.utils import swagger_serializer_method
 from rest_framework import serializers
+from rest_framework.request import Request
 
-from thread.models import Attachment, Comment, Like, PlayList, PlayListCategory
+from thread import notifications, realtime, unique_viewers
+from thread.api.v1.tasks import fan_out_playlist_notifications_task
+from thread.models import (
+    PLAYLIST_SUMMARY_FIELDS,
+    Attachment,
+    Comment,
+    Like,
+    PlayList,
+    PlayListCategory,
+)
 
 
 class AttachmentSerializer(serializers.ModelSerializer):
@@ -20,6 +34,23 @@ class AttachmentSerializer(serializers.ModelSerializer):
         return obj
 
 
+def expands(request: Optional[Request], field: str) -> bool:
+    """Whether `?expand=` asks for the full representation of `field`."""
+    if request is None:
+        return False
+
+    return field in request.query_params.get("expand", "").split(",")
+
+
+class PlayListSummarySerializer(serializers.ModelSerializer):
+    """The compact representation of a liked playlist."""
+
+    class Meta:
+        model = PlayList
+        fields = list(PLAYLIST_SUMMARY_FIELDS)
+        read_only_fields = fields
+
+
 class LikeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Like
@@ -31,7 +62,7 @@ class LikeSerializer(serializers.ModelSerializer):
         user = self.context.get("request").user
         playlist = attrs["playlist"]
 
-        if user == playlist.created_by:
+        if user.id == playlist.created_by_id:
             raise ValidationError(
                 {"non_field_errors": ["User can not like their own playlist."]}
             )
@@ -46,17 +77,53 @@ class LikeSerializer(serializers.ModelSerializer):
     def create(self, validated_data: Dict[str, Any]) -> Like:
         user = self.context.get("request").user
 
-        instance = Like.objects.create(**validated_data, created_by=user)
+        try:
+            # the unique_playlist_like index settles concurrent likes
+            with transaction.atomic():
+                instance = Like.objects.create(**validated_data, created_by=user)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {"non_field_errors": ["User has already liked this playlist."]}
+            )
+
+        realtime.publish_like(instance)
+        notifications.notify_liked(instance)
 
         return instance
 
     def to_representation(self, instance: Like) -> dict[str, Any]:
         data = super().to_representation(instance)
-        data.update({"playlist": PlayListSerializer(instance=instance.playlist).data})
+
+        if instance.playlist_id:
+            serializer: Type[serializers.ModelSerializer] = (
+                PlayListSerializer
+                if expands(self.context.get("request"), "playlist")
+                else PlayListSummarySerializer
+            )
+            data.update({"playlist": serializer(instance=instance.playlist).data})
 
         return data
 
 
+class LikeToggleSerializer(serializers.Serializer):
+    """Likes or unlikes exactly one of a playlist or a comment."""
+
+    id = serializers.IntegerField(read_only=True)
+    playlist = serializers.IntegerField(min_value=1, required=False)
+    comment = serializers.IntegerField(min_value=1, required=False)
+    liked = serializers.BooleanField(read_only=True)
+
+    def validate(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
+        attrs = super().validate(attrs)
+
+        if len(attrs) != 1:
+            raise serializers.ValidationError(
+                {"non_field_errors": ["Provide either a playlist or a comment."]}
+            )
+
+        return attrs
+
+
 class PlayListCategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = PlayListCategory
@@ -67,7 +134,13 @@ class PlayListSerializer(serializers.ModelSerializer):
     class Meta:
         model = PlayList
         fields = "__all__"
-        read_only_fields = ["created_by", "date_created", "views"]
+        read_only_fields = [
+            "created_by",
+            "date_created",
+            "views",
+            "like_count",
+            "comment_count",
+        ]
 
     def validate(self, attrs: dict[str, Any]) -> dict[str, Any]:
         attrs = super().validate(attrs)
@@ -91,6 +164,11 @@ class PlayListSerializer(serializers.ModelSerializer):
         instance.songs.set(songs)
         instance.save()
 
+        published_at = time.time()
+        transaction.on_commit(
+            lambda: fan_out_playlist_notifications_task.delay(instance.id, published_at)
+        )
+
         return instance
 
     def to_representation(self, instance: PlayList) -> dict[str, Any]:
@@ -106,11 +184,39 @@ class PlayListSerializer(serializers.ModelSerializer):
         return data
 
 
+class DailyViewersSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    unique_viewers = serializers.IntegerField(allow_null=True)
+
+
+class PlayListStatsSerializer(serializers.ModelSerializer):
+    """Views and estimated unique viewers, from the playlist's HyperLogLogs."""
+
+    unique_viewers = serializers.SerializerMethodField()
+    daily_unique_viewers = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PlayList
+        fields = ["id", "views", "unique_viewers", "daily_unique_viewers"]
+        read_only_fields = fields
+
+    def get_unique_viewers(self, instance: PlayList) -> Optional[int]:
+        return unique_viewers.count_viewers(instance.id)
+
+    @swagger_serializer_method(serializer_or_field=DailyViewersSerializer(many=True))
+    def get_daily_unique_viewers(self, instance: PlayList) -> list[dict[str, Any]]:
+        days = unique_viewers.daily_viewers(instance.id, settings.PLAYLIST_STATS_DAYS)
+        return DailyViewersSerializer(
+            [{"date": day, "unique_viewers": count} for day, count in days],
+            many=True,
+        ).data
+
+
 class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = "__all__"
-        read_only_fields = ["created_by", "date_created"]
+        read_only_fields = ["created_by", "date_created", "reply_count"]
 
     def validate(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
         attrs = super().validate(attrs)
@@ -139,6 +245,8 @@ class CommentSerializer(serializers.ModelSerializer):
 
         instance.attachments.set(attachments)
         instance.save()
+        realtime.publish_comment(instance)
+        notifications.notify_commented(instance)
 
         return instance
 
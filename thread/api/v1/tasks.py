@@ -0,0 +1,109 @@
+import logging
+import time
+from itertools import islice
+from typing import Dict, List
+
+from celery import chord
+from django.conf import settings
+
+from HabbitBackend.celery import app
+from HabbitBackend.counts import reconcile_counts
+from thread import notifications, view_counts
+from thread.models import Comment, Like, PlayList
+
+logger = logging.getLogger(__name__)
+
+
+@app.task(name="fan_out_playlist_notifications_task")
+def fan_out_playlist_notifications_task(playlist_id: int, published_at: float) -> int:
+    """
+    Notify every follower of a playlist's creator that it was published.
+
+    Follower ids are streamed from the database and split into chunks of
+    NOTIFICATION_FANOUT_CHUNK_SIZE, each bulk inserted by its own task of a
+    chord whose callback reports the throughput. `published_at` is the epoch
+    time the playlist was created at. Returns the number of chunks.
+    """
+    playlist = PlayList.objects.only("created_by_id").get(id=playlist_id)
+    chunk_size = settings.NOTIFICATION_FANOUT_CHUNK_SIZE
+    follower_ids = notifications.stream_follower_ids(playlist.created_by_id, chunk_size)
+    started_at = time.time()
+    header = []
+
+    while chunk := list(islice(follower_ids, chunk_size)):
+        header.append(notify_followers_chunk_task.s(playlist_id, chunk))
+
+    if header:
+        chord(header)(fan_out_completed_task.s(playlist_id, published_at, started_at))
+
+    return len(header)
+
+
+@app.task(name="notify_followers_chunk_task")
+def notify_followers_chunk_task(playlist_id: int, follower_ids: List[int]) -> int:
+    """Insert one chunk of publish notifications, returns the rows written."""
+    playlist = PlayList.objects.select_related("created_by").get(id=playlist_id)
+    return notifications.notify_followers(playlist, follower_ids)
+
+
+@app.task(name="fan_out_completed_task")
+def fan_out_completed_task(
+    rows: List[int], playlist_id: int, published_at: float, started_at: float
+) -> Dict[str, float]:
+    """Log and return the throughput and end to end latency of a fan-out."""
+    finished_at = time.time()
+    total = sum(rows)
+    metrics = {
+        "playlist": playlist_id,
+        "rows": total,
+        "rows_per_second": total / max(finished_at - started_at, 1e-6),
+        "latency_seconds": finished_at - published_at,
+    }
+    logger.info("Playlist notification fan-out: %s", metrics)
+    return metrics
+
+
+@app.task(name="notify_liked_task")
+def notify_liked_task(like_id: int) -> bool:
+    """
+    Notify the owner of a liked playlist or comment, off the request path.
+    Returns False when the like was removed before the task ran.
+    """
+    like = (
+        Like.objects.select_related("created_by", "playlist", "comment")
+        .filter(id=like_id)
+        .first()
+    )
+
+    if like is None:
+        return False
+
+    notifications.notify_liked(like)
+    return True
+
+
+@app.task(name="flush_playlist_views_task")
+def flush_playlist_views_task() -> int:
+    """Write the buffered playlist views to the database, returns their number."""
+    return view_counts.flush()
+
+
+@app.task(name="reconcile_thread_counts_task")
+def reconcile_thread_counts_task(chunk_size: int = 1000) -> int:
+    """
+    Repair drift between the denormalized like, comment and reply counts and
+    the Like and Comment rows, returns the number of playlists and comments
+    fixed. Bulk and cascading deletes skip Like.delete and Comment.delete.
+    """
+    playlists = reconcile_counts(
+        PlayList,
+        {
+            "like_count": (Like.objects.all(), "playlist_id"),
+            "comment_count": (Comment.objects.all(), "playlist_id"),
+        },
+        chunk_size,
+    )
+    comments = reconcile_counts(
+        Comment, {"reply_count": (Comment.objects.all(), "replying_id")}, chunk_size
+    )
+    return playlists + comments
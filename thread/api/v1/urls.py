@@ -6,10 +6,12 @@ from thread.api.v1.views import (
     CommentDetailView,
     LikeDetailView,
     LikeListView,
+    LikeToggleView,
     PlayListCategoryListView,
     PlayListCommentListView,
     PlayListDetailView,
     PlaylistListView,
+    PlayListStatsView,
     UserLikeListView,
     UserPlaylistView,
 )
@@ -25,10 +27,14 @@ urlpatterns = [
     ),
     path("likes/", LikeListView.as_view(), name="like-list"),
     path("likes/me/", UserLikeListView.as_view(), name="user-likes"),
+    path("likes/toggle/", LikeToggleView.as_view(), name="like-toggle"),
     path("likes/<str:id>/", LikeDetailView.as_view(), name="like-detail"),
     path("playlist/", PlaylistListView.as_view(), name="playlist-list"),
     path("playlist/me/", UserPlaylistView.as_view(), name="user-playlist"),
     path("playlist/<str:id>/", PlayListDetailView.as_view(), name="playlist-detail"),
+    path(
+        "playlist/<str:id>/stats/", PlayListStatsView.as_view(), name="playlist-stats"
+    ),
     path(
         "playlist/<str:id>/comments/",
         PlayListCommentListView.as_view(),
@@ -1,17 +1,27 @@
-from django.db.models import QuerySet
+from typing import Any
+
+from django.db import transaction
+from django.db.models import Prefetch, QuerySet
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import generics, permissions
+from rest_framework import exceptions, generics, permissions, status
 from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.request import Request
+from rest_framework.response import Response
 
-from thread.api.v1.permissions import IsCreatorOrReadOnly
+from thread import realtime, unique_viewers, view_counts
+from thread.api.v1.permissions import IsCreator, IsCreatorOrReadOnly
 from thread.api.v1.serializers import (
     AttachmentSerializer,
     CommentSerializer,
     LikeSerializer,
+    LikeToggleSerializer,
     PlayListCategorySerializer,
     PlayListSerializer,
+    PlayListStatsSerializer,
+    expands,
 )
+from thread.api.v1.tasks import notify_liked_task
 from thread.models import Attachment, Comment, Like, PlayList, PlayListCategory
 
 
@@ -40,8 +50,12 @@ class AttachmentDetailView(generics.RetrieveDestroyAPIView):
 
 
 class LikeListView(generics.ListCreateAPIView):
+    """
+    Liked playlists are rendered compactly, pass `?expand=playlist` to embed
+    their full representation.
+    """
+
     serializer_class = LikeSerializer
-    queryset = Like.objects.all()
     permission_classes = (permissions.IsAuthenticated,)
     lookup_field = "id"
     filter_backends = [OrderingFilter, SearchFilter, DjangoFilterBackend]
@@ -49,8 +63,16 @@ class LikeListView(generics.ListCreateAPIView):
     ordering_fields = ["date_created"]
     ordering = ordering_fields
 
+    def get_queryset(self) -> QuerySet[Like]:
+        return Like.objects.for_serializer(expands(self.request, "playlist"))
+
 
 class UserLikeListView(generics.ListAPIView):
+    """
+    Liked playlists are rendered compactly, pass `?expand=playlist` to embed
+    their full representation.
+    """
+
     serializer_class = LikeSerializer
     permission_classes = (permissions.IsAuthenticated,)
     lookup_field = "id"
@@ -60,34 +82,116 @@ class UserLikeListView(generics.ListAPIView):
     ordering = ordering_fields
 
     def get_queryset(self) -> QuerySet[Like]:
-        return Like.objects.filter(created_by=self.request.user)
+        return Like.objects.filter(created_by=self.request.user).for_serializer(
+            expands(self.request, "playlist")
+        )
 
 
 class LikeDetailView(generics.RetrieveDestroyAPIView):
     serializer_class = LikeSerializer
-    queryset = Like.objects.all()
     permission_classes = (permissions.IsAuthenticated, IsCreatorOrReadOnly)
     lookup_field = "id"
 
+    def get_queryset(self) -> QuerySet[Like]:
+        return Like.objects.for_serializer(expands(self.request, "playlist"))
+
+    def perform_destroy(self, instance: Like) -> None:
+        realtime.publish_like(instance, realtime.LIKE_DELETED)
+        instance.delete()
+
+
+class LikeToggleView(generics.GenericAPIView):
+    """
+    Like a playlist or comment, or unlike it if it is already liked.
+    Responds 201 when a like was created and 200 when it was removed.
+
+    The toggle takes two statements, three for an unlike. The grouped
+    notification of a like, several more statements, is sent by
+    notify_liked_task once the transaction commits.
+    """
+
+    serializer_class = LikeToggleSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        playlist_id = serializer.validated_data.get("playlist")
+        comment_id = serializer.validated_data.get("comment")
+        like, liked = Like.objects.toggle(request.user, playlist_id, comment_id)
+
+        if like is None:
+            kind = "playlist" if playlist_id else "comment"
+            target: Any = PlayList if playlist_id else Comment
+            if not target.objects.filter(id=playlist_id or comment_id).exists():
+                raise exceptions.NotFound(f"{target.__name__} not found.")
+
+            raise exceptions.ValidationError(
+                {"non_field_errors": [f"User can not like their own {kind}."]}
+            )
+
+        if liked:
+            realtime.publish_like(like)
+            transaction.on_commit(lambda: notify_liked_task.delay(like.id))
+        else:
+            realtime.publish_like(like, realtime.LIKE_DELETED)
+
+        data = self.get_serializer(
+            {
+                "id": like.id,
+                "playlist": like.playlist_id,
+                "comment": like.comment_id,
+                "liked": liked,
+            }
+        ).data
+        return Response(data, status.HTTP_201_CREATED if liked else status.HTTP_200_OK)
+
 
 class PlaylistListView(generics.ListCreateAPIView):
     serializer_class = PlayListSerializer
-    queryset = PlayList.objects.all()
+    queryset = PlayList.objects.for_serializer()
     permission_classes = (permissions.IsAuthenticated,)
     lookup_field = "id"
     filter_backends = [OrderingFilter, SearchFilter, DjangoFilterBackend]
-    filterset_fields = ["date_created", "categories__title", "views"]
+    filterset_fields = {
+        "date_created": ["exact"],
+        "categories__title": ["exact"],
+        "views": ["exact"],
+        "like_count": ["exact", "gte", "lte"],
+        "comment_count": ["exact", "gte", "lte"],
+    }
     search_fields = ["title"]
-    ordering_fields = ["date_created"]
-    ordering = ordering_fields
+    ordering_fields = ["date_created", "views", "like_count", "comment_count"]
+    ordering = ["date_created"]
 
 
 class PlayListDetailView(generics.RetrieveDestroyAPIView):
     serializer_class = PlayListSerializer
-    queryset = PlayList.objects.all()
+    queryset = PlayList.objects.for_serializer()
     permission_classes = (permissions.IsAuthenticated, IsCreatorOrReadOnly)
     lookup_field = "id"
 
+    def retrieve(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        instance = self.get_object()
+        view_counts.record_view(instance.id)
+        unique_viewers.record_viewer(instance.id, request.user.id)
+        serializer = self.get_serializer(instance)
+        return Response(
+            {
+                **serializer.data,
+                "unique_viewers": unique_viewers.count_viewers(instance.id),
+            }
+        )
+
+
+class PlayListStatsView(generics.RetrieveAPIView):
+    """Views and estimated unique viewers of a playlist, for its creator."""
+
+    serializer_class = PlayListStatsSerializer
+    queryset = PlayList.objects.only("id", "views", "created_by")
+    permission_classes = (permissions.IsAuthenticated, IsCreator)
+    lookup_field = "id"
+
 
 class UserPlaylistView(generics.ListAPIView):
     serializer_class = PlayListSerializer
@@ -100,7 +204,7 @@ class UserPlaylistView(generics.ListAPIView):
     ordering = ordering_fields
 
     def get_queryset(self) -> QuerySet:
-        return PlayList.objects.filter(created_by=self.request.user)
+        return PlayList.objects.filter(created_by=self.request.user).for_serializer()
 
 
 class PlayListCategoryListView(generics.ListAPIView):
@@ -131,7 +235,12 @@ class PlayListCommentListView(generics.ListCreateAPIView):
         return get_object_or_404(PlayList, id=self.kwargs["id"])
 
     def get_queryset(self) -> QuerySet:
-        return Comment.objects.filter(playlist=self.get_object(), replying=None)
+        # CommentSerializer lists reply ids, loaded for the whole page at once
+        return Comment.objects.filter(
+            playlist=self.get_object(), replying=None
+        ).prefetch_related(
+            Prefetch("replies", queryset=Comment.objects.only("id", "replying_id"))
+        )
 
 
 class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
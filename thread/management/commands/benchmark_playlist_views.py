@@ -0,0 +1,81 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from django.core.management import BaseCommand, CommandError, CommandParser
+from django.db import connection
+from django.db.models import F
+
+from account.models import CustomUser
+from thread import view_counts
+from thread.models import PlayList
+
+
+class Command(BaseCommand):
+    """Django command to compare direct and buffered playlist view counting"""
+
+    help = (
+        "Hit a single playlist N times from concurrent threads, first with one "
+        "UPDATE per view and then through the Redis buffer and a flush, and "
+        "report views/sec for both."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--hits", type=int, default=10000)
+        parser.add_argument("--concurrency", type=int, default=16)
+
+    def hammer(
+        self, label: str, hits: int, concurrency: int, hit: Callable[[], None]
+    ) -> None:
+        def worker(count: int) -> None:
+            try:
+                for _ in range(count):
+                    hit()
+            finally:
+                connection.close()
+
+        shares = [
+            hits // concurrency + (index < hits % concurrency)
+            for index in range(concurrency)
+        ]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(worker, shares))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"{label}: {hits / elapsed:.0f} views/sec")
+
+    def handle(self, *args: list[Any], **options: Any) -> None:
+        hits = options["hits"]
+        concurrency = options["concurrency"]
+        user = CustomUser.objects.create_user(
+            email="views-benchmark@example.com", password="benchmark-password"
+        )
+        playlist = PlayList.objects.create(created_by=user, title="views-benchmark")
+
+        try:
+            self.hammer(
+                "one UPDATE per view",
+                hits,
+                concurrency,
+                lambda: PlayList.objects.filter(id=playlist.id).update(
+                    views=F("views") + 1
+                ),
+            )
+            self.hammer(
+                "buffered in Redis",
+                hits,
+                concurrency,
+                lambda: view_counts.record_view(playlist.id),
+            )
+
+            start = time.perf_counter()
+            view_counts.flush()
+            self.stdout.write(f"flush: {time.perf_counter() - start:.4f}s")
+
+            playlist.refresh_from_db()
+            if playlist.views != 2 * hits:
+                raise CommandError(f"Counted {playlist.views} views of {2 * hits}.")
+        finally:
+            user.delete()
+
+        self.stdout.write(self.style.SUCCESS("Benchmark finished."))
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.2 on 2026-10-18 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("thread", "0003_alter_comment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlayListViewFlush",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("batch", models.CharField(max_length=32, unique=True)),
+                ("views", models.PositiveBigIntegerField()),
+                (
+                    "date_created",
+                    models.DateTimeField(auto_now_add=True, db_index=True),
+                ),
+            ],
+        ),
+    ]
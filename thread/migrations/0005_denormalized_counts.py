@@ -0,0 +1,55 @@
+# Generated by Django 3.2.2 on 2026-10-18 04:34
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, key):
+    return Subquery(
+        queryset.filter(**{key: OuterRef("pk")})
+        .order_by()
+        .values(key)
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+
+
+def backfill_counts(apps, schema_editor):
+    Comment = apps.get_model("thread", "Comment")
+    Like = apps.get_model("thread", "Like")
+    PlayList = apps.get_model("thread", "PlayList")
+
+    PlayList.objects.update(
+        like_count=Coalesce(count_of(Like.objects.all(), "playlist"), 0),
+        comment_count=Coalesce(count_of(Comment.objects.all(), "playlist"), 0),
+    )
+    Comment.objects.update(
+        reply_count=Coalesce(count_of(Comment.objects.all(), "replying"), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("thread", "0004_playlist_view_flushes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="reply_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="playlist",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="playlist",
+            name="like_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
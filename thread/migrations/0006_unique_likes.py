@@ -0,0 +1,58 @@
+# Generated by Django 3.2.2 on 2026-10-18 04:37
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def delete_duplicate_likes(apps, schema_editor):
+    Like = apps.get_model("thread", "Like")
+    PlayList = apps.get_model("thread", "PlayList")
+
+    for field in ("playlist", "comment"):
+        kept = (
+            Like.objects.filter(**{f"{field}__isnull": False})
+            .order_by()
+            .values("created_by", field)
+            .annotate(first=Min("id"))
+            .values("first")
+        )
+        Like.objects.filter(**{f"{field}__isnull": False}).exclude(
+            id__in=Subquery(kept)
+        ).delete()
+
+    likes = (
+        Like.objects.filter(playlist=OuterRef("pk"))
+        .order_by()
+        .values("playlist")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    PlayList.objects.update(like_count=Coalesce(Subquery(likes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("thread", "0005_denormalized_counts"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="like",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("playlist__isnull", False)),
+                fields=("created_by", "playlist"),
+                name="unique_playlist_like",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="like",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("comment__isnull", False)),
+                fields=("created_by", "comment"),
+                name="unique_comment_like",
+            ),
+        ),
+    ]
@@ -1,12 +1,23 @@
-from typing import Iterable, Optional
+from typing import Any, Dict, Iterable, Optional, Tuple
 
-from django.db import models
-from django.db.models import Q
+from django.db import connections, models, transaction
+from django.db.models import F, Prefetch, Q
+from django.db.models.functions import Greatest
 from django.db.utils import IntegrityError
+from django.utils import timezone
 
 from account.models import CustomUser
+from HabbitBackend.counts import saved_fields
 from thread.validators import file_size_validator, file_type_validator
 
+# the columns of a liked playlist rendered by default, see LikeSerializer
+PLAYLIST_SUMMARY_FIELDS = ("id", "title", "cover_image", "like_count", "comment_count")
+
+
+def shift_count(queryset: models.QuerySet, field: str, delta: int) -> int:
+    """Atomically add `delta` to a denormalized count, never going below 0."""
+    return queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
 
 class Attachment(models.Model):
     created_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
@@ -22,6 +33,124 @@ class Attachment(models.Model):
         return f"Attachement {self.id}-{self.name} added by {self.created_by.email}"
 
 
+class LikeQuerySet(models.QuerySet):
+    def for_serializer(self, expand_playlist: bool = False) -> "LikeQuerySet":
+        """
+        Prefetch the liked playlists LikeSerializer renders, in one query
+        whatever the number of likes. Only the columns of the compact
+        representation are loaded, unless the playlists are expanded, which
+        prefetches their categories and songs as well.
+        """
+        if expand_playlist:
+            playlists = PlayList.objects.for_serializer()
+        else:
+            playlists = PlayList.objects.only(*PLAYLIST_SUMMARY_FIELDS)
+
+        return self.prefetch_related(Prefetch("playlist", queryset=playlists))
+
+
+class LikeManager(models.Manager):
+    def toggle(
+        self,
+        user: CustomUser,
+        playlist_id: Optional[int] = None,
+        comment_id: Optional[int] = None,
+    ) -> Tuple[Optional["Like"], bool]:
+        """
+        Like a playlist or comment, or unlike it when `user` already does.
+
+        Liking is a single INSERT ... SELECT ... ON CONFLICT DO NOTHING that
+        relies on the unique_playlist_like and unique_comment_like indexes and
+        only selects the target if it exists and is not the user's own. When
+        nothing was inserted the like is removed with DELETE ... RETURNING.
+        The UPDATE shifting a playlist's like_count returns its creator, and
+        a comment's creator and playlist are selected, so the returned like
+        carries what like_channels() needs without further queries. Returns
+        the like and whether it exists now, or `(None, False)` when the target
+        is missing or the user's own.
+        """
+        relation, target_id = ("playlist", playlist_id)
+        target: Any = PlayList
+        if playlist_id is None:
+            relation, target_id, target = "comment", comment_id, Comment
+        field = f"{relation}_id"
+
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        target_table = quote(target._meta.db_table)
+        date_created = timezone.now()
+
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {table} ({quote('created_by_id')}, {quote(field)}, "
+                    f"{quote('date_created')}) "
+                    f"SELECT %s, {quote('id')}, %s "
+                    f"FROM {target_table} "
+                    f"WHERE {quote('id')} = %s AND {quote('created_by_id')} <> %s "
+                    f"ON CONFLICT ({quote('created_by_id')}, {quote(field)}) "
+                    f"WHERE {quote(field)} IS NOT NULL DO NOTHING "
+                    f"RETURNING {quote('id')}",
+                    [
+                        user.id,
+                        connection.ops.adapt_datetimefield_value(date_created),
+                        target_id,
+                        user.id,
+                    ],
+                )
+                row = cursor.fetchone()
+                liked = row is not None
+
+                if not liked:
+                    cursor.execute(
+                        f"DELETE FROM {table} WHERE {quote('created_by_id')} = %s "
+                        f"AND {quote(field)} = %s RETURNING {quote('id')}",
+                        [user.id, target_id],
+                    )
+                    row = cursor.fetchone()
+
+                if row is None:
+                    return None, False
+
+                if playlist_id is not None:
+                    # shift_count, returning the creator
+                    count = quote("like_count")
+                    delta = 1 if liked else -1
+                    cursor.execute(
+                        f"UPDATE {target_table} SET {count} = CASE "
+                        f"WHEN {count} + %s > 0 THEN {count} + %s ELSE 0 END "
+                        f"WHERE {quote('id')} = %s "
+                        f"RETURNING {quote('created_by_id')}",
+                        [delta, delta, target_id],
+                    )
+                    values = {"id": target_id, "created_by_id": cursor.fetchone()[0]}
+                else:
+                    cursor.execute(
+                        f"SELECT {quote('created_by_id')}, {quote('playlist_id')} "
+                        f"FROM {target_table} WHERE {quote('id')} = %s",
+                        [target_id],
+                    )
+                    created_by_id, comment_playlist_id = cursor.fetchone()
+                    values = {
+                        "id": target_id,
+                        "created_by_id": created_by_id,
+                        "playlist_id": comment_playlist_id,
+                    }
+
+        # the other fields of the target are deferred
+        names = [f.attname for f in target._meta.concrete_fields if f.attname in values]
+        instance = self.model(
+            id=row[0],
+            created_by=user,
+            date_created=date_created,
+            **{relation: target.from_db(self.db, names, [values[n] for n in names])},
+        )
+        instance._state.adding = False
+        instance._state.db = self.db
+        return instance, liked
+
+
 class Like(models.Model):
     created_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     playlist = models.ForeignKey(
@@ -32,6 +161,8 @@ class Like(models.Model):
     )
     date_created = models.DateTimeField(auto_now=True)
 
+    objects = LikeManager.from_queryset(LikeQuerySet)()
+
     class Meta:
         ordering = ["-date_created"]
         constraints = [
@@ -41,7 +172,17 @@ class Like(models.Model):
                     Q(playlist__isnull=False, comment__isnull=True)
                     | Q(playlist__isnull=True, comment__isnull=False)
                 ),
-            )
+            ),
+            models.UniqueConstraint(
+                fields=("created_by", "playlist"),
+                condition=Q(playlist__isnull=False),
+                name="unique_playlist_like",
+            ),
+            models.UniqueConstraint(
+                fields=("created_by", "comment"),
+                condition=Q(comment__isnull=False),
+                name="unique_comment_like",
+            ),
         ]
 
     def __str__(self) -> str:
@@ -55,18 +196,43 @@ class Like(models.Model):
         update_fields: Optional[Iterable[str]] = None,
     ) -> None:
 
-        if self.playlist:
-            if self.created_by == self.playlist.created_by:
+        if self.playlist_id:
+            if self.created_by_id == self.playlist.created_by_id:
                 raise IntegrityError(
                     "created_by__id and playlist__created_by__id must be unique"
                 )
-        elif self.comment:
-            if self.created_by == self.comment.created_by:
+        elif self.comment_id:
+            if self.created_by_id == self.comment.created_by_id:
                 raise IntegrityError(
                     "created_by__id and comment__created_by__id must be unique"
                 )
 
-        return super().save(force_insert, force_update, using, update_fields)
+        adding = self._state.adding
+        with transaction.atomic(using=using):
+            super().save(force_insert, force_update, using, update_fields)
+            if adding and self.playlist_id:
+                shift_count(
+                    PlayList.objects.filter(id=self.playlist_id), "like_count", 1
+                )
+
+        if (
+            adding
+            and self.playlist_id
+            and self._meta.get_field("playlist").is_cached(self)
+        ):
+            self.playlist.like_count += 1
+
+    def delete(
+        self, using: Optional[str] = None, keep_parents: bool = False
+    ) -> Tuple[int, Dict[str, int]]:
+        with transaction.atomic(using=using):
+            deleted = super().delete(using, keep_parents)
+            if self.playlist_id:
+                shift_count(
+                    PlayList.objects.filter(id=self.playlist_id), "like_count", -1
+                )
+
+        return deleted
 
 
 class Comment(models.Model):
@@ -80,10 +246,50 @@ class Comment(models.Model):
     content = models.TextField(null=False)
     attachments = models.ManyToManyField(Attachment, blank=True)
     date_created = models.DateTimeField(auto_now=True)
+    # denormalized count of direct replies, see Comment.save and Comment.delete
+    reply_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ["-date_created"]
 
+    def save(self, **kwargs: Any) -> None:
+        adding = self._state.adding
+        kwargs["update_fields"] = saved_fields(
+            self, ["reply_count"], kwargs.get("update_fields")
+        )
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(**kwargs)
+            if adding:
+                shift_count(
+                    PlayList.objects.filter(id=self.playlist_id), "comment_count", 1
+                )
+                if self.replying_id:
+                    shift_count(
+                        Comment.objects.filter(id=self.replying_id), "reply_count", 1
+                    )
+
+        if adding and self._meta.get_field("replying").is_cached(self):
+            if self.replying is not None:
+                self.replying.reply_count += 1
+
+    def delete(
+        self, using: Optional[str] = None, keep_parents: bool = False
+    ) -> Tuple[int, Dict[str, int]]:
+        """Delete the comment and its replies, counting them off the playlist."""
+        with transaction.atomic(using=using):
+            deleted = super().delete(using, keep_parents)
+            shift_count(
+                PlayList.objects.filter(id=self.playlist_id),
+                "comment_count",
+                -deleted[1].get(self._meta.label, 0),
+            )
+            if self.replying_id:
+                shift_count(
+                    Comment.objects.filter(id=self.replying_id), "reply_count", -1
+                )
+
+        return deleted
+
 
 class PlayListCategory(models.Model):
     title = models.CharField(
@@ -98,6 +304,30 @@ class PlayListCategory(models.Model):
         return f"PlayListCategory - {self.title}"
 
 
+class PlayListViewFlush(models.Model):
+    """A batch of buffered views written to PlayList.views, see thread.view_counts."""
+
+    batch = models.CharField(max_length=32, unique=True)
+    views = models.PositiveBigIntegerField()
+    date_created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class PlayListQuerySet(models.QuerySet):
+    def for_serializer(self) -> "PlayListQuerySet":
+        """
+        Prefetch the categories and songs PlayListSerializer renders, in one
+        query each whatever the number of playlists. Song owners are rendered
+        from created_by_id, so users are not joined, and categories load only
+        the columns PlayListCategorySerializer renders.
+        """
+        return self.prefetch_related(
+            Prefetch(
+                "categories", queryset=PlayListCategory.objects.only("id", "title")
+            ),
+            "songs",
+        )
+
+
 class PlayList(models.Model):
     created_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     title = models.CharField(max_length=120, default="", db_index=True)
@@ -108,6 +338,13 @@ class PlayList(models.Model):
     active_hours = models.IntegerField(default=24)
     views = models.BigIntegerField(default=0)
     short_description = models.TextField(default="")
+    # denormalized counts of the playlist's Like rows and of all its comments,
+    # replies included, see Like and Comment. reconcile_thread_counts_task
+    # repairs drift from bulk and cascading deletes.
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    objects = PlayListQuerySet.as_manager()
 
     class Meta:
         ordering = ["-date_created"]
@@ -116,3 +353,9 @@ class PlayList(models.Model):
                 fields=("title", "created_by"), name="name must be unqiue"
             )
         ]
+
+    def save(self, **kwargs: Any) -> None:
+        kwargs["update_fields"] = saved_fields(
+            self, ["views", "like_count", "comment_count"], kwargs.get("update_fields")
+        )
+        super().save(**kwargs)
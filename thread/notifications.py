@@ -0,0 +1,106 @@
+from collections import Counter
+from typing import Iterable, Iterator, List
+
+from django.contrib.contenttypes.models import ContentType
+from notifications.models import Notification
+
+from account import realtime, unread
+from account.models import UserFollowing
+from account.notifications import notify_grouped
+from thread.models import Comment, Like, PlayList
+
+PUBLISH_VERB = "published"
+LIKE_VERB = "liked"
+COMMENT_VERB = "commented on"
+REPLY_VERB = "replied to"
+
+
+def stream_follower_ids(user_id: int, chunk_size: int) -> Iterator[int]:
+    """Ids of the active, unblocked followers of a user, read in chunks."""
+    return (
+        UserFollowing.objects.filter(
+            followed_user_id=user_id, blocked=False, user__is_active=True
+        )
+        .order_by()
+        .values_list("user_id", flat=True)
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def build_playlist_notifications(
+    playlist: PlayList, recipient_ids: Iterable[int]
+) -> List[Notification]:
+    """Build unsaved notifications telling each recipient `playlist` was published."""
+    actor = playlist.created_by
+    actor_content_type = ContentType.objects.get_for_model(actor)
+    target_content_type = ContentType.objects.get_for_model(playlist)
+    message = f"{actor.username} published {playlist.title}."
+
+    return [
+        Notification(
+            recipient_id=recipient_id,
+            actor_content_type=actor_content_type,
+            actor_object_id=str(actor.id),
+            target_content_type=target_content_type,
+            target_object_id=str(playlist.id),
+            verb=PUBLISH_VERB,
+            data={"message": message, "user": actor.id, "playlist": playlist.id},
+        )
+        for recipient_id in recipient_ids
+    ]
+
+
+def notify_followers(playlist: PlayList, recipient_ids: Iterable[int]) -> int:
+    """Notify followers of a published playlist with a single INSERT."""
+    notifications = Notification.objects.bulk_create(
+        build_playlist_notifications(playlist, recipient_ids)
+    )
+    unread.adjust(Counter(notification.recipient_id for notification in notifications))
+    realtime.publish_notifications(notifications)
+    return len(notifications)
+
+
+def notify_liked(like: Like) -> None:
+    """Tell the owner of a liked playlist or comment, grouped per target."""
+    if like.playlist_id:
+        target, subject = like.playlist, f"your playlist {like.playlist.title}"
+    else:
+        target, subject = like.comment, "your comment"
+
+    if target.created_by_id != like.created_by_id:
+        notify_grouped(
+            target.created_by_id,
+            like.created_by,
+            LIKE_VERB,
+            target,
+            subject,
+            playlist=like.playlist_id,
+            comment=like.comment_id,
+        )
+
+
+def notify_commented(comment: Comment) -> None:
+    """Tell the playlist owner, and the replied comment's author, of a comment."""
+    playlist = comment.playlist
+
+    if playlist.created_by_id != comment.created_by_id:
+        notify_grouped(
+            playlist.created_by_id,
+            comment.created_by,
+            COMMENT_VERB,
+            playlist,
+            f"your playlist {playlist.title}",
+            playlist=playlist.id,
+        )
+
+    replying = comment.replying
+    if replying is not None and replying.created_by_id != comment.created_by_id:
+        notify_grouped(
+            replying.created_by_id,
+            comment.created_by,
+            REPLY_VERB,
+            replying,
+            "your comment",
+            playlist=playlist.id,
+            comment=replying.id,
+        )
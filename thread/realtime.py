@@ -0,0 +1,53 @@
+"""Real-time like and comment events, published through HabbitBackend.centrifugo."""
+from typing import Any, Dict, List
+
+from HabbitBackend import centrifugo
+from thread.models import Comment, Like
+
+LIKE_CREATED = "like.created"
+LIKE_DELETED = "like.deleted"
+COMMENT_CREATED = "comment.created"
+
+
+def like_channels(like: Like) -> List[str]:
+    """The liked playlist's channel and the channel of the liked item's owner."""
+    if like.playlist_id:
+        return [
+            centrifugo.playlist_channel(like.playlist_id),
+            centrifugo.user_channel(like.playlist.created_by_id),
+        ]
+
+    return [
+        centrifugo.playlist_channel(like.comment.playlist_id),
+        centrifugo.user_channel(like.comment.created_by_id),
+    ]
+
+
+def publish_like(like: Like, event_type: str = LIKE_CREATED) -> None:
+    data = {
+        "type": event_type,
+        "like": like.id,
+        "user": like.created_by_id,
+        "playlist": like.playlist_id,
+        "comment": like.comment_id,
+    }
+    centrifugo.publish(like_channels(like), data)
+
+
+def publish_comment(comment: Comment) -> None:
+    """Push a new comment to its playlist, the playlist owner and the replied user."""
+    channels = [
+        centrifugo.playlist_channel(comment.playlist_id),
+        centrifugo.user_channel(comment.playlist.created_by_id),
+    ]
+    if comment.replying_id:
+        channels.append(centrifugo.user_channel(comment.replying.created_by_id))
+
+    data: Dict[str, Any] = {
+        "type": COMMENT_CREATED,
+        "comment": comment.id,
+        "user": comment.created_by_id,
+        "playlist": comment.playlist_id,
+        "replying": comment.replying_id,
+    }
+    centrifugo.publish(channels, data)